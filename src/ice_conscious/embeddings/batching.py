@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .adapter import EmbeddingAdapter
+from .models import EmbeddingResult
+
+
+# ============================================================================
+# METRICHE
+# ============================================================================
+
+@dataclass
+class BatchingStats:
+    """
+    Contatori del batcher.
+    """
+    requests: int = 0
+    batches: int = 0
+    full_batches: int = 0        # chiusi per max_batch, non per timeout
+    fallbacks: int = 0           # lotti falliti riprovati testo per testo
+    failures: int = 0            # richieste concluse con errore
+    wait_ms: float = 0.0         # attesa in coda, sommata sulle richieste
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.requests / self.batches if self.batches else 0.0
+
+    @property
+    def mean_wait_ms(self) -> float:
+        return self.wait_ms / self.requests if self.requests else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        data: Dict[str, float] = dict(asdict(self))
+        data["mean_batch_size"] = self.mean_batch_size
+        data["mean_wait_ms"] = self.mean_wait_ms
+        return data
+
+
+# ============================================================================
+# BATCHER
+# ============================================================================
+
+# (testo, future del chiamante, istante di accodamento)
+_Request = Tuple[str, "Future[EmbeddingResult]", float]
+
+_STOP = object()
+
+
+class MicroBatchingEmbeddingAdapter:
+    """
+    EmbeddingAdapter che raggruppa chiamate `embed_one` concorrenti.
+
+    Un thread dispatcher raccoglie le richieste in coda e le passa al
+    modello con un solo `embed_many`, quando il lotto raggiunge
+    `max_batch` testi o quando la richiesta più vecchia ha atteso
+    `max_wait_ms`; i risultati tornano ai rispettivi chiamanti.
+
+    `max_wait_ms` fissa il compromesso: più attesa => lotti più grandi
+    (throughput) ma latenza aggiunta a ogni richiesta; con carico basso
+    un lotto parte dopo al più `max_wait_ms`.
+
+    Interfacce:
+    - thread: `embed_one` / `embed_many` bloccanti
+    - asyncio: `aembed_one` / `aembed_many`, senza bloccare il loop
+
+    Il modello interno viene chiamato solo dal dispatcher: non serve
+    che sia thread-safe. Se un lotto fallisce, i suoi testi vengono
+    riprovati uno per uno (un testo non valido non fa fallire gli altri).
+    """
+
+    def __init__(
+        self,
+        inner: EmbeddingAdapter,
+        *,
+        max_batch: int = 32,
+        max_wait_ms: float = 2.0,
+    ) -> None:
+        if max_batch <= 0 or max_wait_ms < 0:
+            raise ValueError("Batching requires max_batch > 0 and max_wait_ms >= 0")
+
+        self.inner = inner
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.stats = BatchingStats()
+
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._dispatcher.start()
+
+    @property
+    def model_name(self) -> str:
+        return self.inner.model_name
+
+    # ------------------------------------------------------------------
+    # API (THREAD)
+    # ------------------------------------------------------------------
+
+    def submit(self, text: str) -> "Future[EmbeddingResult]":
+        """
+        Accoda un testo; il Future si completa con il suo EmbeddingResult.
+        """
+        future: "Future[EmbeddingResult]" = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Embedding batcher is closed")
+            self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed_one(self, text: str) -> EmbeddingResult:
+        return self.submit(text).result()
+
+    def embed_many(self, texts: Sequence[str]) -> List[EmbeddingResult]:
+        """
+        Accoda tutti i testi: possono condividere i lotti con altri chiamanti.
+        """
+        futures = [self.submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    # ------------------------------------------------------------------
+    # API (ASYNCIO)
+    # ------------------------------------------------------------------
+
+    async def aembed_one(self, text: str) -> EmbeddingResult:
+        return await asyncio.wrap_future(self.submit(text))
+
+    async def aembed_many(self, texts: Sequence[str]) -> List[EmbeddingResult]:
+        futures = [asyncio.wrap_future(self.submit(text)) for text in texts]
+        return list(await asyncio.gather(*futures))
+
+    # ------------------------------------------------------------------
+    # CICLO DI VITA
+    # ------------------------------------------------------------------
+
+    def close(self) -> None:
+        """
+        Smette di accettare richieste; quelle già accodate vengono servite.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._dispatcher.join()
+
+    def __enter__(self) -> "MicroBatchingEmbeddingAdapter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------
+    # DISPATCHER
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            batch: List[_Request] = [first]
+            deadline = first[2] + self.max_wait_ms / 1000.0
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[_Request]) -> None:
+        # le richieste cancellate (es. task asyncio annullato) non vanno al modello
+        live = [req for req in batch if req[1].set_running_or_notify_cancel()]
+        if not live:
+            return
+
+        started = time.perf_counter()
+        texts = [text for text, _, _ in live]
+        fallback = False
+        try:
+            results = list(self.inner.embed_many(texts))
+            if len(results) != len(texts):
+                raise RuntimeError(f"Embedding adapter returned {len(results)} results for {len(texts)} texts")
+            outcomes: List[Tuple[Optional[EmbeddingResult], Optional[BaseException]]] = [
+                (result, None) for result in results
+            ]
+        except Exception:
+            fallback = True
+            outcomes = [self._embed_single(text) for text in texts]
+
+        failures = 0
+        for (_, future, _), (result, error) in zip(live, outcomes):
+            if error is not None:
+                failures += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        with self._lock:
+            self.stats.requests += len(live)
+            self.stats.batches += 1
+            self.stats.full_batches += len(batch) >= self.max_batch
+            self.stats.fallbacks += fallback
+            self.stats.failures += failures
+            self.stats.wait_ms += sum(started - queued for _, _, queued in live) * 1000.0
+
+    def _embed_single(self, text: str) -> Tuple[Optional[EmbeddingResult], Optional[BaseException]]:
+        try:
+            return self.inner.embed_one(text), None
+        except Exception as exc:
+            return None, exc
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from ..knowledge.queries import normalize_query_text
+from ..storage.cache import LRUCache, _MISSING
+from ..storage.sqlite.base import SQLiteStore
+from ..storage.sqlite.embeddings import MAX_SQL_PARAMS
+from .adapter import EmbeddingAdapter
+from .models import EmbeddingResult, EmbeddingVector, semantic_hash
+
+
+# ============================================================================
+# METRICHE
+# ============================================================================
+
+@dataclass
+class EmbeddingCacheStats:
+    """
+    Contatori della cache di embedding.
+
+    Contati per testo richiesto; i byte sono quelli dei vettori
+    float32 impacchettati.
+    """
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    embedded: int = 0            # testi effettivamente passati al modello
+    bytes_read: int = 0          # letti dal tier su disco
+    bytes_written: int = 0       # scritti sul tier su disco
+    model_changes: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        data: Dict[str, float] = dict(asdict(self))
+        data["hits"] = self.hits
+        data["hit_ratio"] = self.hit_ratio
+        return data
+
+
+def pack_vector(values: Iterable[float]) -> bytes:
+    return array("f", values).tobytes()
+
+
+def unpack_vector(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+# ============================================================================
+# TIER SU DISCO
+# ============================================================================
+
+class SQLiteEmbeddingCache(SQLiteStore):
+    """
+    Vettori calcolati, per (modello, hash del testo normalizzato).
+
+    I vettori sono salvati come float32 impacchettati; le voci di
+    modelli diversi convivono nello stesso file senza interferire.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            model_name TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            PRIMARY KEY (model_name, text_hash)
+        ) WITHOUT ROWID
+        """,
+    )
+
+    def get_many(self, model_name: str, hashes: Sequence[str]) -> Dict[str, bytes]:
+        found: Dict[str, bytes] = {}
+        for start in range(0, len(hashes), MAX_SQL_PARAMS):
+            chunk = list(hashes[start:start + MAX_SQL_PARAMS])
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._fetch_all(
+                f"""
+                SELECT text_hash, vector FROM embedding_cache
+                WHERE model_name = ? AND text_hash IN ({placeholders})
+                """,
+                [model_name, *chunk],
+            )
+            for row in rows:
+                found[row["text_hash"]] = row["vector"]
+        return found
+
+    def put_many(self, model_name: str, entries: Iterable[Tuple[str, bytes]]) -> int:
+        rows = [(model_name, key, len(blob) // 4, blob) for key, blob in entries]
+        if rows:
+            with self.transaction() as conn:
+                conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO embedding_cache (model_name, text_hash, dim, vector)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    rows,
+                )
+        return len(rows)
+
+    def purge(self, *, keep_model: Optional[str] = None) -> int:
+        """
+        Rimuove le voci di tutti i modelli tranne `keep_model` (tutte se None).
+        """
+        with self.transaction() as conn:
+            if keep_model is None:
+                cur = conn.execute("DELETE FROM embedding_cache")
+            else:
+                cur = conn.execute("DELETE FROM embedding_cache WHERE model_name != ?", (keep_model,))
+            return cur.rowcount
+
+    def size(self) -> Dict[str, int]:
+        row = self._fetch_one(
+            "SELECT COUNT(*) AS entries, COALESCE(SUM(LENGTH(vector)), 0) AS bytes FROM embedding_cache"
+        )
+        return {"entries": row["entries"], "bytes": row["bytes"]}
+
+
+# ============================================================================
+# ADAPTER CON CACHE
+# ============================================================================
+
+class CachedEmbeddingAdapter:
+    """
+    EmbeddingAdapter che memorizza i vettori di un adapter interno.
+
+    - chiave: (model_name, hash del testo normalizzato); testi che
+      differiscono solo per spazi o forma Unicode condividono la voce
+    - tier in memoria: LRU di vettori impacchettati (float32)
+    - tier su disco opzionale: SQLiteEmbeddingCache, sopravvive ai riavvii
+    - `embed_many` passa al modello solo i testi mancanti (una volta
+      ciascuno, anche se ripetuti nel lotto)
+
+    Il nome del modello interno viene riletto a ogni chiamata: se cambia,
+    il tier in memoria viene svuotato e le voci del modello precedente
+    non sono più raggiungibili (rimosse dal disco con `purge_stale`).
+
+    I vettori restituiti passano sempre per float32, anche ai miss:
+    il risultato non dipende dallo stato della cache.
+    """
+
+    def __init__(
+        self,
+        inner: EmbeddingAdapter,
+        *,
+        store: Optional[SQLiteEmbeddingCache] = None,
+        maxsize: int = 10_000,
+        normalize: Callable[[str], str] = normalize_query_text,
+        purge_stale: bool = False,
+    ) -> None:
+        self.inner = inner
+        self.store = store
+        self.normalize = normalize
+        self.purge_stale = purge_stale
+        self.stats = EmbeddingCacheStats()
+
+        self._memory = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self._model: Optional[str] = None
+
+    @classmethod
+    def open(cls, inner: EmbeddingAdapter, path: Union[str, Path], **options: Any) -> "CachedEmbeddingAdapter":
+        """
+        Adapter con tier su disco nel file SQLite `path`.
+        """
+        return cls(inner, store=SQLiteEmbeddingCache(path), **options)
+
+    @property
+    def model_name(self) -> str:
+        return self.inner.model_name
+
+    # ------------------------------------------------------------------
+    # EMBEDDING
+    # ------------------------------------------------------------------
+
+    def embed_one(self, text: str) -> EmbeddingResult:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: Sequence[str]) -> List[EmbeddingResult]:
+        model = self._check_model()
+        keys = [semantic_hash(self.normalize(text)) for text in texts]
+
+        blobs: Dict[str, bytes] = {}
+        for key in dict.fromkeys(keys):
+            blob = self._memory.get((model, key))
+            if blob is not _MISSING:
+                blobs[key] = blob
+
+        missing = [key for key in dict.fromkeys(keys) if key not in blobs]
+        disk: Dict[str, bytes] = {}
+        if missing and self.store is not None:
+            disk = self.store.get_many(model, missing)
+            for key, blob in disk.items():
+                blobs[key] = blob
+                self._memory.put((model, key), blob)
+
+        # un testo per chiave mancante
+        todo: Dict[str, str] = {}
+        for text, key in zip(texts, keys):
+            if key not in blobs and key not in todo:
+                todo[key] = text
+
+        computed: Dict[str, bytes] = {}
+        if todo:
+            results = self.inner.embed_many(list(todo.values()))
+            if len(results) != len(todo):
+                raise RuntimeError(f"Embedding adapter returned {len(results)} results for {len(todo)} texts")
+            for key, result in zip(todo, results):
+                computed[key] = pack_vector(result.vector.values)
+            for key, blob in computed.items():
+                blobs[key] = blob
+                self._memory.put((model, key), blob)
+            if self.store is not None:
+                self.store.put_many(model, computed.items())
+
+        with self._lock:
+            # ripetizioni nello stesso lotto contano come hit in memoria
+            self.stats.memory_hits += len(texts) - len(todo) - len(disk)
+            self.stats.disk_hits += len(disk)
+            self.stats.misses += len(todo)
+            self.stats.embedded += len(todo)
+            self.stats.bytes_read += sum(len(blob) for blob in disk.values())
+            if self.store is not None:
+                self.stats.bytes_written += sum(len(blob) for blob in computed.values())
+
+        out = []
+        for text, key in zip(texts, keys):
+            values = unpack_vector(blobs[key])
+            out.append(EmbeddingResult(
+                vector=EmbeddingVector(values=values, dim=len(values)),
+                text=text,
+                semantic_hash=semantic_hash(text),
+                model_name=model,
+            ))
+        return out
+
+    # ------------------------------------------------------------------
+    # GESTIONE
+    # ------------------------------------------------------------------
+
+    def clear(self) -> None:
+        """
+        Svuota entrambi i tier.
+        """
+        self._memory.clear()
+        if self.store is not None:
+            self.store.purge()
+
+    def size(self) -> Dict[str, int]:
+        data = {"memory_entries": len(self._memory)}
+        if self.store is not None:
+            disk = self.store.size()
+            data["disk_entries"] = disk["entries"]
+            data["disk_bytes"] = disk["bytes"]
+        return data
+
+    def _check_model(self) -> str:
+        model = self.inner.model_name
+        if model == self._model:
+            return model
+        with self._lock:
+            if model != self._model:
+                if self._model is not None:
+                    self.stats.model_changes += 1
+                    self._memory.clear()
+                if self.purge_stale and self.store is not None:
+                    self.store.purge(keep_model=model)
+                self._model = model
+        return model
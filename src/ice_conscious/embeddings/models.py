@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 from dataclasses import dataclass
 from typing import Sequence, Optional
 
@@ -27,3 +28,13 @@ class EmbeddingResult:
     text: Optional[str] = None
     semantic_hash: Optional[str] = None
     model_name: Optional[str] = None
+
+
+def semantic_hash(text: str) -> str:
+    """
+    Hash del contenuto da cui si calcola un embedding
+    (valore di `EmbeddingResult.semantic_hash`).
+
+    Testo identico => stesso hash: l'embedding può essere riusato.
+    """
+    return hashlib.blake2b(text.encode("utf-8", errors="surrogatepass"), digest_size=16).hexdigest()
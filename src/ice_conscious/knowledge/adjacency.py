@@ -0,0 +1,464 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ice_conscious.storage.repositories.knowledge import KnowledgeRelationRecord
+
+
+# ============================================================
+# GRAFO DELLE RELAZIONI (CSR)
+# ============================================================
+
+class RelationGraph:
+    """
+    Indice di adiacenza compatto delle relazioni di un workspace.
+
+    NON è un knowledge graph: non interpreta le relazioni,
+    le rende solo percorribili in O(grado).
+
+    Struttura:
+    - id di entità e tipi di relazione internati a interi
+    - archi in colonne compatte (array): sorgente, destinazione,
+      codice tipo, forza, stato
+    - due viste CSR (uscenti / entranti) sugli ordinali degli archi
+    - gli archi aggiunti dopo l'ultima costruzione vivono in un delta;
+      le cancellazioni sono tombstone. Oltre `compact_ratio`
+      la CSR viene ricostruita.
+
+    Con `track_relation_ids=False` si risparmia la mappa
+    relation_id -> arco, ma `remove` non è più disponibile.
+    """
+
+    def __init__(self, *, compact_ratio: float = 0.25, track_relation_ids: bool = True) -> None:
+        self.compact_ratio = compact_ratio
+        self.track_relation_ids = track_relation_ids
+
+        # interning
+        self._node_ids: Dict[str, int] = {}
+        self._node_names: List[str] = []
+        self._type_ids: Dict[str, int] = {}
+        self._type_names: List[str] = []
+
+        # colonne degli archi (ordinale = posizione)
+        self._src = array("I")
+        self._dst = array("I")
+        self._type = array("H")
+        self._strength = array("f")
+        self._alive = bytearray()
+        self._relation_edge: Dict[str, int] = {}
+
+        # CSR costruita sugli archi [0, _built)
+        self._out_offsets = array("I", [0])
+        self._out_edges = array("I")
+        self._in_offsets = array("I", [0])
+        self._in_edges = array("I")
+        self._built = 0
+
+        # delta: archi successivi alla costruzione, per nodo
+        self._pending_out: Dict[int, List[int]] = {}
+        self._pending_in: Dict[int, List[int]] = {}
+        self._dead = 0
+
+        # incrementata a ogni add/remove: chi mantiene stato derivato
+        # (es. CentralityEngine) riconosce le modifiche avvenute altrove
+        self._version = 0
+
+        self._lock = threading.RLock()
+
+    # ----------------------------------------------------------
+    # COSTRUZIONE
+    # ----------------------------------------------------------
+
+    @classmethod
+    def from_relations(
+        cls,
+        relations: Iterable[KnowledgeRelationRecord],
+        **kwargs: Any,
+    ) -> "RelationGraph":
+        graph = cls(**kwargs)
+        with graph._lock:
+            for r in relations:
+                graph._append(r)
+            graph._rebuild()
+        return graph
+
+    def add(self, relation: KnowledgeRelationRecord) -> None:
+        """
+        Registra (o sostituisce) una relazione.
+        """
+        with self._lock:
+            if relation.relation_id in self._relation_edge:
+                self._kill(self._relation_edge[relation.relation_id])
+
+            edge = self._append(relation)
+            self._pending_out.setdefault(self._src[edge], []).append(edge)
+            self._pending_in.setdefault(self._dst[edge], []).append(edge)
+            self._version += 1
+            self._maybe_compact()
+
+    def remove(self, relation_id: str) -> bool:
+        """
+        Rimuove una relazione; False se non era indicizzata.
+        """
+        with self._lock:
+            edge = self._relation_edge.pop(relation_id, None)
+            if edge is None:
+                return False
+            self._kill(edge)
+            self._version += 1
+            self._maybe_compact()
+            return True
+
+    def compact(self) -> None:
+        """
+        Ricostruisce la CSR eliminando tombstone e delta.
+        """
+        with self._lock:
+            self._rebuild()
+
+    # ----------------------------------------------------------
+    # INTERNING
+    # ----------------------------------------------------------
+
+    def intern(self, node_id: str) -> int:
+        idx = self._node_ids.get(node_id)
+        if idx is None:
+            idx = len(self._node_names)
+            self._node_ids[node_id] = idx
+            self._node_names.append(node_id)
+        return idx
+
+    def index_of(self, node_id: str) -> Optional[int]:
+        return self._node_ids.get(node_id)
+
+    def node_id(self, idx: int) -> str:
+        return self._node_names[idx]
+
+    def type_code(self, relation_type: str) -> Optional[int]:
+        return self._type_ids.get(relation_type)
+
+    def type_name(self, code: int) -> str:
+        return self._type_names[code]
+
+    # ----------------------------------------------------------
+    # LETTURA (per indice)
+    # ----------------------------------------------------------
+
+    def out_edges_idx(self, idx: int) -> Iterator[Tuple[int, int, float]]:
+        """
+        Archi uscenti di un nodo: (destinazione, codice tipo, forza).
+        """
+        return self._edges(idx, self._out_offsets, self._out_edges, self._pending_out, self._dst)
+
+    def in_edges_idx(self, idx: int) -> Iterator[Tuple[int, int, float]]:
+        """
+        Archi entranti di un nodo: (sorgente, codice tipo, forza).
+        """
+        return self._edges(idx, self._in_offsets, self._in_edges, self._pending_in, self._src)
+
+    def _edges(
+        self,
+        idx: int,
+        offsets: array,
+        edges: array,
+        pending: Dict[int, List[int]],
+        other: array,
+    ) -> Iterator[Tuple[int, int, float]]:
+        alive = self._alive
+        types = self._type
+        strength = self._strength
+
+        if idx + 1 < len(offsets):
+            for e in edges[offsets[idx] : offsets[idx + 1]]:
+                if alive[e]:
+                    yield other[e], types[e], strength[e]
+
+        for e in pending.get(idx, ()):
+            if alive[e]:
+                yield other[e], types[e], strength[e]
+
+    # ----------------------------------------------------------
+    # LETTURA (per id)
+    # ----------------------------------------------------------
+
+    def out_edges(
+        self,
+        node_id: str,
+        relation_type: Optional[str] = None,
+    ) -> List[Tuple[str, str, float]]:
+        """
+        Relazioni uscenti: (target_id, relation_type, strength).
+        """
+        return self._named(self.out_edges_idx, node_id, relation_type)
+
+    def in_edges(
+        self,
+        node_id: str,
+        relation_type: Optional[str] = None,
+    ) -> List[Tuple[str, str, float]]:
+        """
+        Relazioni entranti: (source_id, relation_type, strength).
+        """
+        return self._named(self.in_edges_idx, node_id, relation_type)
+
+    def _named(self, fn, node_id: str, relation_type: Optional[str]) -> List[Tuple[str, str, float]]:
+        idx = self._node_ids.get(node_id)
+        if idx is None:
+            return []
+        code = None
+        if relation_type is not None:
+            code = self._type_ids.get(relation_type)
+            if code is None:
+                return []
+        names = self._node_names
+        tnames = self._type_names
+        return [
+            (names[n], tnames[t], s)
+            for n, t, s in fn(idx)
+            if code is None or t == code
+        ]
+
+    def out_degree(self, node_id: str) -> int:
+        idx = self._node_ids.get(node_id)
+        return 0 if idx is None else sum(1 for _ in self.out_edges_idx(idx))
+
+    def in_degree(self, node_id: str) -> int:
+        idx = self._node_ids.get(node_id)
+        return 0 if idx is None else sum(1 for _ in self.in_edges_idx(idx))
+
+    # ----------------------------------------------------------
+    # INTROSPECTION
+    # ----------------------------------------------------------
+
+    @property
+    def node_count(self) -> int:
+        return len(self._node_names)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._alive) - self._dead
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def memory_bytes(self) -> int:
+        """
+        Byte occupati dalle strutture a colonne (esclusi i dizionari
+        di interning).
+        """
+        columns = (
+            self._src, self._dst, self._type, self._strength,
+            self._out_offsets, self._out_edges, self._in_offsets, self._in_edges,
+        )
+        return sum(c.itemsize * len(c) for c in columns) + len(self._alive)
+
+    def edge_of(self, relation_id: str) -> Optional[Tuple[int, int, int, float]]:
+        """
+        Arco vivo di una relazione: (sorgente, destinazione, codice tipo, forza).
+        """
+        e = self._relation_edge.get(relation_id)
+        if e is None or not self._alive[e]:
+            return None
+        return self._src[e], self._dst[e], self._type[e], self._strength[e]
+
+    def edge_columns(self) -> Tuple[array, array, array, bytearray]:
+        """
+        Colonne grezze degli archi: sorgente, destinazione, forza, vivo.
+
+        Sono le strutture interne (nessuna copia): sola lettura.
+        Utili per calcoli vettoriali sull'intero grafo.
+        """
+        return self._src, self._dst, self._strength, self._alive
+
+    def iter_edges_idx(self) -> Iterator[Tuple[int, int, int, float]]:
+        """
+        Tutti gli archi vivi: (sorgente, destinazione, codice tipo, forza).
+        """
+        alive = self._alive
+        for e in range(len(alive)):
+            if alive[e]:
+                yield self._src[e], self._dst[e], self._type[e], self._strength[e]
+
+    # ----------------------------------------------------------
+    # INTERNAL
+    # ----------------------------------------------------------
+
+    def _append(self, relation: KnowledgeRelationRecord) -> int:
+        code = self._type_ids.get(relation.relation_type)
+        if code is None:
+            code = len(self._type_names)
+            self._type_ids[relation.relation_type] = code
+            self._type_names.append(relation.relation_type)
+
+        edge = len(self._alive)
+        self._src.append(self.intern(relation.source_id))
+        self._dst.append(self.intern(relation.target_id))
+        self._type.append(code)
+        self._strength.append(float(relation.strength))
+        self._alive.append(1)
+
+        if self.track_relation_ids:
+            self._relation_edge[relation.relation_id] = edge
+        return edge
+
+    def _kill(self, edge: int) -> None:
+        if self._alive[edge]:
+            self._alive[edge] = 0
+            self._dead += 1
+
+    def _maybe_compact(self) -> None:
+        churn = self._dead + len(self._alive) - self._built
+        if churn > max(1024, self.compact_ratio * len(self._alive)):
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        # 1) scarta gli archi morti, rinumerando gli ordinali
+        if self._dead:
+            keep = [e for e in range(len(self._alive)) if self._alive[e]]
+            remap = {old: new for new, old in enumerate(keep)}
+            self._src = array("I", (self._src[e] for e in keep))
+            self._dst = array("I", (self._dst[e] for e in keep))
+            self._type = array("H", (self._type[e] for e in keep))
+            self._strength = array("f", (self._strength[e] for e in keep))
+            self._alive = bytearray(b"\x01" * len(keep))
+            self._relation_edge = {
+                rid: remap[e] for rid, e in self._relation_edge.items() if e in remap
+            }
+            self._dead = 0
+
+        # 2) counting sort degli ordinali per sorgente e per destinazione
+        n = len(self._node_names)
+        self._out_offsets, self._out_edges = self._csr(self._src, n)
+        self._in_offsets, self._in_edges = self._csr(self._dst, n)
+
+        self._built = len(self._alive)
+        self._pending_out = {}
+        self._pending_in = {}
+
+    @staticmethod
+    def _csr(keys: array, n: int) -> Tuple[array, array]:
+        counts = [0] * (n + 1)
+        for k in keys:
+            counts[k + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+
+        offsets = array("I", counts)
+        cursor = list(counts)
+        edges = array("I", bytes(4 * len(keys)))
+        for e, k in enumerate(keys):
+            edges[cursor[k]] = e
+            cursor[k] += 1
+        return offsets, edges
+
+
+# ============================================================
+# INDICE PER WORKSPACE
+# ============================================================
+
+class AdjacencyIndex:
+    """
+    Un RelationGraph per workspace, costruito pigramente dal
+    KnowledgeRepository e tenuto allineato alle scritture.
+
+    Con un CentralityEngine agganciato (`centrality`) le scritture
+    del workspace passano dal motore, che aggiorna grafo e PageRank
+    in un solo passo.
+    """
+
+    def __init__(self, repository: Any = None, **graph_options: Any) -> None:
+        self.repository = repository
+        self._graph_options = graph_options
+        self._graphs: Dict[str, RelationGraph] = {}
+        self._engines: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def graph(self, workspace_id: str) -> RelationGraph:
+        graph = self._graphs.get(workspace_id)
+        if graph is not None:
+            return graph
+
+        with self._lock:
+            graph = self._graphs.get(workspace_id)
+            if graph is None:
+                relations = (
+                    self.repository.list_relations(workspace_id)
+                    if self.repository is not None
+                    else ()
+                )
+                graph = RelationGraph.from_relations(relations, **self._graph_options)
+                self._graphs[workspace_id] = graph
+        return graph
+
+    def centrality(self, workspace_id: str, **options: Any) -> Any:
+        """
+        CentralityEngine del workspace, creato al primo uso e agganciato
+        alle scritture dell'indice (`options` valgono solo alla creazione).
+        """
+        engine = self._engines.get(workspace_id)
+        if engine is not None:
+            return engine
+
+        from .centrality import CentralityEngine
+
+        graph = self.graph(workspace_id)
+        with self._lock:
+            engine = self._engines.get(workspace_id)
+            if engine is None:
+                engine = CentralityEngine(graph, **options)
+                self._engines[workspace_id] = engine
+        return engine
+
+    def on_save(self, relation: KnowledgeRelationRecord) -> None:
+        engine = self._engines.get(relation.workspace_id)
+        if engine is not None:
+            engine.add_relation(relation)
+        else:
+            self.graph(relation.workspace_id).add(relation)
+
+    def on_delete(self, relation_id: str) -> None:
+        for workspace_id, graph in list(self._graphs.items()):
+            if graph.edge_of(relation_id) is None:
+                continue
+            engine = self._engines.get(workspace_id)
+            if engine is not None:
+                engine.remove_relation(relation_id)
+            else:
+                graph.remove(relation_id)
+            return
+
+    def drop(self, workspace_id: str) -> None:
+        with self._lock:
+            self._graphs.pop(workspace_id, None)
+            self._engines.pop(workspace_id, None)
+
+
+class IndexedKnowledgeRepository:
+    """
+    Proxy di un KnowledgeRepository che mantiene aggiornato
+    l'AdjacencyIndex su save_relation / delete_relation.
+    """
+
+    def __init__(self, backend: Any, index: Optional[AdjacencyIndex] = None) -> None:
+        self.backend = backend
+        self.index = index or AdjacencyIndex(backend)
+        if self.index.repository is None:
+            self.index.repository = backend
+
+    def save_relation(self, relation: KnowledgeRelationRecord) -> KnowledgeRelationRecord:
+        saved = self.backend.save_relation(relation)
+        self.index.on_save(saved or relation)
+        return saved
+
+    def delete_relation(self, relation_id: str) -> None:
+        self.backend.delete_relation(relation_id)
+        self.index.on_delete(relation_id)
+
+    def graph(self, workspace_id: str) -> RelationGraph:
+        return self.index.graph(workspace_id)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.backend, name)
@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Optional
+
+from ice_conscious.storage.repositories.knowledge import KnowledgeRelationRecord
+from .adjacency import RelationGraph
+from .entities import KnowledgeEntity
+
+try:
+    import numpy as np
+except ImportError:  # extra "ml" non installato
+    np = None
+
+
+# ============================================================
+# CENTRALITY ENGINE
+# ============================================================
+
+class CentralityEngine:
+    """
+    PageRank pesato sul grafo delle relazioni, con aggiornamento locale.
+
+    Modello:
+    - transizioni proporzionali a `strength` sugli archi uscenti
+    - teleport uniforme (1 per nodo), damping `damping`
+    - i nodi senza archi uscenti non ridistribuiscono massa
+
+    `recompute()` esegue la power iteration completa (vettoriale
+    con NumPy se disponibile). Le modifiche successive agli archi
+    aggiornano i residui solo attorno al nodo toccato e li propagano
+    con forward push finché restano sopra `push_epsilon`:
+    nessun ricalcolo globale per inserimento. Lo scarto rispetto a un
+    ricalcolo completo resta dell'ordine di `push_epsilon` (`drift()`).
+
+    Lo score esposto ha media 1 sul workspace: > 1 significa
+    più centrale della media. `connection_count` (archi entranti
+    + uscenti) è mantenuto in modo esatto.
+
+    Le scritture dovrebbero passare da `add_relation` /
+    `remove_relation` (AdjacencyIndex lo fa con `centrality()`).
+    Se il grafo viene modificato altrove, il motore se ne accorge
+    da `RelationGraph.version` e ricalcola da zero al primo accesso.
+    """
+
+    def __init__(
+        self,
+        graph: RelationGraph,
+        *,
+        damping: float = 0.85,
+        tolerance: float = 1e-6,
+        max_iterations: int = 100,
+        push_epsilon: float = 1e-3,
+    ) -> None:
+        self.graph = graph
+        self.damping = damping
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.push_epsilon = push_epsilon
+
+        self._rank = array("d")        # stima p
+        self._residual = array("d")    # residuo r
+        self._out_weight = array("d")
+        self._degree = array("l")
+        self._mass = 0.0
+        self._version = -1             # versione del grafo rispecchiata
+
+        self._lock = threading.RLock()
+        self.recompute()
+
+    # ----------------------------------------------------------
+    # CALCOLO COMPLETO
+    # ----------------------------------------------------------
+
+    def recompute(self) -> int:
+        """
+        PageRank completo; ritorna il numero di iterazioni.
+        """
+        with self._lock:
+            version = self.graph.version
+            n = self.graph.node_count
+            src, dst, strength, alive = self.graph.edge_columns()
+
+            if np is not None:
+                iterations = self._recompute_numpy(n, src, dst, strength, alive)
+            else:
+                iterations = self._recompute_python(n, src, dst, strength, alive)
+
+            self._residual = array("d", bytes(8 * n))
+            self._mass = sum(self._rank)
+            self._version = version
+            return iterations
+
+    def _sync(self) -> None:
+        # il grafo è cambiato senza passare dal motore: gli array
+        # non corrispondono più, si riparte da un calcolo completo
+        if self._version != self.graph.version:
+            self.recompute()
+
+    def _recompute_numpy(self, n, src, dst, strength, alive) -> int:
+        m = len(alive)
+        mask = np.frombuffer(alive, dtype=np.uint8, count=m).astype(bool)
+        s = np.frombuffer(src, dtype=np.uint32, count=m)[mask].astype(np.intp)
+        t = np.frombuffer(dst, dtype=np.uint32, count=m)[mask].astype(np.intp)
+        w = np.frombuffer(strength, dtype=np.float32, count=m)[mask].astype(np.float64)
+
+        out_weight = np.bincount(s, weights=w, minlength=n)
+        degree = np.bincount(s, minlength=n) + np.bincount(t, minlength=n)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            coef = np.where(out_weight[s] > 0, w / out_weight[s], 0.0)
+
+        d = self.damping
+        x = np.ones(n)
+        iterations = 0
+        for iterations in range(1, self.max_iterations + 1):
+            x_new = (1.0 - d) + d * np.bincount(t, weights=x[s] * coef, minlength=n)
+            delta = float(np.abs(x_new - x).sum())
+            x = x_new
+            if delta < self.tolerance * max(n, 1):
+                break
+
+        self._rank = array("d", x.tobytes())
+        self._out_weight = array("d", out_weight.astype(np.float64).tobytes())
+        self._degree = array("l", degree.astype(np.int_).tolist())
+        return iterations
+
+    def _recompute_python(self, n, src, dst, strength, alive) -> int:
+        out_weight = [0.0] * n
+        degree = [0] * n
+        edges = []
+        for e in range(len(alive)):
+            if alive[e]:
+                u, v, w = src[e], dst[e], strength[e]
+                out_weight[u] += w
+                degree[u] += 1
+                degree[v] += 1
+                edges.append((u, v, w))
+
+        d = self.damping
+        x = [1.0] * n
+        iterations = 0
+        for iterations in range(1, self.max_iterations + 1):
+            x_new = [1.0 - d] * n
+            for u, v, w in edges:
+                if out_weight[u] > 0:
+                    x_new[v] += d * x[u] * w / out_weight[u]
+            delta = sum(abs(a - b) for a, b in zip(x_new, x))
+            x = x_new
+            if delta < self.tolerance * max(n, 1):
+                break
+
+        self._rank = array("d", x)
+        self._out_weight = array("d", out_weight)
+        self._degree = array("l", degree)
+        return iterations
+
+    # ----------------------------------------------------------
+    # AGGIORNAMENTO INCREMENTALE
+    # ----------------------------------------------------------
+
+    def add_relation(self, relation: KnowledgeRelationRecord) -> None:
+        """
+        Registra una relazione nel grafo e aggiorna la centralità localmente.
+        """
+        with self._lock:
+            self._sync()
+            if self.graph.edge_of(relation.relation_id) is not None:
+                self.remove_relation(relation.relation_id)
+
+            self.graph.add(relation)
+            self._version = self.graph.version
+            self._grow()
+
+            # peso come memorizzato nel grafo (float32), lo stesso che
+            # remove_relation sottrarrà: nessun residuo di arrotondamento
+            u, v, _, w = self.graph.edge_of(relation.relation_id)
+
+            self._degree[u] += 1
+            self._degree[v] += 1
+            self._reweight(u, changed=v, weight=w, added=True)
+
+    def remove_relation(self, relation_id: str) -> bool:
+        """
+        Rimuove una relazione dal grafo e aggiorna la centralità localmente.
+        """
+        with self._lock:
+            self._sync()
+            edge = self.graph.edge_of(relation_id)
+            if edge is None:
+                return False
+            u, v, _, w = edge
+
+            self.graph.remove(relation_id)
+            self._version = self.graph.version
+            self._degree[u] -= 1
+            self._degree[v] -= 1
+            self._reweight(u, changed=v, weight=w, added=False)
+            return True
+
+    def _grow(self) -> None:
+        n = self.graph.node_count
+        missing = n - len(self._rank)
+        if missing <= 0:
+            return
+        self._rank.extend([0.0] * missing)
+        # ogni nuovo nodo porta la propria massa di teleport
+        self._residual.extend([1.0] * missing)
+        self._out_weight.extend([0.0] * missing)
+        self._degree.extend([0] * missing)
+        self._push(range(n - missing, n))
+
+    def _reweight(self, u: int, *, changed: int, weight: float, added: bool) -> None:
+        """
+        Corregge i residui dopo che la riga di transizione di `u` è cambiata.
+
+        Con r = s - (I - d·Pᵀ)p / (1 - d), cambiare P solo sulla riga u
+        sposta r di d·p[u]·(P'[u,:] - P[u,:]) / (1 - d): tocca solo
+        i vicini uscenti di u.
+        """
+        d = self.damping
+        out_edges = list(self.graph.out_edges_idx(u))
+        # peso uscente riletto dagli archi (non accumulato): esattamente 0
+        # quando u non ha più archi uscenti, senza deriva tra add e remove
+        new_w = sum(w_z for _, _, w_z in out_edges)
+        old_w = self._out_weight[u]
+        self._out_weight[u] = new_w
+
+        scale = d * self._rank[u] / (1.0 - d)
+        touched = []
+
+        if scale:
+            for z, _, w_z in out_edges:
+                delta = (w_z / new_w if new_w else 0.0) - (w_z / old_w if old_w else 0.0)
+                self._residual[z] += scale * delta
+                touched.append(z)
+
+            # l'arco cambiato: presente solo nella riga nuova o solo nella vecchia
+            if added and old_w:
+                self._residual[changed] += scale * (weight / old_w)
+            elif not added and old_w:
+                self._residual[changed] -= scale * (weight / old_w)
+            touched.append(changed)
+
+        self._push(touched)
+
+    def _push(self, seeds: Iterable[int]) -> None:
+        d = self.damping
+        eps = self.push_epsilon
+        rank = self._rank
+        residual = self._residual
+        out_weight = self._out_weight
+        graph = self.graph
+
+        queue: Deque[int] = deque(v for v in seeds if abs(residual[v]) > eps)
+        queued = set(queue)
+
+        while queue:
+            v = queue.popleft()
+            queued.discard(v)
+            r = residual[v]
+            if abs(r) <= eps:
+                continue
+
+            residual[v] = 0.0
+            rank[v] += (1.0 - d) * r
+            self._mass += (1.0 - d) * r
+
+            total = out_weight[v]
+            if not total:
+                continue
+            share = d * r / total
+            for z, _, w in graph.out_edges_idx(v):
+                residual[z] += share * w
+                if z not in queued and abs(residual[z]) > eps:
+                    queue.append(z)
+                    queued.add(z)
+
+    # ----------------------------------------------------------
+    # LETTURA
+    # ----------------------------------------------------------
+
+    def score(self, entity_id: str) -> Optional[float]:
+        """
+        Centralità relativa (media 1) di una entità.
+        """
+        with self._lock:
+            self._sync()
+        idx = self.graph.index_of(entity_id)
+        if idx is None or idx >= len(self._rank) or self._mass <= 0:
+            return None
+        return self._rank[idx] * len(self._rank) / self._mass
+
+    def drift(self) -> float:
+        """
+        Scarto massimo tra gli score correnti e un PageRank completo
+        sullo stesso grafo (verifica dell'aggiornamento incrementale).
+        """
+        with self._lock:
+            self._sync()
+            current = self.scores()
+            reference = CentralityEngine(
+                self.graph,
+                damping=self.damping,
+                tolerance=self.tolerance,
+                max_iterations=self.max_iterations,
+            ).scores()
+        return max((abs(current.get(k, 0.0) - v) for k, v in reference.items()), default=0.0)
+
+    def connection_count(self, entity_id: str) -> int:
+        with self._lock:
+            self._sync()
+        idx = self.graph.index_of(entity_id)
+        if idx is None or idx >= len(self._degree):
+            return 0
+        return int(self._degree[idx])
+
+    def scores(self) -> Dict[str, float]:
+        with self._lock:
+            self._sync()
+        n = len(self._rank)
+        if not n or self._mass <= 0:
+            return {}
+        factor = n / self._mass
+        return {self.graph.node_id(i): self._rank[i] * factor for i in range(n)}
+
+    def apply(self, entity: KnowledgeEntity) -> KnowledgeEntity:
+        """
+        Popola centrality_score e connection_count di una KnowledgeEntity.
+        """
+        entity.centrality_score = self.score(entity.entity_id)
+        entity.connection_count = self.connection_count(entity.entity_id)
+        return entity
+
+    def scoring_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Aggiunge `centrality` a un item per `score_entities`
+        (chiave `entity_id` richiesta).
+        """
+        item["centrality"] = self.score(item["entity_id"])
+        return item
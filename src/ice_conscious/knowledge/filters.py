@@ -0,0 +1,607 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .graph import KnowledgeFilter
+
+
+# ============================================================
+# BITMAP (ROARING)
+# ============================================================
+
+_ARRAY_MAX = 4096          # oltre: container a bitset
+_CHUNK_BITS = 1 << 16
+
+
+def _to_bits(values: Iterable[int]) -> int:
+    buf = bytearray(_CHUNK_BITS // 8)
+    for v in values:
+        buf[v >> 3] |= 1 << (v & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _from_bits(bits: int) -> array:
+    out = array("H")
+    data = bits.to_bytes(_CHUNK_BITS // 8, "little")
+    for i, byte in enumerate(data):
+        if byte:
+            base = i << 3
+            for j in range(8):
+                if byte >> j & 1:
+                    out.append(base + j)
+    return out
+
+
+def _normalize(container: Any) -> Any:
+    """
+    Array ordinato fino a _ARRAY_MAX elementi, bitset oltre; None se vuoto.
+    """
+    if isinstance(container, int):
+        count = container.bit_count()
+        if count == 0:
+            return None
+        return _from_bits(container) if count <= _ARRAY_MAX else container
+    if not container:
+        return None
+    return _to_bits(container) if len(container) > _ARRAY_MAX else container
+
+
+class Bitmap:
+    """
+    Insieme di interi non negativi in stile roaring.
+
+    Gli interi sono divisi in chunk da 2^16 (16 bit alti); ogni chunk
+    è un array ordinato di 16 bit bassi se sparso, un bitset
+    (int Python) se denso. Intersezioni e unioni lavorano per chunk
+    e solo sui chunk presenti in entrambi gli operandi.
+    """
+
+    __slots__ = ("_chunks",)
+
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        self._chunks: Dict[int, Any] = {}
+        grouped: Dict[int, Set[int]] = {}
+        for v in values:
+            grouped.setdefault(v >> 16, set()).add(v & 0xFFFF)
+        for high, lows in grouped.items():
+            self._chunks[high] = _normalize(array("H", sorted(lows)))
+
+    @classmethod
+    def _of(cls, chunks: Dict[int, Any]) -> "Bitmap":
+        bitmap = cls()
+        bitmap._chunks = chunks
+        return bitmap
+
+    # ----------------------------------------------------------
+    # MODIFICA
+    # ----------------------------------------------------------
+
+    def add(self, value: int) -> None:
+        high, low = value >> 16, value & 0xFFFF
+        container = self._chunks.get(high)
+        if container is None:
+            self._chunks[high] = array("H", [low])
+        elif isinstance(container, int):
+            self._chunks[high] = container | (1 << low)
+        else:
+            i = bisect_left(container, low)
+            if i == len(container) or container[i] != low:
+                container.insert(i, low)
+                if len(container) > _ARRAY_MAX:
+                    self._chunks[high] = _to_bits(container)
+
+    def discard(self, value: int) -> None:
+        high, low = value >> 16, value & 0xFFFF
+        container = self._chunks.get(high)
+        if container is None:
+            return
+        if isinstance(container, int):
+            container &= ~(1 << low)
+        else:
+            i = bisect_left(container, low)
+            if i < len(container) and container[i] == low:
+                del container[i]
+        container = _normalize(container)
+        if container is None:
+            del self._chunks[high]
+        else:
+            self._chunks[high] = container
+
+    # ----------------------------------------------------------
+    # LETTURA
+    # ----------------------------------------------------------
+
+    def __contains__(self, value: int) -> bool:
+        container = self._chunks.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        i = bisect_left(container, low)
+        return i < len(container) and container[i] == low
+
+    def __len__(self) -> int:
+        return sum(
+            c.bit_count() if isinstance(c, int) else len(c)
+            for c in self._chunks.values()
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self._chunks)
+
+    def __iter__(self) -> Iterator[int]:
+        for high in sorted(self._chunks):
+            container = self._chunks[high]
+            lows = _from_bits(container) if isinstance(container, int) else container
+            base = high << 16
+            for low in lows:
+                yield base + low
+
+    def copy(self) -> "Bitmap":
+        return Bitmap._of({
+            h: c if isinstance(c, int) else array("H", c)
+            for h, c in self._chunks.items()
+        })
+
+    # ----------------------------------------------------------
+    # ALGEBRA
+    # ----------------------------------------------------------
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        chunks = {}
+        small, large = sorted((self._chunks, other._chunks), key=len)
+        for high, a in small.items():
+            b = large.get(high)
+            if b is None:
+                continue
+            if isinstance(a, int) and isinstance(b, int):
+                c = a & b
+            elif isinstance(a, int):
+                c = array("H", (x for x in b if a >> x & 1))
+            elif isinstance(b, int):
+                c = array("H", (x for x in a if b >> x & 1))
+            else:
+                c = array("H", sorted(set(a).intersection(b)))
+            c = _normalize(c)
+            if c is not None:
+                chunks[high] = c
+        return Bitmap._of(chunks)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        chunks = dict(self._chunks)
+        for high, b in other._chunks.items():
+            a = chunks.get(high)
+            if a is None:
+                chunks[high] = b
+                continue
+            if isinstance(a, int) or isinstance(b, int):
+                c = (a if isinstance(a, int) else _to_bits(a)) | (b if isinstance(b, int) else _to_bits(b))
+            else:
+                c = array("H", sorted(set(a).union(b)))
+            chunks[high] = _normalize(c)
+        return Bitmap._of(chunks)
+
+    def __sub__(self, other: "Bitmap") -> "Bitmap":
+        chunks = {}
+        for high, a in self._chunks.items():
+            b = other._chunks.get(high)
+            if b is None:
+                chunks[high] = a
+                continue
+            if isinstance(a, int):
+                c = a & ~(b if isinstance(b, int) else _to_bits(b))
+            elif isinstance(b, int):
+                c = array("H", (x for x in a if not b >> x & 1))
+            else:
+                drop = set(b)
+                c = array("H", (x for x in a if x not in drop))
+            c = _normalize(c)
+            if c is not None:
+                chunks[high] = c
+        return Bitmap._of(chunks)
+
+    @staticmethod
+    def union(bitmaps: Iterable["Bitmap"]) -> "Bitmap":
+        result = Bitmap()
+        for b in bitmaps:
+            result = result | b
+        return result
+
+
+# ============================================================
+# INDICE DEI CAMPI (UN WORKSPACE)
+# ============================================================
+
+_RESERVED = ("entity_type", "entity_id", "name", "description", "confidence_score", "relevance_score")
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def record_fields(record: Any) -> Dict[str, Any]:
+    """
+    Campi filtrabili di un KnowledgeRecord (o vista equivalente),
+    con gli stessi nomi usati dai KnowledgeFilter.
+
+    I campi di metadata/properties sono indicizzati sia con prefisso
+    ("metadata.lang") sia senza ("lang": prima metadata, poi properties).
+    """
+    metadata = dict(getattr(record, "metadata", None) or {})
+    properties = dict(getattr(record, "properties", None) or {})
+
+    fields: Dict[str, Any] = {
+        "entity_id": getattr(record, "entity_id", None),
+        "entity_type": getattr(record, "kind", None) or getattr(record, "entity_type", None),
+        "name": getattr(record, "name", None),
+        "description": getattr(record, "description", None),
+        "confidence_score": getattr(record, "confidence", getattr(record, "confidence_score", None)),
+        "relevance_score": getattr(record, "relevance", getattr(record, "relevance_score", None)),
+    }
+    for key, value in properties.items():
+        fields[f"properties.{key}"] = value
+        if key not in _RESERVED:
+            fields[key] = value
+    for key, value in metadata.items():
+        fields[f"metadata.{key}"] = value
+        if key not in _RESERVED:
+            fields[key] = value
+    return fields
+
+
+class _SortedIndex:
+    """
+    Coppie (valore, ordinale) ordinate, per lt/gt su campi numerici.
+    Le aggiunte restano in un buffer fino alla prossima interrogazione.
+    """
+
+    __slots__ = ("pairs", "pending")
+
+    def __init__(self) -> None:
+        self.pairs: List[Tuple[Any, int]] = []
+        self.pending: List[Tuple[Any, int]] = []
+
+    def add(self, value: Any, ordinal: int) -> None:
+        self.pending.append((value, ordinal))
+
+    def remove(self, value: Any, ordinal: int) -> None:
+        try:
+            self.pending.remove((value, ordinal))
+            return
+        except ValueError:
+            pass
+        i = bisect_left(self.pairs, (value, ordinal))
+        if i < len(self.pairs) and self.pairs[i] == (value, ordinal):
+            del self.pairs[i]
+
+    def _settle(self) -> None:
+        if self.pending:
+            if len(self.pending) > len(self.pairs) // 8:
+                self.pairs.extend(self.pending)
+                self.pairs.sort()
+            else:
+                for pair in self.pending:
+                    insort(self.pairs, pair)
+            self.pending = []
+
+    def below(self, value: Any) -> Tuple[int, int]:
+        self._settle()
+        return 0, bisect_left(self.pairs, (value, -1))
+
+    def above(self, value: Any) -> Tuple[int, int]:
+        self._settle()
+        return bisect_right(self.pairs, (value, float("inf"))), len(self.pairs)
+
+    def bitmap(self, span: Tuple[int, int]) -> Bitmap:
+        lo, hi = span
+        return Bitmap(ordinal for _, ordinal in self.pairs[lo:hi])
+
+
+class FieldIndex:
+    """
+    Indici per campo delle entità di un workspace.
+
+    - per ogni campo: valore -> Bitmap degli ordinali; gli elementi
+      di liste/tuple (es. tag) hanno un dizionario a parte
+    - per i campi numerici: indice ordinato per lt/gt
+    - ordinali internati per id, non riusati dopo la cancellazione
+    """
+
+    def __init__(self) -> None:
+        self._ordinals: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._alive = Bitmap()
+        self._doc_fields: Dict[int, Dict[str, Any]] = {}
+
+        self._values: Dict[str, Dict[Hashable, Bitmap]] = {}     # valori scalari
+        self._members: Dict[str, Dict[Hashable, Bitmap]] = {}    # elementi di liste
+        self._ranges: Dict[str, _SortedIndex] = {}
+        self._non_numeric: Dict[str, int] = {}
+
+        self._lock = threading.RLock()
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._ordinals
+
+    # ----------------------------------------------------------
+    # SCRITTURA
+    # ----------------------------------------------------------
+
+    def add(self, doc_id: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            self.remove(doc_id)
+
+            ordinal = len(self._ids)
+            self._ordinals[doc_id] = ordinal
+            self._ids.append(doc_id)
+            self._alive.add(ordinal)
+            indexed = {k: v for k, v in fields.items() if v is not None}
+            self._doc_fields[ordinal] = indexed
+
+            for name, value in indexed.items():
+                table, keys = self._table(name, value)
+                for key in keys:
+                    table.setdefault(key, Bitmap()).add(ordinal)
+                if _is_number(value):
+                    self._ranges.setdefault(name, _SortedIndex()).add(value, ordinal)
+                elif table is self._values.get(name):
+                    self._non_numeric[name] = self._non_numeric.get(name, 0) + 1
+
+    def add_record(self, record: Any) -> None:
+        self.add(record.entity_id, record_fields(record))
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            ordinal = self._ordinals.pop(doc_id, None)
+            if ordinal is None:
+                return False
+
+            self._alive.discard(ordinal)
+            self._ids[ordinal] = None
+            for name, value in self._doc_fields.pop(ordinal).items():
+                table, keys = self._table(name, value)
+                for key in keys:
+                    bitmap = table.get(key)
+                    if bitmap is not None:
+                        bitmap.discard(ordinal)
+                        if not bitmap:
+                            del table[key]
+                if _is_number(value):
+                    self._ranges[name].remove(value, ordinal)
+                elif table is self._values.get(name):
+                    self._non_numeric[name] -= 1
+            return True
+
+    def _table(self, name: str, value: Any) -> Tuple[Dict[Hashable, Bitmap], List[Hashable]]:
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return (
+                self._members.setdefault(name, {}),
+                list({v for v in value if isinstance(v, Hashable)}),
+            )
+        if not isinstance(value, Hashable):
+            return {}, []
+        return self._values.setdefault(name, {}), [value]
+
+    # ----------------------------------------------------------
+    # LETTURA
+    # ----------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._ordinals)
+
+    @property
+    def alive(self) -> Bitmap:
+        return self._alive
+
+    def ids(self, bitmap: Bitmap) -> List[str]:
+        ids = self._ids
+        return [ids[o] for o in bitmap]
+
+    def compile(self, filters: Sequence[KnowledgeFilter]) -> "FilterPlan":
+        return compile_filters(filters, self)
+
+
+# ============================================================
+# COMPILAZIONE DEI FILTRI
+# ============================================================
+
+@dataclass
+class FilterStep:
+    """
+    Un filtro tradotto in una strategia d'accesso.
+    """
+    filter: KnowledgeFilter
+    strategy: str               # bitmap, range, dictionary, empty, all
+    estimate: int
+    _run: Any = field(default=None, repr=False)
+
+    def run(self) -> Bitmap:
+        return self._run()
+
+
+@dataclass
+class FilterPlan:
+    """
+    Piano di esecuzione di una lista di KnowledgeFilter (in AND).
+
+    I passi sono ordinati per cardinalità stimata crescente:
+    l'intersezione parte dal più selettivo e si ferma appena vuota.
+    """
+    index: FieldIndex
+    steps: List[FilterStep] = field(default_factory=list)
+
+    def execute(self) -> Bitmap:
+        with self.index._lock:
+            result: Optional[Bitmap] = None
+            for step in self.steps:
+                bitmap = step.run()
+                result = bitmap if result is None else result & bitmap
+                if not result:
+                    return Bitmap()
+            return (result if result is not None else self.index.alive) & self.index.alive
+
+    def candidate_ids(self) -> Set[str]:
+        bitmap = self.execute()
+        with self.index._lock:
+            return set(self.index.ids(bitmap))
+
+    def explain(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "field": s.filter.field,
+                "op": s.filter.op,
+                "strategy": s.strategy,
+                "estimate": s.estimate,
+            }
+            for s in self.steps
+        ]
+
+
+def compile_filters(filters: Sequence[KnowledgeFilter], index: FieldIndex) -> FilterPlan:
+    """
+    Traduce i filtri in passi su bitmap / indici ordinati.
+
+    Semantica (come la valutazione su singola entità):
+    - eq: uguaglianza, o appartenenza se il campo è una lista
+    - ne: negazione di eq (vale anche per campo assente)
+    - in: il valore (o un elemento della lista) è tra quelli dati
+    - lt / gt: confronto; indice ordinato sui campi numerici,
+      altrimenti scansione dei valori distinti
+    - contains: elemento di una lista o sottostringa
+    """
+    plan = FilterPlan(index=index)
+    with index._lock:
+        for f in filters:
+            plan.steps.append(_compile_one(f, index))
+    plan.steps.sort(key=lambda s: s.estimate)
+    return plan
+
+
+def _compile_one(f: KnowledgeFilter, index: FieldIndex) -> FilterStep:
+    values = index._values.get(f.field, {})
+    members = index._members.get(f.field, {})
+    alive = len(index)
+
+    def exact(table: Dict[Hashable, Bitmap], value: Any) -> Bitmap:
+        if not isinstance(value, Hashable):
+            return Bitmap()
+        return table.get(value) or Bitmap()
+
+    def lookup(value: Any) -> Bitmap:
+        scalar, member = exact(values, value), exact(members, value)
+        if not member:
+            return scalar
+        return scalar | member if scalar else member
+
+    def scan(predicate: Any) -> Bitmap:
+        matched = []
+        for key, bitmap in values.items():
+            try:
+                if predicate(key):
+                    matched.append(bitmap)
+            except TypeError:
+                continue
+        return Bitmap.union(matched)
+
+    op = f.op
+    if op == "eq":
+        bitmap = lookup(f.value)
+        return FilterStep(f, "bitmap", len(bitmap), lambda: bitmap)
+
+    if op == "ne":
+        bitmap = lookup(f.value)
+        return FilterStep(f, "bitmap", alive - len(bitmap), lambda: index.alive - bitmap)
+
+    if op == "in":
+        bitmaps = [lookup(v) for v in f.value]
+        return FilterStep(
+            f, "bitmap", sum(len(b) for b in bitmaps), lambda: Bitmap.union(bitmaps)
+        )
+
+    if op in ("lt", "gt"):
+        ranges = index._ranges.get(f.field)
+        if ranges is not None and _is_number(f.value):
+            span = ranges.below(f.value) if op == "lt" else ranges.above(f.value)
+            if not index._non_numeric.get(f.field):
+                return FilterStep(f, "range", span[1] - span[0], lambda: ranges.bitmap(span))
+        if op == "lt":
+            return FilterStep(f, "dictionary", alive, lambda: scan(lambda k: k < f.value))
+        return FilterStep(f, "dictionary", alive, lambda: scan(lambda k: k > f.value))
+
+    if op == "contains":
+        # elemento di lista (chiave esatta) oppure sottostringa di un valore
+        return FilterStep(
+            f,
+            "dictionary",
+            alive,
+            lambda: exact(members, f.value) | scan(lambda k: isinstance(k, str) and f.value in k),
+        )
+
+    raise ValueError(f"Unsupported filter operator: {op!r}")
+
+
+# ============================================================
+# INDICE PER WORKSPACE
+# ============================================================
+
+class FilterIndex:
+    """
+    Un FieldIndex per workspace, costruito pigramente dal
+    KnowledgeRepository e tenuto allineato alle scritture.
+
+    I documenti ingeriti (non entità) possono essere registrati
+    con `add_document` usando i loro metadata.
+    """
+
+    def __init__(self, repository: Any = None) -> None:
+        self.repository = repository
+        self._indexes: Dict[str, FieldIndex] = {}
+        self._lock = threading.Lock()
+
+    def index(self, workspace_id: str) -> FieldIndex:
+        index = self._indexes.get(workspace_id)
+        if index is not None:
+            return index
+
+        with self._lock:
+            index = self._indexes.get(workspace_id)
+            if index is None:
+                index = FieldIndex()
+                if self.repository is not None:
+                    for record in self.repository.list_entities(workspace_id):
+                        index.add_record(record)
+                self._indexes[workspace_id] = index
+        return index
+
+    def on_save(self, record: Any) -> None:
+        self.index(record.workspace_id).add_record(record)
+
+    def on_delete(self, entity_id: str) -> None:
+        for index in list(self._indexes.values()):
+            if index.remove(entity_id):
+                return
+
+    def add_document(self, workspace_id: str, doc_id: str, metadata: Dict[str, Any]) -> None:
+        fields = {f"metadata.{k}": v for k, v in metadata.items()}
+        fields.update({k: v for k, v in metadata.items() if k not in _RESERVED})
+        fields["entity_id"] = doc_id
+        fields["entity_type"] = metadata.get("content_type", "document")
+        self.index(workspace_id).add(doc_id, fields)
+
+    def remove_document(self, workspace_id: str, doc_id: str) -> bool:
+        return self.index(workspace_id).remove(doc_id)
+
+    def drop(self, workspace_id: str) -> None:
+        with self._lock:
+            self._indexes.pop(workspace_id, None)
+
+    def compile(self, workspace_id: str, filters: Sequence[KnowledgeFilter]) -> FilterPlan:
+        return compile_filters(filters, self.index(workspace_id))
+
+    def candidates(self, workspace_id: str, filters: Sequence[KnowledgeFilter]) -> Set[str]:
+        return self.compile(workspace_id, filters).candidate_ids()
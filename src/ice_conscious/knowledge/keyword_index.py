@@ -0,0 +1,773 @@
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Any, Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ice_conscious.storage.repositories.knowledge import KnowledgeRecord
+from .views import KnowledgeViewEntity, KnowledgeViewHit, view_entity_from_record
+
+
+# ============================================================
+# TOKENIZZAZIONE
+# ============================================================
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+BLOCK_SIZE = 128
+_MAX_TF = 65535
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Token minuscoli alfanumerici (underscore e punteggiatura separano).
+    """
+    if not text:
+        return []
+    return _TOKEN.findall(text.lower())
+
+
+def _pack(values: Sequence[int]) -> Tuple[str, bytes]:
+    """
+    Interi non negativi nel tipo array più stretto che li contiene.
+    """
+    top = max(values, default=0)
+    typecode = "B" if top < 1 << 8 else "H" if top < 1 << 16 else "I"
+    return typecode, array(typecode, values).tobytes()
+
+
+def _unpack(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    return values
+
+
+# ============================================================
+# POSTING LIST
+# ============================================================
+
+class _OpenPostings:
+    """
+    Posting list del segmento aperto: non compressa, un solo blocco.
+    """
+
+    __slots__ = ("docs", "tfs", "max_tf", "min_dl")
+
+    def __init__(self) -> None:
+        self.docs = array("I")
+        self.tfs = array("H")
+        self.max_tf = 0
+        self.min_dl = 1 << 32
+
+    def add(self, doc: int, tf: int, length: int) -> None:
+        tf = min(tf, _MAX_TF)
+        self.docs.append(doc)
+        self.tfs.append(tf)
+        self.max_tf = max(self.max_tf, tf)
+        self.min_dl = min(self.min_dl, length)
+
+    @property
+    def df(self) -> int:
+        return len(self.docs)
+
+    @property
+    def block_last(self) -> Sequence[int]:
+        return (self.docs[-1],)
+
+    @property
+    def block_max_tf(self) -> Sequence[int]:
+        return (self.max_tf,)
+
+    @property
+    def block_min_dl(self) -> Sequence[int]:
+        return (self.min_dl,)
+
+    def block(self, i: int) -> Tuple[Sequence[int], Sequence[int]]:
+        return self.docs, self.tfs
+
+
+class _Postings:
+    """
+    Posting list compressa a blocchi di BLOCK_SIZE documenti.
+
+    Ogni blocco conserva primo doc, delta dei doc e tf, ciascuno
+    nel tipo array più stretto (8/16/32 bit). Per blocco restano
+    in chiaro ultimo doc, tf massimo e lunghezza minima: bastano
+    per il salto di blocchi e per i bound di BM25.
+    """
+
+    __slots__ = ("df", "max_tf", "min_dl", "block_last", "block_max_tf", "block_min_dl", "_blocks")
+
+    def __init__(self) -> None:
+        self.df = 0
+        self.max_tf = 0
+        self.min_dl = 1 << 32
+        self.block_last = array("I")
+        self.block_max_tf = array("H")
+        self.block_min_dl = array("I")
+        self._blocks: List[Tuple[int, str, bytes, str, bytes]] = []
+
+    @classmethod
+    def build(cls, docs: Sequence[int], tfs: Sequence[int], lengths: Sequence[int]) -> "_Postings":
+        postings = cls()
+        postings.df = len(docs)
+
+        for start in range(0, len(docs), BLOCK_SIZE):
+            block_docs = docs[start:start + BLOCK_SIZE]
+            block_tfs = tfs[start:start + BLOCK_SIZE]
+
+            deltas = [b - a for a, b in zip(block_docs, block_docs[1:])]
+            delta_type, delta_data = _pack(deltas)
+            tf_type, tf_data = _pack(block_tfs)
+            postings._blocks.append((block_docs[0], delta_type, delta_data, tf_type, tf_data))
+
+            max_tf = max(block_tfs)
+            min_dl = min(lengths[d] for d in block_docs)
+            postings.block_last.append(block_docs[-1])
+            postings.block_max_tf.append(max_tf)
+            postings.block_min_dl.append(min_dl)
+            postings.max_tf = max(postings.max_tf, max_tf)
+            postings.min_dl = min(postings.min_dl, min_dl)
+
+        return postings
+
+    def block(self, i: int) -> Tuple[Sequence[int], Sequence[int]]:
+        first, delta_type, delta_data, tf_type, tf_data = self._blocks[i]
+        docs = list(accumulate(_unpack(delta_type, delta_data), initial=first))
+        return docs, _unpack(tf_type, tf_data)
+
+    def nbytes(self) -> int:
+        return sum(len(b[2]) + len(b[4]) + 4 for b in self._blocks) + 10 * len(self._blocks)
+
+
+# ============================================================
+# SEGMENTO
+# ============================================================
+
+class _Segment:
+    """
+    Insieme di documenti con ordinali locali.
+
+    Il segmento aperto riceve le aggiunte; una volta pieno viene
+    sigillato (posting compresse) e non cambia più, salvo i
+    tombstone delle cancellazioni.
+    """
+
+    def __init__(self) -> None:
+        self.doc_ids: List[str] = []
+        self.lengths = array("I")
+        self.dead = bytearray()
+        self.dead_count = 0
+        self.postings: Dict[str, Any] = {}
+        self.sealed = False
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @property
+    def live(self) -> int:
+        return len(self.doc_ids) - self.dead_count
+
+    def append(self, doc_id: str, tf: Dict[str, int], length: int) -> int:
+        ordinal = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.lengths.append(length)
+        self.dead.append(0)
+
+        for term, count in tf.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = _OpenPostings()
+            postings.add(ordinal, count, length)
+        return ordinal
+
+    def kill(self, ordinal: int) -> None:
+        if not self.dead[ordinal]:
+            self.dead[ordinal] = 1
+            self.dead_count += 1
+
+    def seal(self) -> "_Segment":
+        sealed = _Segment()
+        sealed.doc_ids = self.doc_ids
+        sealed.lengths = self.lengths
+        sealed.dead = self.dead
+        sealed.dead_count = self.dead_count
+        sealed.postings = {
+            term: _Postings.build(p.docs, p.tfs, self.lengths)
+            for term, p in self.postings.items()
+        }
+        sealed.sealed = True
+        return sealed
+
+    @classmethod
+    def merge(cls, segments: Sequence["_Segment"]) -> "_Segment":
+        """
+        Nuovo segmento sigillato con i soli documenti vivi.
+        """
+        merged = cls()
+        remaps: List[List[int]] = []
+        for seg in segments:
+            remap = []
+            for ordinal, doc_id in enumerate(seg.doc_ids):
+                if seg.dead[ordinal]:
+                    remap.append(-1)
+                else:
+                    remap.append(len(merged.doc_ids))
+                    merged.doc_ids.append(doc_id)
+                    merged.lengths.append(seg.lengths[ordinal])
+            remaps.append(remap)
+        merged.dead = bytearray(len(merged.doc_ids))
+
+        terms = set()
+        for seg in segments:
+            terms.update(seg.postings)
+
+        for term in terms:
+            docs: List[int] = []
+            tfs: List[int] = []
+            for seg, remap in zip(segments, remaps):
+                postings = seg.postings.get(term)
+                if postings is None:
+                    continue
+                for i in range(len(postings.block_last)):
+                    block_docs, block_tfs = postings.block(i)
+                    for doc, tf in zip(block_docs, block_tfs):
+                        target = remap[doc]
+                        if target >= 0:
+                            docs.append(target)
+                            tfs.append(tf)
+            if docs:
+                merged.postings[term] = _Postings.build(docs, tfs, merged.lengths)
+
+        merged.sealed = True
+        return merged
+
+    def nbytes(self) -> int:
+        size = self.lengths.itemsize * len(self.lengths) + len(self.dead)
+        for p in self.postings.values():
+            if isinstance(p, _Postings):
+                size += p.nbytes()
+            else:
+                size += p.docs.itemsize * len(p.docs) + p.tfs.itemsize * len(p.tfs)
+        return size
+
+
+# ============================================================
+# INDICE BM25
+# ============================================================
+
+@dataclass
+class KeywordHit:
+    """
+    Documento trovato dall'indice keyword.
+    """
+    doc_id: str
+    score: float
+
+    @property
+    def id(self) -> str:
+        # stessa forma dei risultati del vector backend
+        return self.doc_id
+
+
+class BM25Index:
+    """
+    Indice BM25 incrementale di un workspace.
+
+    Struttura:
+    - segmento aperto per le aggiunte, sigillato ogni `segment_size`
+      documenti (posting compresse a blocchi)
+    - fusione dei segmenti più piccoli oltre `max_segments`
+    - cancellazioni come tombstone; un segmento con più di
+      `tombstone_ratio` documenti morti viene riscritto
+
+    Come in Lucene, df e lunghezza media contano anche i documenti
+    cancellati finché il loro segmento non viene riscritto.
+
+    La ricerca è term-at-a-time con potatura MaxScore: i termini
+    sono processati per contributo massimo decrescente e, quando
+    la somma dei restanti non basta più a far entrare un documento
+    nuovo nei top-k, gli altri termini aggiornano solo i candidati
+    (decodificando solo i blocchi che li contengono).
+    """
+
+    def __init__(
+        self,
+        *,
+        k1: float = 1.2,
+        b: float = 0.75,
+        segment_size: int = 4096,
+        max_segments: int = 8,
+        merge_factor: int = 4,
+        tombstone_ratio: float = 0.3,
+    ) -> None:
+        self.k1 = k1
+        self.b = b
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.merge_factor = merge_factor
+        self.tombstone_ratio = tombstone_ratio
+
+        self._segments: List[_Segment] = []
+        self._open = _Segment()
+        self._where: Dict[str, Tuple[_Segment, int]] = {}
+        self._df: Counter = Counter()
+        self._docs = 0
+        self._total_length = 0
+
+        self._lock = threading.RLock()
+
+    # ----------------------------------------------------------
+    # SCRITTURA
+    # ----------------------------------------------------------
+
+    def add(self, doc_id: str, text: Optional[str] = None, *, tokens: Optional[Iterable[str]] = None) -> None:
+        """
+        Indicizza (o reindicizza) un documento.
+        """
+        tf = Counter(tokens if tokens is not None else tokenize(text))
+
+        with self._lock:
+            self.delete(doc_id)
+            if not tf:
+                return
+
+            length = sum(tf.values())
+            ordinal = self._open.append(doc_id, tf, length)
+            self._where[doc_id] = (self._open, ordinal)
+            self._df.update(tf.keys())
+            self._docs += 1
+            self._total_length += length
+
+            if len(self._open) >= self.segment_size:
+                self._seal()
+
+    def delete(self, doc_id: str) -> bool:
+        with self._lock:
+            location = self._where.pop(doc_id, None)
+            if location is None:
+                return False
+
+            segment, ordinal = location
+            segment.kill(ordinal)
+            if segment.sealed and segment.dead_count > self.tombstone_ratio * len(segment):
+                self._replace([segment])
+            return True
+
+    def flush(self) -> None:
+        """
+        Sigilla il segmento aperto.
+        """
+        with self._lock:
+            if len(self._open):
+                self._seal()
+
+    def _seal(self) -> None:
+        sealed = self._open.seal()
+        self._open = _Segment()
+        self._segments.append(sealed)
+        self._relocate(sealed)
+
+        if len(self._segments) > self.max_segments:
+            smallest = sorted(self._segments, key=len)[: self.merge_factor]
+            self._replace(smallest)
+
+    def _replace(self, segments: List[_Segment]) -> None:
+        merged = _Segment.merge(segments)
+
+        for seg in segments:
+            for term, postings in seg.postings.items():
+                self._df[term] -= postings.df
+                if self._df[term] <= 0:
+                    del self._df[term]
+            self._docs -= len(seg)
+            self._total_length -= sum(seg.lengths)
+        for term, postings in merged.postings.items():
+            self._df[term] += postings.df
+        self._docs += len(merged)
+        self._total_length += sum(merged.lengths)
+
+        position = min(self._segments.index(s) for s in segments)
+        self._segments = [s for s in self._segments if s not in segments]
+        if len(merged):
+            self._segments.insert(position, merged)
+            self._relocate(merged)
+
+    def _relocate(self, segment: _Segment) -> None:
+        for ordinal, doc_id in enumerate(segment.doc_ids):
+            if not segment.dead[ordinal]:
+                self._where[doc_id] = (segment, ordinal)
+
+    # ----------------------------------------------------------
+    # RICERCA
+    # ----------------------------------------------------------
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        *,
+        allowed: Optional[Collection[str]] = None,
+    ) -> List[KeywordHit]:
+        """
+        I top_k documenti per score BM25 (decrescente).
+
+        Con `allowed` (es. da un FilterPlan) si cercano solo quei
+        documenti: gli altri sono trattati come cancellati, quindi
+        non alzano la soglia di potatura.
+        """
+        terms = Counter(tokenize(query))
+        if not terms or top_k <= 0:
+            return []
+
+        with self._lock:
+            if not self._docs:
+                return []
+
+            n = self._docs
+            avgdl = self._total_length / n
+            weights: Dict[str, float] = {}
+            for term, qtf in terms.items():
+                df = self._df.get(term)
+                if df:
+                    weights[term] = qtf * math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            if not weights:
+                return []
+
+            masks = self._masks(allowed) if allowed is not None else None
+
+            heap: List[Tuple[float, str]] = []
+            for segment in self._segments + [self._open]:
+                if not segment.live:
+                    continue
+                if masks is None:
+                    excluded = segment.dead if segment.dead_count else None
+                else:
+                    excluded = masks.get(id(segment))
+                    if excluded is None:
+                        continue
+                self._search_segment(segment, weights, avgdl, top_k, heap, excluded)
+
+        heap.sort(reverse=True)
+        return [KeywordHit(doc_id=doc_id, score=score) for score, doc_id in heap]
+
+    def _search_segment(
+        self,
+        segment: _Segment,
+        weights: Dict[str, float],
+        avgdl: float,
+        k: int,
+        heap: List[Tuple[float, str]],
+        dead: Optional[bytearray],
+    ) -> None:
+        k1 = self.k1
+        c1 = k1 * (1.0 - self.b)
+        c2 = k1 * self.b / avgdl
+        lengths = segment.lengths
+
+        def bound(weight: float, tf: int, dl: int) -> float:
+            return weight * tf * (k1 + 1.0) / (tf + c1 + c2 * dl)
+
+        lists = []
+        for term, weight in weights.items():
+            postings = segment.postings.get(term)
+            if postings is not None:
+                lists.append((bound(weight, postings.max_tf, postings.min_dl), weight, postings))
+        if not lists:
+            return
+        lists.sort(key=lambda entry: entry[0], reverse=True)
+
+        # rest[i] = contributo massimo dei termini i..fine
+        rest = list(accumulate((entry[0] for entry in reversed(lists)), initial=0.0))[::-1]
+
+        acc: Dict[int, float] = {}
+        for i, (_, weight, postings) in enumerate(lists):
+            threshold = self._threshold(heap, acc, dead, k)
+            remaining_after = rest[i + 1]
+
+            if rest[i] > threshold:
+                # modalità OR: qualunque documento può ancora entrare
+                if not acc:
+                    self._first_list(
+                        postings, weight, remaining_after, threshold, bound, acc, dead, k, lengths, c2
+                    )
+                    continue
+                for bi in range(len(postings.block_last)):
+                    docs, tfs = postings.block(bi)
+                    for doc, tf in zip(docs, tfs):
+                        acc[doc] = acc.get(doc, 0.0) + weight * tf * (k1 + 1.0) / (
+                            tf + c1 + c2 * lengths[doc]
+                        )
+                continue
+
+            # modalità AND sui candidati: nessun documento nuovo può entrare
+            if not acc:
+                break
+            last = postings.block_last
+            blocks: Dict[int, Dict[int, int]] = {}
+            for doc in sorted(acc):
+                score = acc[doc]
+                if score + rest[i] <= threshold:
+                    del acc[doc]
+                    continue
+                bi = bisect_left(last, doc)
+                if bi >= len(last):
+                    continue
+                block = blocks.get(bi)
+                if block is None:
+                    block_docs, block_tfs = postings.block(bi)
+                    block = blocks[bi] = dict(zip(block_docs, block_tfs))
+                tf = block.get(doc)
+                if tf:
+                    acc[doc] = score + weight * tf * (k1 + 1.0) / (tf + c1 + c2 * lengths[doc])
+
+        doc_ids = segment.doc_ids
+        for doc, score in acc.items():
+            if dead is not None and dead[doc]:
+                continue
+            if len(heap) < k:
+                heapq.heappush(heap, (score, doc_ids[doc]))
+            elif score > heap[0][0]:
+                heapq.heapreplace(heap, (score, doc_ids[doc]))
+
+    def _first_list(
+        self,
+        postings: Any,
+        weight: float,
+        remaining_after: float,
+        threshold: float,
+        bound: Any,
+        acc: Dict[int, float],
+        dead: Optional[bytearray],
+        k: int,
+        lengths: Sequence[int],
+        c2: float,
+    ) -> None:
+        """
+        Primo termine con accumulatori vuoti: block-max.
+
+        Lo score parziale di ogni documento è già noto, quindi la soglia
+        cresce durante la scansione e i blocchi il cui bound (più i
+        termini restanti) non la supera vengono saltati senza decodifica.
+        """
+        k1 = self.k1
+        c1 = k1 * (1.0 - self.b)
+        local: List[float] = []
+
+        for bi in range(len(postings.block_last)):
+            if len(local) >= k and local[0] > threshold:
+                threshold = local[0]
+            if bound(weight, postings.block_max_tf[bi], postings.block_min_dl[bi]) + remaining_after <= threshold:
+                continue
+
+            docs, tfs = postings.block(bi)
+            for doc, tf in zip(docs, tfs):
+                score = weight * tf * (k1 + 1.0) / (tf + c1 + c2 * lengths[doc])
+                acc[doc] = score
+                if dead is not None and dead[doc]:
+                    continue
+                if len(local) < k:
+                    heapq.heappush(local, score)
+                elif score > local[0]:
+                    heapq.heapreplace(local, score)
+
+    def _masks(self, allowed: Collection[str]) -> Dict[int, bytearray]:
+        """
+        Per segmento: 1 = documento escluso (non ammesso o cancellato).
+        """
+        masks: Dict[int, bytearray] = {}
+        for doc_id in allowed:
+            location = self._where.get(doc_id)
+            if location is None:
+                continue
+            segment, ordinal = location
+            mask = masks.get(id(segment))
+            if mask is None:
+                mask = masks[id(segment)] = bytearray(b"\x01") * len(segment)
+            mask[ordinal] = 0
+        return masks
+
+    @staticmethod
+    def _threshold(
+        heap: List[Tuple[float, str]],
+        acc: Dict[int, float],
+        dead: Optional[bytearray],
+        k: int,
+    ) -> float:
+        """
+        Score minimo per entrare nei top-k (0 finché non ci sono k candidati).
+        """
+        threshold = heap[0][0] if len(heap) >= k else 0.0
+        if len(acc) + len(heap) < k:
+            return threshold
+
+        live = acc.values() if dead is None else (s for d, s in acc.items() if not dead[d])
+        best = heapq.nlargest(k, list(live) + [s for s, _ in heap])
+        if len(best) >= k:
+            threshold = max(threshold, best[-1])
+        return threshold
+
+    # ----------------------------------------------------------
+    # STATO
+    # ----------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._where
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self._where),
+                "segments": len(self._segments) + (1 if len(self._open) else 0),
+                "terms": len(self._df),
+                "tombstones": sum(s.dead_count for s in self._segments) + self._open.dead_count,
+                "bytes": sum(s.nbytes() for s in self._segments) + self._open.nbytes(),
+            }
+
+
+# ============================================================
+# INDICE PER WORKSPACE
+# ============================================================
+
+class KeywordIndex:
+    """
+    Un BM25Index per workspace, costruito pigramente dal
+    KnowledgeRepository (nome + descrizione delle entità) e
+    alimentato dai testi ingeriti.
+    """
+
+    def __init__(
+        self,
+        repository: Any = None,
+        *,
+        name_weight: int = 2,
+        **index_options: Any,
+    ) -> None:
+        self.repository = repository
+        self.name_weight = name_weight
+        self._index_options = index_options
+        self._indexes: Dict[str, BM25Index] = {}
+        self._lock = threading.Lock()
+
+    def index(self, workspace_id: str) -> BM25Index:
+        index = self._indexes.get(workspace_id)
+        if index is not None:
+            return index
+
+        with self._lock:
+            index = self._indexes.get(workspace_id)
+            if index is None:
+                index = BM25Index(**self._index_options)
+                if self.repository is not None:
+                    for record in self.repository.list_entities(workspace_id):
+                        index.add(record.entity_id, tokens=self._entity_tokens(record))
+                self._indexes[workspace_id] = index
+        return index
+
+    # ----------------------------------------------------------
+    # AGGIORNAMENTO
+    # ----------------------------------------------------------
+
+    def on_save(self, record: KnowledgeRecord) -> None:
+        self.index(record.workspace_id).add(record.entity_id, tokens=self._entity_tokens(record))
+
+    def on_delete(self, entity_id: str) -> None:
+        for index in list(self._indexes.values()):
+            if index.delete(entity_id):
+                return
+
+    def add_text(self, workspace_id: str, doc_id: str, text: str) -> None:
+        self.index(workspace_id).add(doc_id, text)
+
+    def delete_text(self, workspace_id: str, doc_id: str) -> bool:
+        return self.index(workspace_id).delete(doc_id)
+
+    def drop(self, workspace_id: str) -> None:
+        with self._lock:
+            self._indexes.pop(workspace_id, None)
+
+    def _entity_tokens(self, record: Any) -> List[str]:
+        return tokenize(record.name) * self.name_weight + tokenize(getattr(record, "description", None))
+
+    # ----------------------------------------------------------
+    # RICERCA
+    # ----------------------------------------------------------
+
+    def search(
+        self,
+        workspace_id: str,
+        text: str,
+        top_k: int = 10,
+        *,
+        allowed: Optional[Collection[str]] = None,
+    ) -> List[KeywordHit]:
+        return self.index(workspace_id).search(text, top_k, allowed=allowed)
+
+    def search_query(self, query: Any) -> List[KeywordHit]:
+        """
+        Esegue una KnowledgeSearchQuery (rispetta use_keyword).
+        """
+        if not getattr(query, "use_keyword", True) or not query.text:
+            return []
+        return self.search(query.workspace_id, query.text, query.top_k)
+
+    def view_hits(
+        self,
+        workspace_id: str,
+        text: str,
+        top_k: int = 10,
+        *,
+        allowed: Optional[Collection[str]] = None,
+    ) -> List[KnowledgeViewHit]:
+        """
+        Risultati come KnowledgeViewHit(source="keyword").
+        """
+        hits = []
+        for hit in self.search(workspace_id, text, top_k, allowed=allowed):
+            record = self.repository.get_entity(hit.doc_id) if self.repository is not None else None
+            if record is not None:
+                entity = view_entity_from_record(record, relevance_score=hit.score)
+            else:
+                entity = KnowledgeViewEntity(
+                    entity_id=hit.doc_id,
+                    entity_type="document",
+                    name=hit.doc_id,
+                    relevance_score=hit.score,
+                )
+            hits.append(KnowledgeViewHit(entity=entity, score=hit.score, source="keyword"))
+        return hits
+
+
+class KeywordIndexedRepository:
+    """
+    Proxy di un KnowledgeRepository che mantiene aggiornato
+    il KeywordIndex su save_entity / delete_entity.
+    """
+
+    def __init__(self, backend: Any, index: Optional[KeywordIndex] = None) -> None:
+        self.backend = backend
+        self.keywords = index or KeywordIndex(backend)
+        if self.keywords.repository is None:
+            self.keywords.repository = backend
+
+    def save_entity(self, record: KnowledgeRecord) -> KnowledgeRecord:
+        saved = self.backend.save_entity(record)
+        self.keywords.on_save(saved or record)
+        return saved
+
+    def delete_entity(self, entity_id: str) -> None:
+        self.backend.delete_entity(entity_id)
+        self.keywords.on_delete(entity_id)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.backend, name)
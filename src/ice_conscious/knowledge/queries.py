@@ -1,10 +1,14 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+import hashlib
+import json
+import unicodedata
+from dataclasses import asdict, dataclass, field
 from typing import Any, List, Optional
 
-from .filters import KnowledgeFilter
+from .graph import KnowledgeFilter
 from .scoring import RankingConfig
+from .views import KnowledgeViewResult
 
 
 @dataclass
@@ -30,3 +34,74 @@ class KnowledgeSearchQuery:
     # limiti e ranking
     top_k: int = 10
     ranking: RankingConfig = field(default_factory=RankingConfig)
+
+    def fingerprint(self) -> str:
+        """
+        Impronta deterministica della query.
+
+        Due query con lo stesso fingerprint producono lo stesso risultato
+        sugli stessi dati: testo normalizzato (Unicode NFKC, spazi
+        compattati), filtri in ordine canonico (anche i valori di `in`),
+        strategie, top_k e configurazione di ranking.
+        """
+        payload = {
+            "workspace_id": self.workspace_id,
+            "text": normalize_query_text(self.text),
+            "filters": sorted(
+                (
+                    [f.field, f.op, _canonical(f.value, unordered=f.op == "in")]
+                    for f in self.filters
+                ),
+                key=_stable_json,
+            ),
+            "use_vector": self.use_vector,
+            "use_keyword": self.use_keyword,
+            "top_k": self.top_k,
+            "ranking": _canonical(asdict(self.ranking)),
+        }
+        encoded = _stable_json(payload)
+        return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+
+
+@dataclass
+class KnowledgeSearchResult(KnowledgeViewResult):
+    """
+    Risultato di una KnowledgeSearchQuery.
+
+    È una KnowledgeViewResult che ricorda la query che l'ha prodotta.
+    """
+    query: Optional[KnowledgeSearchQuery] = None
+
+
+# ============================================================
+# NORMALIZZAZIONE
+# ============================================================
+
+def normalize_query_text(text: Optional[str]) -> str:
+    """
+    Forma canonica del testo di una query (il maiuscolo è preservato:
+    gli embedder possono distinguerlo).
+    """
+    if not text:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def _canonical(value: Any, *, unordered: bool = False) -> Any:
+    """
+    Valore serializzabile in modo stabile (set e dict ordinati).
+    """
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (set, frozenset)):
+        unordered = True
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_canonical(v) for v in value]
+        if unordered:
+            items.sort(key=_stable_json)
+        return items
+    return value
+
+
+def _stable_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=repr)
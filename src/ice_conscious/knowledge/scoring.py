@@ -1,7 +1,17 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..profiling import current_profile
+from ..topk import top_k_indices
+
+try:
+    import numpy as np
+except ImportError:  # extra "ml" non installato
+    np = None
 
 
 # ============================================================
@@ -26,11 +36,46 @@ class KnowledgeScoringConfig:
     boost_log: float = 1.1
     boost_doc: float = 1.0
 
+    # boost per tipo definiti dall'utente: sottostringa (minuscola) -> moltiplicatore
+    # controllati prima dei tipi predefiniti, in ordine di inserimento
+    type_boosts: Dict[str, float] = field(default_factory=dict)
+
+    # importanza strutturale (CentralityEngine, media 1); 0 = ignorata
+    centrality_weight: float = 0.0
+
     # penalità
     penalty_low_confidence: float = 0.7
     penalty_sparse_context: float = 0.85
 
 
+# ============================================================
+# CONFIGURAZIONE RANKING (FUSIONE)
+# ============================================================
+
+@dataclass
+class RankingConfig:
+    """
+    Come combinare le liste ordinate dei retriever
+    (vector, keyword, graph) in un unico ranking.
+
+    - "rrf": reciprocal rank fusion, peso / (rrf_k + rank)
+    - "weighted": score normalizzato sul migliore della lista, per peso
+    """
+
+    fusion: str = "rrf"
+    rrf_k: int = 60
+
+    weights: Dict[str, float] = field(
+        default_factory=lambda: {"vector": 1.0, "keyword": 1.0, "graph": 0.5}
+    )
+
+    # candidati chiesti a ogni retriever: top_k * overfetch, fino a max_fetch
+    overfetch: int = 3
+    max_fetch: int = 256
+
+    min_score: float = 0.0
+
+
 # ============================================================
 # SCORE MODEL
 # ============================================================
@@ -51,6 +96,75 @@ class KnowledgeScore:
     explanation: Optional[str] = None
 
 
+# ============================================================
+# CLASSIFICAZIONE TIPO ENTITÀ
+# ============================================================
+
+TYPE_OTHER = 0
+TYPE_CODE = 1
+TYPE_LOG = 2
+TYPE_DOC = 3
+
+TYPE_LABELS = {TYPE_OTHER: "", TYPE_CODE: "code", TYPE_LOG: "log", TYPE_DOC: "doc"}
+
+_TYPE_CODES: Dict[Optional[str], int] = {}
+_TYPE_CODES_MAX = 65536
+
+
+def entity_type_code(entity_type: Optional[str]) -> int:
+    """
+    Categoria di boost di un entity_type (memoizzata).
+    """
+    code = _TYPE_CODES.get(entity_type)
+    if code is not None:
+        return code
+
+    et = (entity_type or "").lower()
+    if "code" in et:
+        code = TYPE_CODE
+    elif "log" in et:
+        code = TYPE_LOG
+    elif "doc" in et or "documentation" in et:
+        code = TYPE_DOC
+    else:
+        code = TYPE_OTHER
+
+    if len(_TYPE_CODES) < _TYPE_CODES_MAX:
+        _TYPE_CODES[entity_type] = code
+    return code
+
+
+def entity_type_codes(entity_types: Iterable[Optional[str]]) -> List[int]:
+    return [entity_type_code(t) for t in entity_types]
+
+
+def _type_boost(code: int, cfg: KnowledgeScoringConfig) -> Optional[float]:
+    if code == TYPE_CODE:
+        return cfg.boost_code
+    if code == TYPE_LOG:
+        return cfg.boost_log
+    if code == TYPE_DOC:
+        return cfg.boost_doc
+    return None
+
+
+def _resolve_type(
+    entity_type: Optional[str],
+    cfg: KnowledgeScoringConfig,
+) -> Tuple[str, Optional[float]]:
+    """
+    (etichetta, moltiplicatore) del tipo secondo cfg; None = nessun boost.
+    """
+    if cfg.type_boosts:
+        et = (entity_type or "").lower()
+        for pattern, boost in cfg.type_boosts.items():
+            if pattern.lower() in et:
+                return pattern.lower(), boost
+
+    code = entity_type_code(entity_type)
+    return TYPE_LABELS[code], _type_boost(code, cfg)
+
+
 # ============================================================
 # LOGICA DI SCORING
 # ============================================================
@@ -61,6 +175,7 @@ def score_entity(
     base_relevance: float,
     confidence: float,
     context_density: Optional[float] = None,
+    centrality: Optional[float] = None,
     cfg: KnowledgeScoringConfig | None = None,
 ) -> KnowledgeScore:
     """
@@ -70,9 +185,31 @@ def score_entity(
     - base_relevance: score grezzo (vector / keyword / inference)
     - confidence: quanto il sistema si fida di questa entità
     - context_density: quanto è connessa nel contesto attuale (0-1)
+    - centrality: centralità nel grafo delle relazioni (media 1)
     """
     cfg = cfg or KnowledgeScoringConfig()
+    type_label, type_boost = _resolve_type(entity_type, cfg)
+
+    return _score_resolved(
+        type_label,
+        type_boost,
+        base_relevance,
+        confidence,
+        context_density,
+        centrality,
+        cfg,
+    )
 
+
+def _score_resolved(
+    type_label: str,
+    type_boost: Optional[float],
+    base_relevance: float,
+    confidence: float,
+    context_density: Optional[float],
+    centrality: Optional[float],
+    cfg: KnowledgeScoringConfig,
+) -> KnowledgeScore:
     boosts: Dict[str, float] = {}
     penalties: Dict[str, float] = {}
 
@@ -87,17 +224,18 @@ def score_entity(
     # Boost per tipo entità
     # ----------------------------------------------------------
 
-    et = (entity_type or "").lower()
+    if type_boost is not None:
+        score *= type_boost
+        boosts[f"type:{type_label}"] = type_boost
 
-    if "code" in et:
-        score *= cfg.boost_code
-        boosts["type:code"] = cfg.boost_code
-    elif "log" in et:
-        score *= cfg.boost_log
-        boosts["type:log"] = cfg.boost_log
-    elif "doc" in et or "documentation" in et:
-        score *= cfg.boost_doc
-        boosts["type:doc"] = cfg.boost_doc
+    # ----------------------------------------------------------
+    # Boost strutturale
+    # ----------------------------------------------------------
+
+    if centrality is not None and cfg.centrality_weight:
+        boost = 1.0 + cfg.centrality_weight * math.log1p(max(centrality, 0.0))
+        score *= boost
+        boosts["centrality"] = boost
 
     # ----------------------------------------------------------
     # Penalità
@@ -152,15 +290,387 @@ def score_entities(
     """
     results: List[KnowledgeScore] = []
 
-    for item in items:
-        results.append(
-            score_entity(
-                entity_type=item.get("entity_type", ""),
-                base_relevance=item.get("base_relevance", 0.0),
-                confidence=item.get("confidence", 1.0),
-                context_density=item.get("context_density"),
-                cfg=cfg,
+    with current_profile().stage("scoring.entities") as stage:
+        for item in items:
+            results.append(
+                score_entity(
+                    entity_type=item.get("entity_type", ""),
+                    base_relevance=item.get("base_relevance", 0.0),
+                    confidence=item.get("confidence", 1.0),
+                    context_density=item.get("context_density"),
+                    centrality=item.get("centrality"),
+                    cfg=cfg,
+                )
             )
-        )
+        stage.note(count=len(results))
 
     return results
+
+
+# ============================================================
+# SCORING COLONNARE
+# ============================================================
+
+@dataclass
+class BatchScores:
+    """
+    Risultato di `score_entities_batch`.
+
+    `scores` contiene solo i final_score (vettore NumPy se disponibile,
+    altrimenti lista). I KnowledgeScore completi, con spiegazione,
+    vengono costruiti solo su richiesta (`explain`, `top`).
+    """
+    scores: Any
+
+    base_relevance: Sequence[float]
+    confidence: Sequence[float]
+    type_codes: Sequence[int]
+    context_density: Optional[Sequence[float]]
+    centrality: Optional[Sequence[float]]
+    scorer: "CompiledScorer"
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def explain(self, i: int) -> KnowledgeScore:
+        """
+        KnowledgeScore completo dell'elemento i (identico a score_entity).
+        """
+        code = int(self.type_codes[i])
+        return _score_resolved(
+            self.scorer.labels[code],
+            self.scorer.boosts[code],
+            float(self.base_relevance[i]),
+            float(self.confidence[i]),
+            _optional(self.context_density, i),
+            _optional(self.centrality, i),
+            self.scorer.cfg,
+        )
+
+    def top_indices(self, k: int) -> List[int]:
+        """
+        Indici dei k score migliori, in ordine decrescente
+        (a parità di score, l'indice minore).
+        """
+        return top_k_indices(self.scores, k)
+
+    def top(self, k: int) -> List[Tuple[int, KnowledgeScore]]:
+        """
+        I k migliori, con spiegazione generata solo per loro.
+        """
+        return [(i, self.explain(i)) for i in self.top_indices(k)]
+
+
+def _optional(values: Optional[Sequence[float]], i: int) -> Optional[float]:
+    if values is None:
+        return None
+    v = values[i]
+    if v is None:
+        return None
+    v = float(v)
+    return None if math.isnan(v) else v
+
+
+def score_entities_batch(
+    base_relevance: Sequence[float],
+    confidence: Sequence[float],
+    type_codes: Sequence[int],
+    *,
+    context_density: Optional[Sequence[float]] = None,
+    centrality: Optional[Sequence[float]] = None,
+    cfg: KnowledgeScoringConfig | None = None,
+    scorer: Optional["CompiledScorer"] = None,
+) -> BatchScores:
+    """
+    Scoring colonnare di molti candidati.
+
+    Stesse regole di `score_entity`, applicate a colonne:
+    - type_codes: da `entity_type_codes`, oppure da `scorer.codes`
+      (obbligatorio se cfg definisce `type_boosts`: i codici globali
+      non corrispondono alla sua tabella di tipi)
+    - context_density, centrality: NaN (o None) = non disponibile
+
+    Nessun dizionario né stringa per elemento.
+    """
+    if scorer is None:
+        if cfg is not None and cfg.type_boosts:
+            raise ValueError(
+                "type_codes from entity_type_codes() do not match a config with type_boosts; "
+                "pass the CompiledScorer that produced them"
+            )
+        scorer = CompiledScorer(cfg)
+    elif cfg is not None and cfg is not scorer.cfg:
+        raise ValueError("cfg does not match scorer.cfg")
+
+    return scorer.score_batch(
+        base_relevance,
+        confidence,
+        type_codes,
+        context_density=context_density,
+        centrality=centrality,
+    )
+
+
+def _float_column(values: Sequence[Optional[float]]) -> Any:
+    if np is not None and isinstance(values, np.ndarray):
+        return values.astype(np.float64, copy=False)
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _score_columns_numpy(rel, conf, codes, density, centrality, multipliers, cfg) -> Any:
+    rel = np.asarray(rel, dtype=np.float64)
+    conf = np.asarray(conf, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.intp)
+
+    score = rel * cfg.relevance_weight
+    score = score * (conf * cfg.confidence_weight + 1.0)
+
+    score = score * np.asarray(multipliers, dtype=np.float64)[codes]
+
+    if centrality is not None and cfg.centrality_weight:
+        c = _float_column(centrality)
+        known = ~np.isnan(c)
+        boost = 1.0 + cfg.centrality_weight * np.log1p(np.maximum(np.where(known, c, 0.0), 0.0))
+        score = np.where(known, score * boost, score)
+
+    score = np.where(conf < 0.5, score * cfg.penalty_low_confidence, score)
+
+    if density is not None:
+        d = _float_column(density)
+        sparse = ~np.isnan(d) & (np.where(np.isnan(d), 1.0, d) < 0.3)
+        score = np.where(sparse, score * cfg.penalty_sparse_context, score)
+
+    return np.maximum(score, 0.0)
+
+
+def _score_columns_python(rel, conf, codes, density, centrality, multipliers, cfg) -> List[float]:
+    use_centrality = centrality is not None and cfg.centrality_weight
+    scores: List[float] = []
+
+    for i in range(len(rel)):
+        c = conf[i]
+        score = rel[i] * cfg.relevance_weight
+        score *= c * cfg.confidence_weight + 1.0
+        score *= multipliers[codes[i]]
+
+        if use_centrality:
+            cv = _optional(centrality, i)
+            if cv is not None:
+                score *= 1.0 + cfg.centrality_weight * math.log1p(max(cv, 0.0))
+
+        if c < 0.5:
+            score *= cfg.penalty_low_confidence
+
+        if density is not None:
+            dv = _optional(density, i)
+            if dv is not None and dv < 0.3:
+                score *= cfg.penalty_sparse_context
+
+        scores.append(max(score, 0.0))
+
+    return scores
+
+
+# ============================================================
+# SCORER COMPILATO
+# ============================================================
+
+class CompiledScorer:
+    """
+    Scorer precompilato da una KnowledgeScoringConfig.
+
+    Le regole di tipo (type_boosts dell'utente, poi code/log/doc)
+    diventano una tabella di classi:
+    - `labels[c]`       etichetta della classe c ("" = nessun boost)
+    - `multipliers[c]`  moltiplicatore della classe c (1.0 se nessuno)
+
+    Ogni entity_type viene classificato una sola volta e memorizzato:
+    sul percorso caldo resta un lookup in dizionario per item.
+
+    Senza type_boosts i codici coincidono con TYPE_OTHER/CODE/LOG/DOC.
+    La config è letta alla costruzione: se cambia, va ricompilata.
+    """
+
+    def __init__(
+        self,
+        cfg: KnowledgeScoringConfig | None = None,
+        *,
+        max_cached_types: int = _TYPE_CODES_MAX,
+    ) -> None:
+        self.cfg = cfg or KnowledgeScoringConfig()
+        self.max_cached_types = max_cached_types
+
+        self.labels: List[str] = [""]
+        self.boosts: List[Optional[float]] = [None]
+        self._rules: List[Tuple[str, int]] = []
+
+        rules = list(self.cfg.type_boosts.items()) + [
+            ("code", self.cfg.boost_code),
+            ("log", self.cfg.boost_log),
+            ("doc", self.cfg.boost_doc),
+        ]
+        for pattern, boost in rules:
+            pattern = pattern.lower()
+            if any(p == pattern for p, _ in self._rules):
+                continue
+            self._rules.append((pattern, len(self.labels)))
+            self.labels.append(pattern)
+            self.boosts.append(float(boost))
+
+        self.multipliers: List[float] = [1.0 if b is None else b for b in self.boosts]
+        self._codes: Dict[Optional[str], int] = {}
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------
+    # CLASSIFICAZIONE
+    # ----------------------------------------------------------
+
+    def code(self, entity_type: Optional[str]) -> int:
+        code = self._codes.get(entity_type)
+        if code is not None:
+            return code
+
+        et = (entity_type or "").lower()
+        code = TYPE_OTHER
+        for pattern, c in self._rules:
+            if pattern in et:
+                code = c
+                break
+
+        if len(self._codes) < self.max_cached_types:
+            with self._lock:
+                self._codes[entity_type] = code
+        return code
+
+    def codes(self, entity_types: Iterable[Optional[str]]) -> List[int]:
+        get = self._codes.get
+        return [c if (c := get(t)) is not None else self.code(t) for t in entity_types]
+
+    # ----------------------------------------------------------
+    # SCORING
+    # ----------------------------------------------------------
+
+    def score(
+        self,
+        entity_type: Optional[str],
+        base_relevance: float,
+        confidence: float,
+        context_density: Optional[float] = None,
+        centrality: Optional[float] = None,
+    ) -> float:
+        """
+        Solo final_score: nessuna spiegazione, nessun dizionario.
+        """
+        cfg = self.cfg
+        score = base_relevance * cfg.relevance_weight
+        score *= confidence * cfg.confidence_weight + 1.0
+        score *= self.multipliers[self.code(entity_type)]
+
+        if centrality is not None and cfg.centrality_weight:
+            score *= 1.0 + cfg.centrality_weight * math.log1p(max(centrality, 0.0))
+        if confidence < 0.5:
+            score *= cfg.penalty_low_confidence
+        if context_density is not None and context_density < 0.3:
+            score *= cfg.penalty_sparse_context
+
+        return max(score, 0.0)
+
+    def score_entity(
+        self,
+        *,
+        entity_type: Optional[str],
+        base_relevance: float,
+        confidence: float,
+        context_density: Optional[float] = None,
+        centrality: Optional[float] = None,
+    ) -> KnowledgeScore:
+        code = self.code(entity_type)
+        return _score_resolved(
+            self.labels[code],
+            self.boosts[code],
+            base_relevance,
+            confidence,
+            context_density,
+            centrality,
+            self.cfg,
+        )
+
+    def score_batch(
+        self,
+        base_relevance: Sequence[float],
+        confidence: Sequence[float],
+        type_codes: Sequence[int],
+        *,
+        context_density: Optional[Sequence[float]] = None,
+        centrality: Optional[Sequence[float]] = None,
+    ) -> BatchScores:
+        """
+        Come `score_entities_batch`, con i codici di questo scorer
+        (`codes`); un codice fuori dalla tabella solleva ValueError.
+        """
+        self._check_codes(type_codes)
+        columns = _score_columns_numpy if np is not None else _score_columns_python
+        with current_profile().stage("scoring.batch") as stage:
+            scores = columns(
+                base_relevance,
+                confidence,
+                type_codes,
+                context_density,
+                centrality,
+                self.multipliers,
+                self.cfg,
+            )
+            stage.note(count=len(scores))
+        return BatchScores(
+            scores=scores,
+            base_relevance=base_relevance,
+            confidence=confidence,
+            type_codes=type_codes,
+            context_density=context_density,
+            centrality=centrality,
+            scorer=self,
+        )
+
+
+    def _check_codes(self, type_codes: Sequence[int]) -> None:
+        if len(type_codes) == 0:
+            return
+        if np is not None and isinstance(type_codes, np.ndarray):
+            low, high = int(type_codes.min()), int(type_codes.max())
+        else:
+            low, high = min(type_codes), max(type_codes)
+        if low < 0 or high >= len(self.multipliers):
+            raise ValueError(f"Type code out of range [0, {len(self.multipliers)}) for this scorer")
+
+
+# ============================================================
+# CONFIG PER WORKSPACE
+# ============================================================
+
+class WorkspaceScorers:
+    """
+    Scorer compilati per workspace, con una config di default.
+    """
+
+    def __init__(self, default: KnowledgeScoringConfig | None = None) -> None:
+        self._default = CompiledScorer(default)
+        self._scorers: Dict[str, CompiledScorer] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, workspace_id: str, cfg: KnowledgeScoringConfig) -> CompiledScorer:
+        scorer = CompiledScorer(cfg)
+        with self._lock:
+            self._scorers[workspace_id] = scorer
+        return scorer
+
+    def reset(self, workspace_id: str) -> None:
+        with self._lock:
+            self._scorers.pop(workspace_id, None)
+
+    def get(self, workspace_id: Optional[str] = None) -> CompiledScorer:
+        if workspace_id is None:
+            return self._default
+        return self._scorers.get(workspace_id, self._default)
+
+    def config(self, workspace_id: Optional[str] = None) -> KnowledgeScoringConfig:
+        return self.get(workspace_id).cfg
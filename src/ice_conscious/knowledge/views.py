@@ -96,3 +96,24 @@ class KnowledgeViewResult:
 
     def total_hits(self) -> int:
         return len(self.hits)
+
+
+# ============================================================
+# COSTRUZIONE DA RECORD
+# ============================================================
+
+def view_entity_from_record(record: Any, *, relevance_score: float = 0.0) -> KnowledgeViewEntity:
+    """
+    Proietta un KnowledgeRecord (o oggetto con gli stessi campi)
+    in una KnowledgeViewEntity.
+    """
+    return KnowledgeViewEntity(
+        entity_id=record.entity_id,
+        entity_type=getattr(record, "kind", None) or getattr(record, "entity_type", "unknown"),
+        name=record.name,
+        description=getattr(record, "description", None),
+        relevance_score=relevance_score,
+        confidence_score=getattr(record, "confidence", 1.0),
+        properties=dict(getattr(record, "properties", None) or {}),
+        metadata=dict(getattr(record, "metadata", None) or {}),
+    )
@@ -4,6 +4,8 @@ from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
 from datetime import datetime, timedelta
 
+from ..topk import top_k as select_top_k
+
 
 # ============================================================
 # WORKING MEMORY ITEM
@@ -164,12 +166,7 @@ class WorkingMemory:
         Restituisce gli item più rilevanti,
         simulando il focus attentivo.
         """
-        ordered = sorted(
-            self.items.values(),
-            key=lambda i: (i.relevance, i.confidence),
-            reverse=True,
-        )
-        return ordered[:top_k]
+        return select_top_k(self.items.values(), top_k, key=_attention_key)
 
     # ----------------------------------------------------------
     # INTERNAL
@@ -182,13 +179,10 @@ class WorkingMemory:
         if len(self.items) <= self.max_items:
             return
 
-        # ordina per utilità cognitiva
-        ordered = sorted(
-            self.items.values(),
-            key=lambda i: (i.relevance, i.confidence),
-            reverse=True,
-        )
-
-        # tieni solo i più rilevanti
-        keep = ordered[: self.max_items]
+        # tieni solo i più rilevanti, ordinati per utilità cognitiva
+        keep = select_top_k(self.items.values(), self.max_items, key=_attention_key)
         self.items = {i.item_id: i for i in keep}
+
+
+def _attention_key(item: WorkingMemoryItem) -> tuple:
+    return (item.relevance, item.confidence)
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Protocol
+
+
+# ============================================================
+# SINK
+# ============================================================
+
+class MetricsSink(Protocol):
+    """
+    Destinazione dei profili completati (metriche, log, tracing).
+
+    `emit` viene chiamato una volta per profilo, alla chiusura.
+    """
+
+    def emit(self, profile: "Profile") -> None:
+        ...
+
+
+class MemorySink:
+    """
+    Conserva gli ultimi `maxlen` profili (debug, ispezione interattiva).
+    """
+
+    def __init__(self, maxlen: int = 100) -> None:
+        self.profiles: Deque[Profile] = deque(maxlen=maxlen)
+
+    def emit(self, profile: "Profile") -> None:
+        self.profiles.append(profile)
+
+
+# ============================================================
+# PROFILO
+# ============================================================
+
+@dataclass
+class StageRecord:
+    """
+    Una misura: durata di uno stage, candidati prodotti, esito cache.
+    """
+    name: str
+    elapsed_ms: float = 0.0
+    count: Optional[int] = None
+    cache: Optional[str] = None      # "hit" | "miss" | "stale" | ...
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def note(self, *, count: Optional[int] = None, cache: Optional[str] = None, **extra: Any) -> None:
+        if count is not None:
+            self.count = count
+        if cache is not None:
+            self.cache = cache
+        for key, value in extra.items():
+            if value is not None:
+                self.extra[key] = value
+
+    def as_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"name": self.name, "elapsed_ms": self.elapsed_ms}
+        if self.count is not None:
+            data["count"] = self.count
+        if self.cache is not None:
+            data["cache"] = self.cache
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+class Profile:
+    """
+    Raccolta delle misure di una richiesta (explain / profile mode).
+
+    Gli stage sono registrati nell'ordine di chiusura, con tempi
+    monotoni (`time.perf_counter`). Thread-safe: gli stage eseguiti
+    in un pool (es. fusione) finiscono nello stesso profilo se il
+    contesto viene propagato.
+    """
+
+    enabled = True
+
+    def __init__(self, name: str, *, sink: Optional[MetricsSink] = None) -> None:
+        self.name = name
+        self.sink = sink
+        self.stages: List[StageRecord] = []
+
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._elapsed: Optional[float] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageRecord]:
+        record = StageRecord(name)
+        t0 = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.elapsed_ms = (time.perf_counter() - t0) * 1000.0
+            with self._lock:
+                self.stages.append(record)
+
+    def record(
+        self,
+        name: str,
+        *,
+        elapsed_ms: float = 0.0,
+        count: Optional[int] = None,
+        cache: Optional[str] = None,
+        **extra: Any,
+    ) -> None:
+        """
+        Registra una misura già effettuata (o un evento senza durata).
+        """
+        record = StageRecord(name, elapsed_ms=elapsed_ms)
+        record.note(count=count, cache=cache, **extra)
+        with self._lock:
+            self.stages.append(record)
+
+    @property
+    def elapsed_ms(self) -> float:
+        end = self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+        return end * 1000.0
+
+    def totals(self) -> Dict[str, float]:
+        """
+        Millisecondi per nome di stage (sommati sulle ripetizioni).
+        """
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for record in self.stages:
+                totals[record.name] = totals.get(record.name, 0.0) + record.elapsed_ms
+        return totals
+
+    def finish(self) -> "Profile":
+        """
+        Chiude il profilo e lo invia al sink (una sola volta).
+        """
+        if self._elapsed is None:
+            self._elapsed = time.perf_counter() - self._started
+            if self.sink is not None:
+                self.sink.emit(self)
+        return self
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = [r.as_dict() for r in self.stages]
+        return {"name": self.name, "elapsed_ms": self.elapsed_ms, "stages": stages}
+
+
+class _NullStage:
+    """
+    Stage disattivato: context manager e `note` senza effetto.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+    def note(self, **_: Any) -> None:
+        pass
+
+
+class _NullProfile:
+    """
+    Profilo disattivato: ogni operazione è un no-op senza allocazioni.
+    """
+
+    __slots__ = ()
+
+    enabled = False
+
+    def stage(self, name: str) -> _NullStage:
+        return _NULL_STAGE
+
+    def record(self, name: str, **_: Any) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+NULL_PROFILE = _NullProfile()
+
+
+# ============================================================
+# PROFILO CORRENTE
+# ============================================================
+
+_current: ContextVar[Any] = ContextVar("ice_conscious_profile", default=NULL_PROFILE)
+
+
+def current_profile() -> Any:
+    """
+    Profilo attivo nel contesto corrente, o NULL_PROFILE.
+
+    Le funzioni strumentate lo leggono invece di riceverlo come argomento:
+    a profiling spento il costo è una lettura di ContextVar e un
+    context manager vuoto.
+    """
+    return _current.get()
+
+
+@contextmanager
+def profiling(name: str, *, sink: Optional[MetricsSink] = None) -> Iterator[Profile]:
+    """
+    Attiva un Profile per il blocco; alla fine viene chiuso ed emesso al sink.
+    """
+    profile = Profile(name, sink=sink)
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        profile.finish()
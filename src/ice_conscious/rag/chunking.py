@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import re
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence
+
+
+# ============================================================
+# CONFIGURAZIONE
+# ============================================================
+
+@dataclass
+class ChunkingConfig:
+    """
+    Finestre di chunking.
+
+    mode:
+    - "chars": circa `size` caratteri, `overlap` caratteri ripetuti
+    - "lines": `size` righe, `overlap` righe ripetute
+    - "sentences": `size` frasi, `overlap` frasi ripetute
+
+    Con `code_aware` i file sorgente (per estensione) in modalità
+    "chars" vengono tagliati preferibilmente prima di una definizione
+    (primo livello o metodo), appena la finestra è piena almeno a metà;
+    il chunk successivo inizia dalla definizione, senza overlap.
+    Nessun chunk supera `max_chars`.
+    """
+    mode: str = "chars"
+    size: int = 2000
+    overlap: int = 200
+    code_aware: bool = True
+    max_chars: int = 8000
+
+    def __post_init__(self) -> None:
+        if self.mode not in ("chars", "lines", "sentences"):
+            raise ValueError(f"Unknown chunking mode: {self.mode!r}")
+        if self.size <= 0 or not 0 <= self.overlap < self.size:
+            raise ValueError("Chunking requires size > 0 and 0 <= overlap < size")
+
+
+@dataclass
+class Chunk:
+    """
+    Finestra di un documento, con la sua posizione nel padre.
+    """
+    index: int
+    text: str
+    start_char: int
+    end_char: int
+    start_line: int          # 1-based, inclusiva
+    end_line: int
+
+    def metadata(self, parent_id: str) -> Dict[str, Any]:
+        return {
+            "parent_id": parent_id,
+            "chunk_index": self.index,
+            "start_char": self.start_char,
+            "end_char": self.end_char,
+            "start_line": self.start_line,
+            "end_line": self.end_line,
+        }
+
+
+# estensioni trattate come sorgenti
+CODE_SUFFIXES = frozenset({
+    ".py", ".pyi", ".js", ".jsx", ".ts", ".tsx", ".java", ".kt", ".scala",
+    ".go", ".rs", ".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".rb", ".php",
+    ".swift", ".m", ".sh", ".lua", ".sql",
+})
+
+# inizio di una definizione, al più un livello di indentazione (metodi)
+_DEFINITION = re.compile(
+    r"(?: {0,4}|\t?)(?:@|def |async def |class |function |export |func |fn |pub |impl |struct |enum |"
+    r"interface |type |module |package |public |private |protected |static |template)"
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def is_code_path(path: Path | str) -> bool:
+    return Path(path).suffix.lower() in CODE_SUFFIXES
+
+
+def derived_doc_id(parent_id: str, index: int) -> str:
+    return f"{parent_id}#{index}"
+
+
+# ============================================================
+# UNITÀ DI TESTO
+# ============================================================
+
+@dataclass
+class _Unit:
+    text: str
+    start_char: int
+    line: int
+    boundary: bool = False   # una finestra può iniziare qui (codice)
+
+
+def _line_units(lines: Iterable[str], max_len: int, code: bool) -> Iterator[_Unit]:
+    """
+    Righe come unità; le righe più lunghe di `max_len` vengono spezzate.
+    """
+    offset = 0
+    for number, line in enumerate(lines, start=1):
+        boundary = code and bool(_DEFINITION.match(line))
+        for start in range(0, max(len(line), 1), max_len):
+            piece = line[start:start + max_len]
+            if piece:
+                yield _Unit(piece, offset + start, number, boundary and start == 0)
+        offset += len(line)
+
+
+def _sentence_units(lines: Iterable[str], max_len: int) -> Iterator[_Unit]:
+    """
+    Frasi come unità, ricostruite attraverso i confini di riga.
+
+    Ogni frase include gli spazi che la seguono: concatenando le unità
+    si riottiene il testo originale.
+    """
+    pending = ""
+    position = 0      # offset di `pending` nel documento
+    line = 1          # riga di inizio di `pending`
+
+    def split(text: str) -> Iterator[_Unit]:
+        nonlocal position, line
+        for start in range(0, len(text), max_len):
+            piece = text[start:start + max_len]
+            yield _Unit(piece, position, line)
+            position += len(piece)
+            line += piece.count("\n")
+
+    for text in lines:
+        pending += text
+        while True:
+            match = _SENTENCE_END.search(pending)
+            if match is None or match.end() == len(pending):
+                break
+            yield from split(pending[:match.end()])
+            pending = pending[match.end():]
+        if len(pending) >= max_len:
+            cut = len(pending) - len(pending) % max_len
+            yield from split(pending[:cut])
+            pending = pending[cut:]
+
+    if pending:
+        yield from split(pending)
+
+
+# ============================================================
+# CHUNKER
+# ============================================================
+
+class StreamingChunker:
+    """
+    Divide un flusso di righe in finestre sovrapposte.
+
+    Tiene in memoria solo la finestra corrente: il picco di memoria
+    dipende da `size` / `max_chars`, non dalla lunghezza del documento.
+    """
+
+    def __init__(self, config: Optional[ChunkingConfig] = None) -> None:
+        self.config = config or ChunkingConfig()
+
+    def chunk_file(self, path: Path, *, code: Optional[bool] = None) -> Iterator[Chunk]:
+        """
+        Chunk di un file letto riga per riga (decodifica UTF-8, errori ignorati).
+        """
+        if code is None:
+            code = is_code_path(path)
+        with Path(path).open("r", encoding="utf-8", errors="ignore", newline="") as fh:
+            yield from self.chunks(fh, code=code)
+
+    def chunk_text(self, text: str, *, code: bool = False) -> Iterator[Chunk]:
+        return self.chunks(text.splitlines(keepends=True), code=code)
+
+    def chunks(self, lines: Iterable[str], *, code: bool = False) -> Iterator[Chunk]:
+        cfg = self.config
+        limit = cfg.max_chars
+        if cfg.mode == "chars":
+            limit = min(limit, cfg.size)
+
+        if cfg.mode == "sentences":
+            units = _sentence_units(lines, limit)
+        else:
+            units = _line_units(lines, limit, code and cfg.code_aware)
+
+        if cfg.mode == "chars":
+            return self._by_chars(units, code and cfg.code_aware)
+        return self._by_count(units)
+
+    # ----------------------------------------------------------
+    # FINESTRE
+    # ----------------------------------------------------------
+
+    def _by_count(self, units: Iterator[_Unit]) -> Iterator[Chunk]:
+        cfg = self.config
+        window: Deque[_Unit] = deque()
+        chars = 0
+        index = 0
+        fresh = 0     # unità non ancora emesse
+
+        for unit in units:
+            if window and fresh and (len(window) >= cfg.size or chars + len(unit.text) > cfg.max_chars):
+                yield self._emit(index, window)
+                index += 1
+                # l'overlap non deve far superare max_chars al chunk successivo
+                chars, fresh = self._keep_overlap(
+                    window,
+                    keep_units=cfg.overlap,
+                    keep_chars=cfg.max_chars - len(unit.text),
+                )
+            window.append(unit)
+            chars += len(unit.text)
+            fresh += 1
+
+        if window and (fresh or index == 0):
+            yield self._emit(index, window)
+
+    def _by_chars(self, units: Iterator[_Unit], code: bool) -> Iterator[Chunk]:
+        cfg = self.config
+        window: Deque[_Unit] = deque()
+        chars = 0
+        index = 0
+        fresh = 0
+
+        for unit in units:
+            if window and fresh:
+                full = chars + len(unit.text) > cfg.size
+                early = code and unit.boundary and chars >= cfg.size // 2
+                if full or early:
+                    yield self._emit(index, window)
+                    index += 1
+                    overlap = 0 if early and not full else cfg.overlap
+                    chars, fresh = self._keep_overlap(window, keep_chars=overlap)
+            window.append(unit)
+            chars += len(unit.text)
+            fresh += 1
+
+        if window and (fresh or index == 0):
+            yield self._emit(index, window)
+
+    @staticmethod
+    def _keep_overlap(
+        window: Deque[_Unit],
+        *,
+        keep_units: Optional[int] = None,
+        keep_chars: Optional[int] = None,
+    ) -> tuple:
+        """
+        Conserva in coda le ultime unità (per numero o per caratteri).
+        """
+        kept: List[_Unit] = []
+        chars = 0
+        while window:
+            unit = window.pop()
+            if keep_units is not None and len(kept) >= keep_units:
+                break
+            if keep_chars is not None and chars + len(unit.text) > keep_chars:
+                break
+            kept.append(unit)
+            chars += len(unit.text)
+        window.clear()
+        window.extend(reversed(kept))
+        return chars, 0
+
+    @staticmethod
+    def _emit(index: int, window: Sequence[_Unit]) -> Chunk:
+        first, last = window[0], window[-1]
+        text = "".join(u.text for u in window)
+        return Chunk(
+            index=index,
+            text=text,
+            start_char=first.start_char,
+            end_char=first.start_char + len(text),
+            start_line=first.line,
+            end_line=last.line + last.text.count("\n", 0, len(last.text) - 1),
+        )
+
+
+# ============================================================
+# PREPROCESS PER ingest_directory
+# ============================================================
+
+def chunk_document(
+    doc_id: str,
+    text: str,
+    metadata: Dict[str, Any],
+    config: Optional[ChunkingConfig] = None,
+) -> List[Sequence[Any]]:
+    """
+    Documenti derivati di un testo, nel formato di `ingest_many`.
+
+    Un testo che sta in un solo chunk conserva il proprio doc_id.
+    Utilizzabile come `preprocess` di `ingest_directory`
+    (con `functools.partial` per la configurazione).
+    """
+    code = is_code_path(metadata.get("path", doc_id))
+    chunks = list(StreamingChunker(config).chunk_text(text, code=code))
+    if len(chunks) <= 1:
+        return [(doc_id, text, metadata)]
+    return [
+        (derived_doc_id(doc_id, c.index), c.text, {**metadata, **c.metadata(doc_id)})
+        for c in chunks
+    ]
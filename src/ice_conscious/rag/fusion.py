@@ -0,0 +1,404 @@
+from __future__ import annotations
+
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Collection, Dict, List, Optional, Protocol, Sequence
+
+from ..knowledge.filters import FilterIndex
+from ..knowledge.keyword_index import KeywordIndex
+from ..knowledge.scoring import RankingConfig
+from ..knowledge.views import KnowledgeViewEntity, KnowledgeViewHit, KnowledgeViewResult
+from ..profiling import current_profile
+from ..topk import top_k as select_top_k
+from .graph_expansion import GraphExpansionStage
+
+
+# ============================================================
+# RETRIEVER
+# ============================================================
+
+class Retriever(Protocol):
+    """
+    Sorgente di candidati per la fusione.
+
+    Restituisce al massimo `limit` hit, ordinati per score decrescente.
+    Con `allowed` considera solo quegli id (pre-filtro).
+    """
+
+    name: str
+
+    def retrieve(
+        self,
+        workspace_id: str,
+        text: str,
+        limit: int,
+        *,
+        allowed: Optional[Collection[str]] = None,
+    ) -> List[KnowledgeViewHit]:
+        ...
+
+
+class KeywordRetriever:
+    """
+    Candidati BM25 da un KeywordIndex.
+    """
+
+    def __init__(self, index: KeywordIndex, *, name: str = "keyword") -> None:
+        self.index = index
+        self.name = name
+
+    def retrieve(
+        self,
+        workspace_id: str,
+        text: str,
+        limit: int,
+        *,
+        allowed: Optional[Collection[str]] = None,
+    ) -> List[KnowledgeViewHit]:
+        return self.index.view_hits(workspace_id, text, limit, allowed=allowed)
+
+
+class VectorRetriever:
+    """
+    Candidati per similarità da un RAGStorageAdapter.
+
+    L'adapter è legato al proprio workspace: `workspace_id` è ignorato.
+    """
+
+    def __init__(self, adapter: Any, *, name: str = "vector") -> None:
+        self.adapter = adapter
+        self.name = name
+
+    def retrieve(
+        self,
+        workspace_id: str,
+        text: str,
+        limit: int,
+        *,
+        allowed: Optional[Collection[str]] = None,
+    ) -> List[KnowledgeViewHit]:
+        hits = []
+        for doc in self.adapter.similarity_search(text, top_k=limit, allowed_ids=allowed):
+            metadata = doc.get("metadata") or {}
+            entity = KnowledgeViewEntity(
+                entity_id=doc["doc_id"],
+                entity_type=metadata.get("content_type", "document"),
+                name=metadata.get("path", doc["doc_id"]),
+                description=doc.get("text"),
+                relevance_score=doc["score"],
+                metadata=metadata,
+            )
+            hits.append(KnowledgeViewHit(entity=entity, score=doc["score"], source="vector"))
+        return hits
+
+
+# ============================================================
+# FUSIONE
+# ============================================================
+
+@dataclass
+class _SourceState:
+    retriever: Any
+    limit: int
+    hits: List[KnowledgeViewHit] = field(default_factory=list)
+    exhausted: bool = False
+    rounds: int = 0
+    elapsed: float = 0.0
+    error: Optional[str] = None
+
+
+class HybridFusionStage:
+    """
+    Fusione dei risultati di più retriever in un unico ranking.
+
+    - i retriever girano in parallelo, ciascuno con un budget di
+      over-fetch (top_k * overfetch candidati)
+    - le liste vengono fuse con RRF o score pesati (RankingConfig)
+    - se i candidati non ancora visti potrebbero ancora entrare nel
+      top-k fuso, i retriever non esauriti vengono interrogati più a
+      fondo (budget raddoppiato, fino a max_fetch); altrimenti ci si ferma
+    - con uno stage di graph expansion, gli hit inferiti dai migliori
+      risultati entrano come lista "graph"
+
+    Un hit trovato da più sorgenti ha source="hybrid"; altrimenti
+    conserva la sorgente d'origine. I tempi per sorgente finiscono
+    in `debug["fusion"]`.
+
+    I filtri di una query (`search`) vengono risolti sul `filter_index`
+    in un insieme di id ammessi, rispettato da tutte le sorgenti
+    (graph expansion inclusa); senza filter_index sono rifiutati.
+    Un retriever che fallisce in un round successivo conserva gli
+    hit dei round precedenti.
+    """
+
+    def __init__(
+        self,
+        retrievers: Sequence[Any],
+        *,
+        graph_expansion: Optional[GraphExpansionStage] = None,
+        ranking: Optional[RankingConfig] = None,
+        max_workers: Optional[int] = None,
+        filter_index: Optional[FilterIndex] = None,
+    ) -> None:
+        self.retrievers = list(retrievers)
+        self.graph_expansion = graph_expansion
+        self.ranking = ranking or RankingConfig()
+        self.filter_index = filter_index
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or max(len(self.retrievers), 1),
+            thread_name_prefix="hybrid-fusion",
+        )
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    # ----------------------------------------------------------
+    # API
+    # ----------------------------------------------------------
+
+    def search(self, query: Any) -> KnowledgeViewResult:
+        """
+        Esegue una KnowledgeSearchQuery (rispetta use_vector / use_keyword
+        e i filtri, risolti sul filter_index).
+        """
+        allowed: Optional[Collection[str]] = None
+        filters = getattr(query, "filters", None)
+        if filters:
+            if self.filter_index is None:
+                raise ValueError("Query filters require a filter_index on HybridFusionStage")
+            allowed = self.filter_index.candidates(query.workspace_id, filters)
+
+        disabled = set()
+        if not getattr(query, "use_vector", True):
+            disabled.add("vector")
+        if not getattr(query, "use_keyword", True):
+            disabled.add("keyword")
+
+        return self.fuse(
+            query.workspace_id,
+            query.text or "",
+            query.top_k,
+            ranking=getattr(query, "ranking", None),
+            sources=[r.name for r in self.retrievers if r.name not in disabled],
+            allowed=allowed,
+        )
+
+    def fuse(
+        self,
+        workspace_id: str,
+        text: str,
+        top_k: int = 10,
+        *,
+        ranking: Optional[RankingConfig] = None,
+        sources: Optional[Sequence[str]] = None,
+        allowed: Optional[Collection[str]] = None,
+    ) -> KnowledgeViewResult:
+        cfg = ranking or self.ranking
+        started = time.perf_counter()
+        result = KnowledgeViewResult()
+
+        retrievers = [r for r in self.retrievers if sources is None or r.name in sources]
+        initial = min(max(top_k * cfg.overfetch, top_k), cfg.max_fetch)
+        states = [_SourceState(retriever=r, limit=initial) for r in retrievers]
+
+        rounds = 0
+        stable = not states
+        pending = list(states)
+        while pending:
+            rounds += 1
+            self._fetch(workspace_id, text, pending, allowed)
+            fused = self._fuse(states, cfg)
+            stable = self._stable(fused, states, top_k, cfg)
+            if stable:
+                break
+
+            pending = [s for s in states if not s.exhausted and s.limit < cfg.max_fetch]
+            for state in pending:
+                state.limit = min(state.limit * 2, cfg.max_fetch)
+
+        if self.graph_expansion is not None:
+            graph_state = self._graph(workspace_id, states, top_k, cfg, allowed)
+            if graph_state is not None:
+                states.append(graph_state)
+
+        fused = self._fuse(states, cfg)
+        ranked = select_top_k(
+            (entry for entry in fused.values() if entry[0] > cfg.min_score),
+            top_k,
+            key=lambda entry: entry[0],
+        )
+        result.hits = [self._hit(entry, cfg) for entry in ranked]
+
+        for state in states:
+            if state.error is not None:
+                result.warnings.append(f"{state.retriever.name} retriever failed: {state.error}")
+
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        current_profile().record("fusion", elapsed_ms=elapsed_ms, count=len(result.hits), rounds=rounds)
+
+        result.debug["fusion"] = {
+            "method": cfg.fusion,
+            "rounds": rounds,
+            "stable": stable,
+            "elapsed_ms": elapsed_ms,
+            "sources": {
+                s.retriever.name: {
+                    "elapsed_ms": s.elapsed * 1000.0,
+                    "fetched": len(s.hits),
+                    "rounds": s.rounds,
+                    "exhausted": s.exhausted,
+                }
+                for s in states
+            },
+        }
+        return result
+
+    # ----------------------------------------------------------
+    # INTERNAL
+    # ----------------------------------------------------------
+
+    def _fetch(
+        self,
+        workspace_id: str,
+        text: str,
+        states: List[_SourceState],
+        allowed: Optional[Collection[str]],
+    ) -> None:
+        options = {"allowed": allowed} if allowed is not None else {}
+
+        def run(state: _SourceState) -> None:
+            t0 = time.perf_counter()
+            try:
+                hits = state.retriever.retrieve(workspace_id, text, state.limit, **options)
+                state.hits = sorted(hits, key=lambda h: h.score, reverse=True)
+                state.exhausted = len(hits) < state.limit
+            except Exception as exc:
+                # gli hit di un round precedente restano validi
+                state.exhausted = True
+                state.error = str(exc)
+            state.rounds += 1
+            state.elapsed += time.perf_counter() - t0
+
+        if len(states) == 1:
+            run(states[0])
+        elif current_profile().enabled:
+            # il profilo attivo segue i retriever nei thread del pool
+            contexts = [contextvars.copy_context() for _ in states]
+            list(self._pool.map(lambda ctx, state: ctx.run(run, state), contexts, states))
+        else:
+            list(self._pool.map(run, states))
+
+    def _weight(self, state: _SourceState, cfg: RankingConfig) -> float:
+        return cfg.weights.get(state.retriever.name, 1.0)
+
+    def _contribution(self, state: _SourceState, rank: int, hit: KnowledgeViewHit, cfg: RankingConfig) -> float:
+        weight = self._weight(state, cfg)
+        if cfg.fusion == "rrf":
+            return weight / (cfg.rrf_k + rank)
+        if cfg.fusion == "weighted":
+            best = state.hits[0].score if state.hits else 0.0
+            return weight * (hit.score / best) if best > 0 else 0.0
+        raise ValueError(f"Unknown fusion method: {cfg.fusion!r}")
+
+    def _unseen_bound(self, state: _SourceState, cfg: RankingConfig) -> float:
+        """
+        Contributo massimo di un candidato che la sorgente non ha ancora restituito.
+        """
+        if state.exhausted or not state.hits:
+            return 0.0
+        return self._contribution(state, len(state.hits) + 1, state.hits[-1], cfg)
+
+    def _fuse(
+        self,
+        states: List[_SourceState],
+        cfg: RankingConfig,
+    ) -> Dict[str, List[Any]]:
+        # entity_id -> [score, primo hit, {sorgente: rank}]
+        fused: Dict[str, List[Any]] = {}
+        for state in states:
+            name = state.retriever.name
+            for rank, hit in enumerate(state.hits, start=1):
+                key = hit.entity.entity_id
+                entry = fused.get(key)
+                if entry is None:
+                    entry = fused[key] = [0.0, hit, {}]
+                if name in entry[2]:
+                    continue
+                entry[0] += self._contribution(state, rank, hit, cfg)
+                entry[2][name] = rank
+        return fused
+
+    def _stable(
+        self,
+        fused: Dict[str, List[Any]],
+        states: List[_SourceState],
+        k: int,
+        cfg: RankingConfig,
+    ) -> bool:
+        """
+        Vero se nessun candidato fuori dal top-k (visto o no) può superarlo.
+        """
+        bounds = {s.retriever.name: self._unseen_bound(s, cfg) for s in states}
+        unseen = sum(bounds.values())
+        if not unseen:
+            return True
+        if len(fused) < k:
+            return False
+
+        ranked = select_top_k(fused.items(), k + 1, key=lambda kv: kv[1][0])
+        kth = ranked[k - 1][1][0]
+        if unseen > kth:
+            return False
+
+        top = {key for key, _ in ranked[:k]}
+        for key, (score, _, seen) in fused.items():
+            if key in top:
+                continue
+            missing = sum(b for name, b in bounds.items() if name not in seen)
+            if score + missing > kth:
+                return False
+        return True
+
+    def _graph(
+        self,
+        workspace_id: str,
+        states: List[_SourceState],
+        k: int,
+        cfg: RankingConfig,
+        allowed: Optional[Collection[str]] = None,
+    ) -> Optional[_SourceState]:
+        fused = self._fuse(states, cfg)
+        seeds = [
+            KnowledgeViewHit(entity=hit.entity, score=score, source=hit.source)
+            for score, hit, _ in select_top_k(fused.values(), k, key=lambda entry: entry[0])
+        ]
+        if not seeds:
+            return None
+
+        state = _SourceState(retriever=_Named("graph"), limit=0, exhausted=True)
+        t0 = time.perf_counter()
+        try:
+            state.hits = self.graph_expansion.expand(workspace_id, seeds, allowed_ids=allowed)
+        except Exception as exc:
+            state.error = str(exc)
+        state.rounds = 1
+        state.elapsed = time.perf_counter() - t0
+        return state
+
+    def _hit(self, entry: List[Any], cfg: RankingConfig) -> KnowledgeViewHit:
+        score, hit, ranks = entry
+        source = "hybrid" if len(ranks) > 1 else hit.source
+        return KnowledgeViewHit(
+            entity=hit.entity,
+            score=score,
+            source=source,
+            explanation=f"{cfg.fusion}: " + ", ".join(f"{n}#{r}" for n, r in ranks.items()),
+            metadata={**hit.metadata, "sources": dict(ranks)},
+        )
+
+
+class _Named:
+    def __init__(self, name: str) -> None:
+        self.name = name
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import heapq
+import time
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Collection, Dict, List, Optional, Sequence, Set, Tuple
+
+from ..knowledge.adjacency import AdjacencyIndex, RelationGraph
+from ..knowledge.views import KnowledgeViewEntity, KnowledgeViewHit, view_entity_from_record
+from ..topk import top_k
+
+
+# ============================================================
+# CONFIGURAZIONE
+# ============================================================
+
+@dataclass
+class GraphExpansionConfig:
+    """
+    Limiti dell'espansione sul grafo delle relazioni.
+    """
+
+    max_hops: int = 2
+    fanout: int = 8                   # vicini seguiti per nodo
+    max_nodes: int = 32               # entità inferite al massimo
+    max_scan_per_node: int = 4096     # archi esaminati per nodo (hub)
+    time_budget: float = 0.005        # secondi
+    seeds: int = 5                    # hit di partenza
+
+    decay: float = 0.5                # attenuazione per hop
+    min_score: float = 0.0
+
+    relation_types: Optional[Tuple[str, ...]] = ("depends_on", "explains", "causes")
+    direction: str = "both"           # out, in, both
+
+
+# ============================================================
+# STAGE
+# ============================================================
+
+class GraphExpansionStage:
+    """
+    Espansione k-hop dei risultati di ricerca sul grafo delle relazioni.
+
+    Parte dai migliori hit e segue le relazioni in ordine di score
+    (best-first): lo score di un'entità raggiunta è
+    score_seed * forza * decay^hop, massimo sui cammini trovati.
+
+    È limitata per hop, per fan-out, per numero di nodi e per tempo:
+    il lavoro non dipende dalla dimensione del grafo.
+
+    Le entità trovate entrano nel risultato con source="inferred".
+    Con `allowed_ids` (filtri della query già risolti) l'espansione
+    resta sul sottografo di quegli id: le altre entità non vengono
+    né restituite né attraversate.
+    """
+
+    def __init__(
+        self,
+        index: AdjacencyIndex,
+        *,
+        repository: Any = None,
+        config: Optional[GraphExpansionConfig] = None,
+    ) -> None:
+        self.index = index
+        self.repository = repository if repository is not None else index.repository
+        self.config = config or GraphExpansionConfig()
+
+    def apply(
+        self,
+        workspace_id: str,
+        result: Any,
+        *,
+        allowed_ids: Optional[Collection[str]] = None,
+    ) -> Any:
+        """
+        Aggiunge gli hit inferiti a un KnowledgeViewResult (in place).
+        """
+        started = time.perf_counter()
+        expanded = self.expand(workspace_id, result.hits, allowed_ids=allowed_ids)
+        result.hits.extend(expanded)
+
+        debug = getattr(result, "debug", None)
+        if isinstance(debug, dict):
+            debug["graph_expansion"] = {
+                "added": len(expanded),
+                "elapsed_ms": (time.perf_counter() - started) * 1000.0,
+            }
+        return result
+
+    def expand(
+        self,
+        workspace_id: str,
+        hits: Sequence[KnowledgeViewHit],
+        *,
+        allowed_ids: Optional[Collection[str]] = None,
+    ) -> List[KnowledgeViewHit]:
+        cfg = self.config
+        graph = self.index.graph(workspace_id)
+        deadline = time.perf_counter() + cfg.time_budget
+
+        allowed = self._type_codes(graph)
+        if allowed is not None and not allowed:
+            return []
+
+        seen: Set[int] = set()
+        heap: List[Tuple[float, int, int, int]] = []
+
+        for h in hits[: cfg.seeds]:
+            idx = graph.index_of(h.entity.entity_id)
+            if idx is not None:
+                heapq.heappush(heap, (-h.score, 0, idx, idx))
+        for h in hits:
+            idx = graph.index_of(h.entity.entity_id)
+            if idx is not None:
+                seen.add(idx)
+
+        # nodo -> (score, hop, nodo da cui è stato raggiunto, tipo relazione)
+        found: Dict[int, Tuple[float, int, int, int]] = {}
+        expanded: Set[int] = set()
+
+        while heap and len(found) < cfg.max_nodes:
+            if time.perf_counter() > deadline:
+                break
+
+            neg_score, hop, idx, _ = heapq.heappop(heap)
+            if idx in expanded or hop >= cfg.max_hops:
+                continue
+            expanded.add(idx)
+            score = -neg_score
+
+            for other, code, strength in self._best_neighbors(graph, idx, allowed):
+                if other in seen:
+                    continue
+                if allowed_ids is not None and graph.node_id(other) not in allowed_ids:
+                    seen.add(other)
+                    continue
+                s = score * strength * cfg.decay
+                if s <= cfg.min_score:
+                    continue
+                previous = found.get(other)
+                if previous is None or s > previous[0]:
+                    found[other] = (s, hop + 1, idx, code)
+                    heapq.heappush(heap, (-s, hop + 1, other, idx))
+
+        ranked = top_k(found.items(), cfg.max_nodes, key=lambda kv: kv[1][0])
+        return [
+            self._hit(graph, workspace_id, idx, score, hop, via, code)
+            for idx, (score, hop, via, code) in ranked
+        ]
+
+    # ----------------------------------------------------------
+    # INTERNAL
+    # ----------------------------------------------------------
+
+    def _type_codes(self, graph: RelationGraph) -> Optional[Set[int]]:
+        if self.config.relation_types is None:
+            return None
+        codes = (graph.type_code(t) for t in self.config.relation_types)
+        return {c for c in codes if c is not None}
+
+    def _best_neighbors(
+        self,
+        graph: RelationGraph,
+        idx: int,
+        allowed: Optional[Set[int]],
+    ) -> List[Tuple[int, int, float]]:
+        cfg = self.config
+        edges = []
+        if cfg.direction in ("out", "both"):
+            edges.append(graph.out_edges_idx(idx))
+        if cfg.direction in ("in", "both"):
+            edges.append(graph.in_edges_idx(idx))
+
+        candidates = (
+            e
+            for it in edges
+            for e in islice(it, cfg.max_scan_per_node)
+            if allowed is None or e[1] in allowed
+        )
+        return top_k(candidates, cfg.fanout, key=lambda e: e[2])
+
+    def _hit(
+        self,
+        graph: RelationGraph,
+        workspace_id: str,
+        idx: int,
+        score: float,
+        hop: int,
+        via: int,
+        code: int,
+    ) -> KnowledgeViewHit:
+        entity_id = graph.node_id(idx)
+        record = self.repository.get_entity(entity_id) if self.repository is not None else None
+
+        if record is not None:
+            entity = view_entity_from_record(record, relevance_score=score)
+        else:
+            entity = KnowledgeViewEntity(
+                entity_id=entity_id,
+                entity_type="unknown",
+                name=entity_id,
+                relevance_score=score,
+            )
+
+        relation_type = graph.type_name(code)
+        via_id = graph.node_id(via)
+        return KnowledgeViewHit(
+            entity=entity,
+            score=score,
+            source="inferred",
+            explanation=f"{relation_type} via {via_id} (hop {hop})",
+            metadata={
+                "hop": hop,
+                "via": via_id,
+                "relation_type": relation_type,
+                "workspace_id": workspace_id,
+            },
+        )
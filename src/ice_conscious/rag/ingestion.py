@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# preprocess(doc_id, text, metadata) -> documenti da ingerire (es. chunk);
+# con un process pool deve essere una funzione di modulo (picklable)
+Preprocess = Callable[[str, str, Dict[str, Any]], List[Sequence[Any]]]
+
+
+# ============================================================
+# REPORT / PROGRESSO
+# ============================================================
+
+@dataclass
+class DirectoryIngestReport:
+    """
+    Contatori di `ingest_directory`, aggiornati durante l'esecuzione
+    (passati a `on_progress` a ogni checkpoint).
+    """
+    files_total: int = 0
+    files_read: int = 0
+    files_done: int = 0
+    files_resumed: int = 0      # già ingeriti in una run precedente
+    files_binary: int = 0       # saltati: contenuto non testuale
+    bytes_read: int = 0
+    docs_ingested: int = 0
+    docs_skipped: int = 0       # invariati (stesso hash del contenuto)
+    docs_deduplicated: int = 0  # embedding riusato da un documento identico
+    docs_removed: int = 0       # chunk o documenti di versioni precedenti
+    checkpoints: int = 0
+    elapsed_s: float = 0.0
+    failed: Dict[str, str] = field(default_factory=dict)   # path o doc_id -> errore
+
+    @property
+    def files_per_s(self) -> float:
+        return self.files_done / self.elapsed_s if self.elapsed_s else 0.0
+
+    @property
+    def docs_per_s(self) -> float:
+        return self.docs_ingested / self.elapsed_s if self.elapsed_s else 0.0
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.bytes_read / 1e6 / self.elapsed_s if self.elapsed_s else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["failed"] = len(self.failed)
+        data["files_per_s"] = self.files_per_s
+        data["docs_per_s"] = self.docs_per_s
+        data["mb_per_s"] = self.mb_per_s
+        return data
+
+
+# ============================================================
+# STATO PER IL RESUME
+# ============================================================
+
+class IngestManifest:
+    """
+    File JSON-lines dei file già ingeriti (path, size, mtime).
+
+    Un file viene registrato solo dopo il commit di tutti i suoi
+    documenti; alla ripresa i file invariati vengono saltati.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._done: Dict[str, Tuple[int, int]] = {}
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue   # riga troncata da un'interruzione
+                    self._done[entry["path"]] = (entry["size"], entry["mtime_ns"])
+
+    def is_done(self, path: Path) -> bool:
+        stat = path.stat()
+        return self._done.get(path.as_posix()) == (stat.st_size, stat.st_mtime_ns)
+
+    def mark_done(self, files: Iterable[Tuple[str, int, int]]) -> None:
+        lines = []
+        for name, size, mtime_ns in files:
+            self._done[name] = (size, mtime_ns)
+            lines.append(json.dumps({"path": name, "size": size, "mtime_ns": mtime_ns}) + "\n")
+        if lines:
+            with self.path.open("a", encoding="utf-8") as fh:
+                fh.writelines(lines)
+                fh.flush()
+
+
+# ============================================================
+# PIPELINE
+# ============================================================
+
+@dataclass
+class _FileDocs:
+    path: str
+    size: int
+    mtime_ns: int
+    docs: List[Sequence[Any]] = field(default_factory=list)
+    error: Optional[str] = None
+    binary: bool = False
+
+
+_DONE = object()
+
+
+def ingest_directory(
+    adapter: Any,
+    root: Path,
+    patterns: Sequence[str] = ("**/*",),
+    *,
+    workers: int = 4,
+    process_workers: int = 0,
+    preprocess: Optional[Preprocess] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    queue_size: int = 256,
+    checkpoint_every: int = 512,
+    state_path: Optional[Path] = None,
+    on_progress: Optional[Callable[[DirectoryIngestReport], None]] = None,
+) -> DirectoryIngestReport:
+    """
+    Ingest parallelo dei file sotto `root` che corrispondono a `patterns`.
+
+    Stage:
+    1. lettura e decodifica in un thread pool (`workers`)
+    2. `preprocess` opzionale (es. chunking), in un process pool
+       se `process_workers` > 0, altrimenti nel thread di lettura
+    3. embedding e storage con `adapter.ingest_many`, a checkpoint di
+       circa `checkpoint_every` documenti (un commit ciascuno); per ogni
+       file completato, `adapter.prune_file` (se presente) rimuove i
+       documenti della versione precedente non più prodotti
+
+    Tra 1-2 e 3 c'è una coda di `queue_size` file: se embedding e
+    storage rallentano, la lettura si ferma (backpressure).
+
+    Con `state_path` la run è riprendibile: i file completati vengono
+    registrati dopo ogni checkpoint e saltati alla ripresa se invariati.
+    I file con documenti falliti non vengono registrati (riprovati).
+    """
+    started = time.perf_counter()
+    root = Path(root)
+    report = DirectoryIngestReport()
+    manifest = IngestManifest(state_path) if state_path is not None else None
+
+    files = _collect(root, patterns)
+    report.files_total = len(files)
+    if manifest is not None:
+        pending = [p for p in files if not manifest.is_done(p)]
+        report.files_resumed = len(files) - len(pending)
+        files = pending
+
+    items: "queue.Queue[Any]" = queue.Queue(maxsize=max(queue_size, 1))
+    cancel = threading.Event()
+    readers = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="rag-read")
+    processes: Optional[Executor] = ProcessPoolExecutor(process_workers) if process_workers > 0 else None
+
+    def read(path: Path) -> None:
+        item = _read_file(path, metadata or {}, preprocess, processes)
+        while not cancel.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def feed() -> None:
+        futures = [readers.submit(read, p) for p in files]
+        for future in futures:
+            if cancel.is_set():
+                break
+            future.exception()
+        while not cancel.is_set():
+            try:
+                items.put(_DONE, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    feeder = threading.Thread(target=feed, name="rag-read-feeder", daemon=True)
+    feeder.start()
+
+    batch: List[_FileDocs] = []
+    batch_docs = 0
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                break
+
+            report.files_read += 1
+            report.bytes_read += item.size
+            if item.error is not None:
+                report.failed[item.path] = item.error
+                continue
+            if item.binary:
+                report.files_binary += 1
+                continue
+
+            batch.append(item)
+            batch_docs += len(item.docs)
+            if batch_docs >= checkpoint_every:
+                _checkpoint(adapter, batch, report, manifest)
+                batch, batch_docs = [], 0
+                report.elapsed_s = time.perf_counter() - started
+                if on_progress is not None:
+                    on_progress(report)
+
+        if batch:
+            _checkpoint(adapter, batch, report, manifest)
+    finally:
+        cancel.set()
+        readers.shutdown(wait=True, cancel_futures=True)
+        if processes is not None:
+            processes.shutdown(wait=True, cancel_futures=True)
+        feeder.join()
+
+    report.elapsed_s = time.perf_counter() - started
+    if on_progress is not None:
+        on_progress(report)
+    return report
+
+
+def _collect(root: Path, patterns: Sequence[str]) -> List[Path]:
+    seen = set()
+    for pattern in patterns:
+        for path in root.glob(pattern):
+            if path.is_file():
+                seen.add(path)
+    return sorted(seen)
+
+
+def _read_file(
+    path: Path,
+    metadata: Dict[str, Any],
+    preprocess: Optional[Preprocess],
+    processes: Optional[Executor],
+) -> _FileDocs:
+    name = path.as_posix()
+    try:
+        stat = path.stat()
+        item = _FileDocs(name, stat.st_size, stat.st_mtime_ns)
+        raw = path.read_bytes()
+    except OSError as exc:
+        return _FileDocs(name, 0, 0, error=f"read: {exc}")
+
+    if b"\0" in raw[:8192]:
+        item.binary = True
+        return item
+
+    text = raw.decode("utf-8", errors="ignore")
+    meta = {**metadata, "path": name}
+    try:
+        if preprocess is None:
+            item.docs = [(name, text, meta)]
+        elif processes is not None:
+            item.docs = processes.submit(preprocess, name, text, meta).result()
+        else:
+            item.docs = preprocess(name, text, meta)
+    except Exception as exc:
+        item.error = f"preprocess: {exc}"
+    return item
+
+
+def _checkpoint(
+    adapter: Any,
+    batch: List[_FileDocs],
+    report: DirectoryIngestReport,
+    manifest: Optional[IngestManifest],
+) -> None:
+    docs = [doc for item in batch for doc in item.docs]
+    result = adapter.ingest_many(docs)
+
+    report.docs_ingested += len(result.ingested)
+    report.docs_skipped += result.skipped
+    report.docs_deduplicated += result.deduplicated
+    report.failed.update(result.failed)
+    report.checkpoints += 1
+
+    prune = getattr(adapter, "prune_file", None)
+    done = []
+    for item in batch:
+        if not any(doc[0] in result.failed for doc in item.docs):
+            if prune is not None:
+                report.docs_removed += prune(item.path, {doc[0] for doc in item.docs})
+            done.append((item.path, item.size, item.mtime_ns))
+    report.files_done += len(done)
+    if manifest is not None:
+        manifest.mark_done(done)
@@ -3,8 +3,11 @@ from dataclasses import dataclass
 from typing import Any, List, Optional
 from datetime import datetime
 from .context_builder import RAGContextBuilder
+from .graph_expansion import GraphExpansionStage
 from .sessions import RAGSession
+from ..knowledge.filters import FilterIndex
 from ..knowledge.queries import KnowledgeSearchQuery, KnowledgeSearchResult
+from ..profiling import MetricsSink, Profile, current_profile, profiling
 
 
 @dataclass
@@ -12,6 +15,7 @@ class RAGPipelineResult:
     session: RAGSession
     search_result: KnowledgeSearchResult
     context_text: str
+    profile: Optional[Profile] = None
 
 
 class RAGPipeline:
@@ -20,15 +24,33 @@ class RAGPipeline:
 
     NON chiama LLM.
     NON salva nulla.
+
+    Con `explain=True` (o `profile=True` per tutte le run) misura
+    ogni stage (embedding, vector search, idratazione, scoring,
+    contesto): il profilo finisce in `search_result.debug["profile"]`
+    e, se configurato, nel `metrics_sink`.
+
+    Con filtri nella query, la graph expansion resta sulle entità
+    ammesse, risolte sul `filter_index`; senza filter_index
+    l'espansione viene saltata (le entità inferite non sono filtrabili).
     """
 
     def __init__(
         self,
         search_service,
         context_builder: Optional[RAGContextBuilder] = None,
+        graph_expansion: Optional[GraphExpansionStage] = None,
+        *,
+        metrics_sink: Optional[MetricsSink] = None,
+        profile: bool = False,
+        filter_index: Optional[FilterIndex] = None,
     ) -> None:
         self.search_service = search_service
         self.context_builder = context_builder or RAGContextBuilder()
+        self.graph_expansion = graph_expansion
+        self.metrics_sink = metrics_sink
+        self.profile = profile
+        self.filter_index = filter_index
 
     def run(
         self,
@@ -37,8 +59,28 @@ class RAGPipeline:
         query_text: str,
         filters: Optional[List[Any]] = None,
         top_k: int = 8,
+        explain: bool = False,
     ) -> RAGPipelineResult:
 
+        if not (explain or self.profile):
+            return self._run(workspace_id, query_text, filters, top_k)
+
+        with profiling("rag.run", sink=self.metrics_sink) as profile:
+            result = self._run(workspace_id, query_text, filters, top_k)
+
+        result.profile = profile
+        result.search_result.debug["profile"] = profile.as_dict()
+        return result
+
+    def _run(
+        self,
+        workspace_id: str,
+        query_text: str,
+        filters: Optional[List[Any]],
+        top_k: int,
+    ) -> RAGPipelineResult:
+        prof = current_profile()
+
         ks_query = KnowledgeSearchQuery(
             workspace_id=workspace_id,
             text=query_text,
@@ -46,8 +88,29 @@ class RAGPipeline:
             top_k=top_k,
         )
 
-        search_result = self.search_service.search(ks_query)
-        context_text = self.context_builder.build(search_result.hits)
+        with prof.stage("pipeline.search") as stage:
+            search_result = self.search_service.search(ks_query)
+            stage.note(count=len(search_result.hits))
+
+        if self.graph_expansion is not None:
+            with prof.stage("pipeline.graph_expansion") as stage:
+                if not filters:
+                    search_result = self.graph_expansion.apply(workspace_id, search_result)
+                elif self.filter_index is not None:
+                    allowed = self.filter_index.candidates(workspace_id, filters)
+                    search_result = self.graph_expansion.apply(
+                        workspace_id, search_result, allowed_ids=allowed
+                    )
+                else:
+                    stage.note(skipped="filters")
+                    debug = getattr(search_result, "debug", None)
+                    if isinstance(debug, dict):
+                        debug["graph_expansion"] = {"skipped": "filters without filter_index"}
+                stage.note(count=len(search_result.hits))
+
+        with prof.stage("pipeline.context") as stage:
+            context_text = self.context_builder.build(search_result.hits)
+            stage.note(chars=len(context_text))
 
         session = RAGSession(
             session_id="rag-session",
@@ -0,0 +1,495 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Collection, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from ..knowledge.filters import FilterIndex
+from ..knowledge.graph import KnowledgeFilter
+from ..knowledge.queries import KnowledgeSearchQuery, KnowledgeSearchResult
+from ..knowledge.scoring import CompiledScorer, RankingConfig, WorkspaceScorers
+from ..knowledge.views import KnowledgeViewHit, view_entity_from_record
+from ..profiling import current_profile
+from ..storage.cache import _MISSING, GenerationalCache, LRUCache, WorkspaceGenerations
+from ..topk import top_k as select_top_k
+from .fusion import HybridFusionStage
+
+
+# ============================================================
+# CONFIGURAZIONE
+# ============================================================
+
+@dataclass
+class SearchServiceConfig:
+    """
+    Parametri del KnowledgeSearchService.
+    """
+
+    # candidati recuperati per ogni risultato richiesto (filtri + ranking)
+    overfetch: int = 3
+
+    # cache per stage (retrieval, risultato finale); 0 = disattivata
+    cache_size: int = 1024
+    cache_ttl: Optional[float] = 30.0
+
+    # risultati stantii (dati cambiati o TTL scaduto) serviti subito
+    # e ricalcolati in background
+    stale_while_revalidate: bool = False
+
+    # query solo strutturate (senza testo): entità lette dal repository
+    structured_scan_limit: int = 10_000
+
+
+@dataclass
+class SearchPlan:
+    """
+    Come verrà eseguita una query.
+    """
+    sources: List[str] = field(default_factory=list)
+    fetch: int = 0
+    structured: bool = False         # nessun testo: scansione del repository
+    filters: List[KnowledgeFilter] = field(default_factory=list)
+    prefilter: bool = False          # filtri risolti sugli indici prima del retrieval
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "sources": list(self.sources),
+            "fetch": self.fetch,
+            "structured": self.structured,
+            "filters": len(self.filters),
+            "prefilter": self.prefilter,
+        }
+
+
+# ============================================================
+# SERVICE
+# ============================================================
+
+class KnowledgeSearchService:
+    """
+    Implementazione di riferimento del search service di RAGPipeline.
+
+    Per ogni KnowledgeSearchQuery:
+    1. pianifica: vector e/o keyword secondo i flag e i backend
+       disponibili; senza testo, scansione strutturata del repository
+    2. recupera top_k * overfetch candidati (fusione se più sorgenti)
+    3. applica i filtri: con un FilterIndex vengono risolti prima
+       (insieme di id ammessi passato ai retriever), altrimenti
+       valutati sui candidati
+    4. ordina con lo scoring cognitivo (score_entity, compilato per
+       workspace) e spiega solo i top_k
+
+    I backend sono oggetti con l'interfaccia Retriever
+    (`name`, `retrieve(workspace_id, text, limit)`).
+
+    Retrieval e risultato finale hanno ciascuno una cache; il risultato
+    è indicizzato per `query.fingerprint()`. Entrambe sono legate alla
+    generazione dei dati del workspace (WorkspaceGenerations): ogni
+    scrittura va segnalata con `invalidate(workspace_id)` o con gli hook
+    `on_save` / `on_delete`, oppure condividendo `generations` con
+    RAGStorageAdapter.
+    """
+
+    def __init__(
+        self,
+        *,
+        vector: Any = None,
+        keyword: Any = None,
+        repository: Any = None,
+        filter_index: Optional[FilterIndex] = None,
+        scorers: Optional[WorkspaceScorers] = None,
+        config: Optional[SearchServiceConfig] = None,
+        generations: Optional[WorkspaceGenerations] = None,
+    ) -> None:
+        self.vector = vector
+        self.keyword = keyword
+        self.repository = repository
+        self.filter_index = filter_index
+        self.scorers = scorers or WorkspaceScorers()
+        self.config = config or SearchServiceConfig()
+        self.generations = generations or WorkspaceGenerations()
+
+        retrievers = [r for r in (vector, keyword) if r is not None]
+        self._fusion = HybridFusionStage(retrievers) if len(retrievers) > 1 else None
+
+        cfg = self.config
+        self._caches: Dict[str, LRUCache] = {}
+        self._results: Optional[GenerationalCache] = None
+        if cfg.cache_size > 0:
+            self._caches = {"retrieve": LRUCache(cfg.cache_size, ttl=cfg.cache_ttl)}
+            self._results = GenerationalCache(
+                cfg.cache_size,
+                generations=self.generations,
+                ttl=cfg.cache_ttl,
+            )
+
+        self._refresh_lock = threading.Lock()
+        self._refreshing: set = set()
+        self._refresher: Optional[ThreadPoolExecutor] = None
+
+    def close(self) -> None:
+        if self._fusion is not None:
+            self._fusion.close()
+        if self._refresher is not None:
+            self._refresher.shutdown(wait=True)
+
+    # ----------------------------------------------------------
+    # PIANIFICAZIONE
+    # ----------------------------------------------------------
+
+    def plan(self, query: KnowledgeSearchQuery) -> SearchPlan:
+        plan = SearchPlan(filters=list(query.filters))
+        plan.prefilter = bool(query.filters) and self.filter_index is not None
+        fetch = query.top_k * max(self.config.overfetch, 1)
+
+        if not (query.text and query.text.strip()):
+            plan.structured = self.repository is not None and bool(query.filters)
+            plan.fetch = self.config.structured_scan_limit if plan.structured else 0
+            return plan
+
+        if query.use_vector and self.vector is not None:
+            plan.sources.append(self.vector.name)
+        if query.use_keyword and self.keyword is not None:
+            plan.sources.append(self.keyword.name)
+        plan.fetch = fetch if plan.sources else 0
+        return plan
+
+    # ----------------------------------------------------------
+    # RICERCA
+    # ----------------------------------------------------------
+
+    def search(self, query: KnowledgeSearchQuery) -> KnowledgeSearchResult:
+        started = time.perf_counter()
+        plan = self.plan(query)
+        fingerprint = query.fingerprint()
+
+        if self._results is not None:
+            cached, fresh = self._results.get(
+                query.workspace_id,
+                fingerprint,
+                allow_stale=self.config.stale_while_revalidate,
+            )
+            current_profile().record(
+                "search.result_cache",
+                cache="miss" if cached is _MISSING else "hit" if fresh else "stale",
+            )
+            if cached is not _MISSING:
+                if not fresh:
+                    self._revalidate(query, plan, fingerprint)
+                result = self._result(query, list(cached), plan)
+                result.debug["cache"] = "result" if fresh else "stale"
+                result.debug["fingerprint"] = fingerprint
+                result.debug["elapsed_ms"] = (time.perf_counter() - started) * 1000.0
+                return result
+
+        generation = self.generations.current(query.workspace_id)
+        hits, warnings, debug = self._execute(query, plan)
+        if self._results is not None:
+            self._results.put(query.workspace_id, fingerprint, tuple(hits), generation=generation)
+
+        result = self._result(query, list(hits), plan)
+        result.warnings.extend(warnings)
+        result.debug.update(debug)
+        if not plan.sources and not plan.structured:
+            result.warnings.append("No retrieval source available for this query")
+        result.debug["fingerprint"] = fingerprint
+        result.debug["elapsed_ms"] = (time.perf_counter() - started) * 1000.0
+        return result
+
+    def _execute(
+        self,
+        query: KnowledgeSearchQuery,
+        plan: SearchPlan,
+    ) -> Tuple[List[KnowledgeViewHit], List[str], Dict[str, Any]]:
+        """
+        Esecuzione non in cache: pre-filtro, retrieval, filtri, ranking.
+        """
+        timings: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        warnings: List[str] = []
+        debug: Dict[str, Any] = {}
+
+        allowed: Optional[Collection[str]] = None
+        if plan.prefilter:
+            t0 = time.perf_counter()
+            filter_plan = self.filter_index.compile(query.workspace_id, plan.filters)
+            allowed = filter_plan.candidate_ids()
+            timings["prefilter"] = time.perf_counter() - t0
+            counts["prefilter"] = len(allowed)
+            debug["filter_plan"] = filter_plan.explain()
+            debug["allowed"] = len(allowed)
+
+        t0 = time.perf_counter()
+        candidates = self._retrieve(query, plan, warnings, allowed)
+        timings["retrieve"] = time.perf_counter() - t0
+        counts["retrieve"] = len(candidates)
+
+        if plan.filters and not plan.prefilter and not plan.structured:
+            t0 = time.perf_counter()
+            candidates = [h for h in candidates if _matches_all(h.entity, plan.filters)]
+            timings["filter"] = time.perf_counter() - t0
+            counts["filter"] = len(candidates)
+
+        t0 = time.perf_counter()
+        hits = self._rank(query, candidates)
+        timings["rank"] = time.perf_counter() - t0
+        counts["rank"] = len(hits)
+
+        debug["candidates"] = len(candidates)
+        debug["stages_ms"] = {name: t * 1000.0 for name, t in timings.items()}
+
+        prof = current_profile()
+        if prof.enabled:
+            for name, t in timings.items():
+                prof.record(f"search.{name}", elapsed_ms=t * 1000.0, count=counts.get(name))
+        return hits, warnings, debug
+
+    def _revalidate(self, query: KnowledgeSearchQuery, plan: SearchPlan, fingerprint: str) -> None:
+        """
+        Ricalcola in background un risultato stantio (uno per fingerprint).
+        """
+        key = (query.workspace_id, fingerprint)
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix="search-revalidate",
+                )
+
+        def refresh() -> None:
+            try:
+                generation = self.generations.current(query.workspace_id)
+                hits, _, _ = self._execute(query, plan)
+                self._results.put(query.workspace_id, fingerprint, tuple(hits), generation=generation)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        self._refresher.submit(refresh)
+
+    # ----------------------------------------------------------
+    # STAGE
+    # ----------------------------------------------------------
+
+    def _retrieve(
+        self,
+        query: KnowledgeSearchQuery,
+        plan: SearchPlan,
+        warnings: List[str],
+        allowed: Optional[Collection[str]],
+    ) -> List[KnowledgeViewHit]:
+        if plan.structured:
+            return self._scan(query, plan, allowed)
+        if not plan.sources or (allowed is not None and not allowed):
+            return []
+
+        key = ("retrieve", query.workspace_id, self.generations.current(query.workspace_id),
+               query.text, tuple(plan.sources), plan.fetch, _ranking_key(query.ranking),
+               _filters_key(plan.filters) if plan.prefilter else ())
+        cached = self._cache_get("retrieve", key)
+        current_profile().record("search.retrieve_cache", cache="miss" if cached is _MISSING else "hit")
+        if cached is not _MISSING:
+            return list(cached)
+
+        if len(plan.sources) > 1 and self._fusion is not None:
+            fused = self._fusion.fuse(
+                query.workspace_id,
+                query.text,
+                plan.fetch,
+                ranking=query.ranking,
+                sources=plan.sources,
+                allowed=allowed,
+            )
+            warnings.extend(fused.warnings)
+            hits = fused.hits
+        else:
+            retriever = self.vector if plan.sources[0] == getattr(self.vector, "name", None) else self.keyword
+            options = {"allowed": allowed} if allowed is not None else {}
+            try:
+                hits = retriever.retrieve(query.workspace_id, query.text, plan.fetch, **options)
+            except Exception as exc:
+                warnings.append(f"{retriever.name} retriever failed: {exc}")
+                return []
+
+        self._cache_put("retrieve", key, hits)
+        return list(hits)
+
+    def _scan(
+        self,
+        query: KnowledgeSearchQuery,
+        plan: SearchPlan,
+        allowed: Optional[Collection[str]],
+    ) -> List[KnowledgeViewHit]:
+        if allowed is not None:
+            hits = []
+            for entity_id in list(allowed)[: plan.fetch]:
+                record = self.repository.get_entity(entity_id)
+                if record is not None:
+                    entity = view_entity_from_record(record, relevance_score=record.relevance)
+                    hits.append(KnowledgeViewHit(entity=entity, score=record.relevance, source="keyword"))
+            return hits
+
+        kind = next(
+            (f.value for f in plan.filters if f.field == "entity_type" and f.op == "eq"),
+            None,
+        )
+        records = self.repository.list_entities(query.workspace_id, kind=kind, limit=plan.fetch)
+
+        hits = []
+        for record in records:
+            entity = view_entity_from_record(record, relevance_score=record.relevance)
+            if _matches_all(entity, plan.filters):
+                hits.append(KnowledgeViewHit(entity=entity, score=record.relevance, source="keyword"))
+        return hits
+
+    def _rank(
+        self,
+        query: KnowledgeSearchQuery,
+        candidates: List[KnowledgeViewHit],
+    ) -> List[KnowledgeViewHit]:
+        scorer: CompiledScorer = self.scorers.get(query.workspace_id)
+
+        scored = [
+            (scorer.score(h.entity.entity_type, h.score, h.entity.confidence_score), h)
+            for h in candidates
+        ]
+        best = select_top_k(scored, query.top_k, key=lambda pair: pair[0])
+
+        hits = []
+        for score, h in best:
+            explained = scorer.score_entity(
+                entity_type=h.entity.entity_type,
+                base_relevance=h.score,
+                confidence=h.entity.confidence_score,
+            )
+            hits.append(
+                KnowledgeViewHit(
+                    entity=h.entity,
+                    score=score,
+                    source=h.source,
+                    explanation=explained.explanation,
+                    metadata={**h.metadata, "retrieval_score": h.score},
+                )
+            )
+        return hits
+
+    def _result(
+        self,
+        query: KnowledgeSearchQuery,
+        hits: List[KnowledgeViewHit],
+        plan: SearchPlan,
+    ) -> KnowledgeSearchResult:
+        result = KnowledgeSearchResult(hits=hits, query=query)
+        result.debug["plan"] = plan.describe()
+        return result
+
+    # ----------------------------------------------------------
+    # CACHE
+    # ----------------------------------------------------------
+
+    def invalidate(self, workspace_id: Optional[str] = None) -> None:
+        """
+        Segnala che la conoscenza di un workspace (o di tutti) è cambiata.
+
+        I valori in cache non vengono rimossi: diventano stantii.
+        """
+        if workspace_id is None:
+            self.generations.bump_all()
+        else:
+            self.generations.bump(workspace_id)
+
+    def on_save(self, record: Any) -> None:
+        self.invalidate(record.workspace_id)
+
+    def on_delete(self, entity_id: str, workspace_id: Optional[str] = None) -> None:
+        self.invalidate(workspace_id)
+
+    def clear_cache(self) -> None:
+        for cache in self._caches.values():
+            cache.clear()
+        if self._results is not None:
+            self._results.clear()
+
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {name: cache.stats.as_dict() for name, cache in self._caches.items()}
+        if self._results is not None:
+            stats["result"] = self._results.stats.as_dict()
+        return stats
+
+    def _cache_get(self, stage: str, key: Hashable) -> Any:
+        cache = self._caches.get(stage)
+        if cache is None:
+            return _MISSING
+        value = cache.get(key)
+        cache.record(hit=value is not _MISSING)
+        return value
+
+    def _cache_put(self, stage: str, key: Hashable, value: List[KnowledgeViewHit]) -> None:
+        cache = self._caches.get(stage)
+        if cache is not None:
+            cache.put(key, tuple(value))
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def _ranking_key(ranking: Optional[RankingConfig]) -> Tuple[Any, ...]:
+    if ranking is None:
+        return ()
+    return (
+        ranking.fusion,
+        ranking.rrf_k,
+        tuple(sorted(ranking.weights.items())),
+        ranking.overfetch,
+        ranking.max_fetch,
+        ranking.min_score,
+    )
+
+
+def _filters_key(filters: Sequence[KnowledgeFilter]) -> Tuple[Any, ...]:
+    return tuple((f.field, f.op, repr(f.value)) for f in filters)
+
+
+def _field_value(entity: Any, name: str) -> Any:
+    if name in ("entity_type", "entity_id", "name", "description", "confidence_score", "relevance_score"):
+        return getattr(entity, name, None)
+    if name.startswith("metadata."):
+        return entity.metadata.get(name[len("metadata."):])
+    if name.startswith("properties."):
+        return entity.properties.get(name[len("properties."):])
+    if name in entity.metadata:
+        return entity.metadata[name]
+    return entity.properties.get(name)
+
+
+def _matches(entity: Any, f: KnowledgeFilter) -> bool:
+    value = _field_value(entity, f.field)
+    op = f.op
+    try:
+        if op == "eq":
+            return value == f.value or (isinstance(value, (list, tuple, set)) and f.value in value)
+        if op == "ne":
+            return not (value == f.value or (isinstance(value, (list, tuple, set)) and f.value in value))
+        if op == "in":
+            if isinstance(value, (list, tuple, set)):
+                return any(v in f.value for v in value)
+            return value in f.value
+        if op == "lt":
+            return value is not None and value < f.value
+        if op == "gt":
+            return value is not None and value > f.value
+        if op == "contains":
+            return value is not None and f.value in value
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported filter operator: {op!r}")
+
+
+def _matches_all(entity: Any, filters: Sequence[KnowledgeFilter]) -> bool:
+    return all(_matches(entity, f) for f in filters)
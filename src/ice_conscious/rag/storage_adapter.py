@@ -1,14 +1,128 @@
 from __future__ import annotations
 
 import json
+import math
+import struct
+import functools
+import itertools
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import (
+    Any,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 from ice_conscious.embeddings.adapter import UnifiedEmbeddingAdapter
+from ice_conscious.embeddings.models import semantic_hash
+from ice_conscious.knowledge.filters import FilterIndex
+from ice_conscious.knowledge.keyword_index import KeywordIndex
+from ice_conscious.profiling import current_profile
+from ice_conscious.rag.chunking import ChunkingConfig, StreamingChunker, chunk_document, derived_doc_id
+from ice_conscious.rag.ingestion import DirectoryIngestReport, ingest_directory
+from ice_conscious.storage.cache import WorkspaceGenerations
+from ice_conscious.topk import top_k as select_top_k
 from ice_engine.storage.backends.vector.base import VectorBackend
 from ice_engine.storage.base import StorageBackend
 
 
+class _Match(NamedTuple):
+    id: str
+    score: float
+    distance: Optional[float] = None
+
+
+class _StoredEmbedding(NamedTuple):
+    vector: List[float]
+    dim: int
+
+
+# documento da ingerire: (doc_id, text) oppure (doc_id, text, metadata)
+IngestDoc = Sequence[Any]
+
+
+@dataclass
+class IngestReport:
+    """
+    Esito di `ingest_many`: documenti ingeriti e fallimenti per documento.
+
+    - skipped: documenti invariati (stesso hash), nessuna scrittura
+    - deduplicated: embedding riusato da un altro documento identico
+    """
+    ingested: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)   # doc_id -> errore
+    skipped: int = 0
+    deduplicated: int = 0
+    batches: int = 0
+    elapsed_ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+@dataclass
+class _Pending:
+    doc_id: str
+    text: str
+    metadata: Dict[str, Any]
+    embedding: Any = None
+    content_hash: str = ""
+
+
+class LazyMetadata(MutableMapping):
+    """
+    Metadata di un documento idratato, decodificati dal JSON
+    solo al primo accesso.
+
+    Si comporta come un dict ma NON è un dict: `json.dumps` lo
+    rifiuta e `default=str` lo serializzerebbe come stringa.
+    Restituito solo con `lazy_metadata=True`; `dict(m)` lo materializza.
+    """
+
+    __slots__ = ("_raw", "_data")
+
+    def __init__(self, raw: Optional[str]) -> None:
+        self._raw = raw
+        self._data: Optional[Dict[str, Any]] = None
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = json.loads(self._raw or "{}")
+            self._raw = None
+        return self._data
+
+    def __getitem__(self, key: str) -> Any:
+        return self.data[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.data[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        del self.data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        return f"LazyMetadata({self.data!r})"
+
+
 class RAGStorageAdapter:
     """
     Adapter di storage per il dominio RAG (ice_conscious).
@@ -20,6 +134,41 @@ class RAGStorageAdapter:
     - retrieval raw (NO ranking, NO intent, NO scoring)
 
     Non prende decisioni semantiche.
+
+    Dal backend relazionale usa `fetch_one`, `execute` e `commit`
+    (contratto StorageBackend). `fetch_all` ed `executemany` sono
+    opzionali: senza `fetch_all` le righe vengono lette dal cursore
+    restituito da `execute`, senza `executemany` si scrive riga per riga.
+    """
+
+    # parametri per statement (limite SQLite: 999)
+    MAX_SQL_PARAMS = 900
+
+    # pre-filtro: sotto questa soglia di id ammessi lo score è esatto
+    # sui vettori salvati, sopra si filtra l'output del vector backend
+    EXACT_PREFILTER_LIMIT = 2048
+    PREFILTER_OVERFETCH = 4
+
+    # micro-batch di ingest_many: chiuso al primo limite raggiunto
+    INGEST_BATCH_SIZE = 64
+    INGEST_BATCH_CHARS = 200_000
+
+    # embedding per hash ricordati durante un ingest_many
+    INGEST_DEDUP_MEMORY = 10_000
+
+    _INSERT = """
+        INSERT OR REPLACE INTO knowledge_embeddings (
+            embedding_id,
+            workspace_id,
+            content_type,
+            content_text,
+            embedding_vector,
+            embedding_dimensions,
+            content_metadata,
+            content_hash,
+            embedding_model
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     """
 
     def __init__(
@@ -28,11 +177,43 @@ class RAGStorageAdapter:
         embeddings: UnifiedEmbeddingAdapter,
         vector_backend: Optional[VectorBackend] = None,
         workspace_id: str = "default",
+        keyword_index: Optional[KeywordIndex] = None,
+        filter_index: Optional[FilterIndex] = None,
+        generations: Optional[WorkspaceGenerations] = None,
+        chunking: Optional[ChunkingConfig] = None,
     ):
         self.rel = relational_backend
         self.vec = vector_backend
         self.embed = embeddings
         self.workspace_id = workspace_id
+        self.keywords = keyword_index
+        self.filters = filter_index
+        self.generations = generations
+        self.chunker = StreamingChunker(chunking)
+
+        self._batch_depth = 0
+        self._content_columns = False
+
+    # ------------------------------------------------------------------
+    # GROUP COMMIT
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def batch(self) -> Iterator["RAGStorageAdapter"]:
+        """
+        Raggruppa le scritture relazionali in un solo commit.
+
+        Dentro il blocco ingest/delete non eseguono commit per riga;
+        il commit avviene all'uscita del blocco più esterno, anche
+        in caso di errore, come accadrebbe con i commit per riga
+        (il vector backend è già stato aggiornato).
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            self._commit()
 
     # ------------------------------------------------------------------
     # INGEST
@@ -47,14 +228,23 @@ class RAGStorageAdapter:
         """
         Indicizza un documento testuale.
 
-        - calcola embedding
+        - calcola embedding (riusato se il contenuto è già presente)
         - salva su relational
         - salva su vector backend (se presente)
+        - indicizza per keyword (se presente)
+        - invalida le cache legate al workspace (se presente)
+
+        Un documento invariato (stesso hash e metadata) non viene riscritto.
         """
         metadata = metadata or {}
         metadata["workspace_id"] = self.workspace_id
 
-        embedding = self.embed.embed_one(text)
+        self._ensure_content_columns()
+        doc = _Pending(doc_id, text, metadata)
+        if not self._prepare([doc], {}, IngestReport()):
+            return
+
+        embedding = doc.embedding or self.embed.embed_one(text)
 
         self._store_relational(
             doc_id=doc_id,
@@ -62,6 +252,7 @@ class RAGStorageAdapter:
             embedding=embedding.vector,
             dim=embedding.dim,
             metadata=metadata,
+            content_hash=doc.content_hash,
         )
 
         if self.vec:
@@ -72,18 +263,157 @@ class RAGStorageAdapter:
                 metadata=metadata,
             )
 
+        self._index_document(doc_id, text, metadata)
+
+        if self.generations is not None:
+            self.generations.bump(self.workspace_id)
+
+    def ingest_many(
+        self,
+        docs: Iterable[IngestDoc],
+        *,
+        batch_size: Optional[int] = None,
+    ) -> IngestReport:
+        """
+        Ingest bulk: stesso risultato di `ingest_text` per ogni documento.
+
+        - embedding con `embed_many` a micro-batch (INGEST_BATCH_SIZE
+          documenti o INGEST_BATCH_CHARS caratteri)
+        - righe relazionali con `executemany`, un solo commit finale
+        - vector backend: `add_embeddings` bulk se disponibile
+        - pipeline: l'embedding del batch successivo e la scrittura
+          vettoriale del precedente girano mentre si scrive il corrente
+
+        Hash del contenuto (`semantic_hash`) per documento, valido solo
+        per lo stesso modello di embedding (`embeddings.model_name`):
+        - stesso doc_id, hash, modello e metadata: saltato (`skipped`)
+        - stesso hash e modello, metadata diversi: riga e vettore
+          riscritti con i nuovi metadata, senza ricalcolare l'embedding
+        - hash già presente nel workspace (o nella run) sotto un altro
+          doc_id, con lo stesso modello: embedding riusato (`deduplicated`)
+
+        Cambiando modello i documenti vengono ricalcolati alla prima
+        re-ingestione, anche se il contenuto è invariato.
+
+        Un documento che fallisce (embedding, riga, vettore) finisce in
+        `IngestReport.failed` senza fermare gli altri. Con un errore
+        sul solo vector backend la riga relazionale resta scritta.
+        """
+        started = time.perf_counter()
+        report = IngestReport()
+        batches = self._ingest_batches(docs, batch_size or self.INGEST_BATCH_SIZE, report)
+        recent: Dict[str, Any] = {}   # hash -> embedding calcolato in questa run
+
+        self._ensure_content_columns()
+
+        def submit(batch: Optional[List[_Pending]]) -> Optional[Future]:
+            if batch is None:
+                return None
+            return pool.submit(self._embed_batch, self._prepare(batch, recent, report))
+
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="rag-ingest") as pool, self.batch():
+            embedding = submit(next(batches, None))
+            vector: Optional[Future] = None
+
+            while embedding is not None:
+                embedded, failed, shared = embedding.result()
+                report.failed.update(failed)
+                report.deduplicated += shared
+                report.batches += 1
+
+                if len(recent) > self.INGEST_DEDUP_MEMORY:
+                    recent.clear()
+                for doc in embedded:
+                    recent[doc.content_hash] = doc.embedding
+
+                embedding = submit(next(batches, None))
+
+                stored = self._store_relational_many(embedded, report)
+
+                if vector is not None:
+                    report.failed.update(vector.result())
+                vector = pool.submit(self._store_vectors, stored) if self.vec and stored else None
+
+                for doc in stored:
+                    self._index_document(doc.doc_id, doc.text, doc.metadata)
+                report.ingested.extend(doc.doc_id for doc in stored)
+
+            if vector is not None:
+                report.failed.update(vector.result())
+
+        if report.failed:
+            report.ingested = [d for d in report.ingested if d not in report.failed]
+        if report.ingested and self.generations is not None:
+            self.generations.bump(self.workspace_id)
+
+        report.elapsed_ms = (time.perf_counter() - started) * 1000.0
+        return report
+
+    def ingest_directory(
+        self,
+        root: Path,
+        patterns: Sequence[str] = ("**/*",),
+        *,
+        workers: int = 4,
+        **options: Any,
+    ) -> DirectoryIngestReport:
+        """
+        Ingest parallelo di una directory (lettura in thread pool,
+        preprocess opzionale in process pool, `ingest_many` a checkpoint,
+        code limitate, resume con `state_path`).
+
+        Senza `preprocess` i file vengono divisi in chunk con la
+        configurazione dell'adapter (come `ingest_file`).
+
+        Opzioni: vedi `ice_conscious.rag.ingestion.ingest_directory`.
+        """
+        options.setdefault("preprocess", functools.partial(chunk_document, config=self.chunker.config))
+        return ingest_directory(self, root, patterns, workers=workers, **options)
+
     def ingest_file(
         self,
         path: Path,
         metadata: Optional[Dict[str, Any]] = None,
     ) -> str:
-        text = path.read_text(errors="ignore")
+        """
+        Indicizza un file, letto in streaming e diviso in chunk
+        (memoria costante rispetto alla dimensione del file).
+
+        - un file che sta in un solo chunk: un documento con doc_id = path
+        - altrimenti un documento per chunk, doc_id "<path>#<n>", con
+          parent_id, chunk_index e posizione (caratteri, righe) nei metadata
+
+        I chunk di una versione precedente non più prodotti vengono
+        rimossi. Ritorna il doc_id del file (padre).
+        """
         doc_id = path.as_posix()
 
         meta = metadata or {}
         meta["path"] = doc_id
 
-        self.ingest_text(doc_id, text, meta)
+        chunks = self.chunker.chunk_file(path)
+        head = list(itertools.islice(chunks, 2))
+        if len(head) < 2:
+            self.ingest_text(doc_id, head[0].text if head else "", meta)
+            self.prune_file(doc_id, {doc_id})
+            return doc_id
+
+        keep = set()
+
+        def documents() -> Iterator[IngestDoc]:
+            for chunk in itertools.chain(head, chunks):
+                chunk_id = derived_doc_id(doc_id, chunk.index)
+                keep.add(chunk_id)
+                yield chunk_id, chunk.text, {**meta, **chunk.metadata(doc_id)}
+
+        report = self.ingest_many(documents())
+        self.prune_file(doc_id, keep)
+
+        if report.failed:
+            failed_id, error = next(iter(report.failed.items()))
+            raise RuntimeError(
+                f"Failed to ingest {len(report.failed)} chunk(s) of {doc_id}: {failed_id}: {error}"
+            )
         return doc_id
 
     # ------------------------------------------------------------------
@@ -94,25 +424,87 @@ class RAGStorageAdapter:
         self,
         query: str,
         top_k: int = 5,
+        *,
+        allowed_ids: Optional[Collection[str]] = None,
+        include_text: bool = True,
+        lazy_metadata: bool = False,
     ) -> List[Dict[str, Any]]:
         """
         Ricerca per similarità vettoriale.
 
-        Ritorna documenti grezzi.
+        Con `allowed_ids` (pre-filtro, es. da un FilterPlan):
+        - pochi id: similarità coseno esatta sui vettori salvati
+        - molti id: risultati del vector backend filtrati (over-fetch)
+
+        Ritorna documenti grezzi, metadata come dict (con
+        `lazy_metadata=True`: LazyMetadata, decodificati al primo accesso;
+        con `include_text=False` il testo non viene letto: text=None).
         Nessun ranking cognitivo.
+
+        Con un profilo attivo (`ice_conscious.profiling`) registra
+        gli stage vector.embed / vector.search / vector.hydrate.
         """
-        if not self.vec:
+        if allowed_ids is not None and not allowed_ids:
             return []
 
-        q = self.embed.embed_one(query)
+        exact = allowed_ids is not None and len(allowed_ids) <= self.EXACT_PREFILTER_LIMIT
+        if not self.vec and not exact:
+            return []
 
-        results = self.vec.search_similar(
-            q.vector,
-            top_k=top_k,
-            filter_metadata={"workspace_id": self.workspace_id},
-        )
+        prof = current_profile()
+
+        with prof.stage("vector.embed"):
+            q = self.embed.embed_one(query)
+
+        with prof.stage("vector.search") as stage:
+            if exact:
+                results = self._exact_search(q.vector, allowed_ids, top_k)
+            else:
+                fetch = top_k if allowed_ids is None else top_k * self.PREFILTER_OVERFETCH
+                results = self.vec.search_similar(
+                    q.vector,
+                    top_k=fetch,
+                    filter_metadata={"workspace_id": self.workspace_id},
+                )
+                if allowed_ids is not None:
+                    results = [r for r in results if r.id in allowed_ids][:top_k]
+            stage.note(
+                count=len(results),
+                mode="exact" if exact else "ann",
+                allowed=None if allowed_ids is None else len(allowed_ids),
+            )
 
-        return self._hydrate_results(results)
+        with prof.stage("vector.hydrate") as stage:
+            hydrated = self._hydrate_results(
+                results,
+                include_text=include_text,
+                lazy_metadata=lazy_metadata,
+            )
+            stage.note(count=len(hydrated))
+        return hydrated
+
+    def keyword_search(
+        self,
+        query: str,
+        top_k: int = 5,
+        *,
+        include_text: bool = True,
+        lazy_metadata: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Ricerca BM25 sui testi ingeriti.
+
+        Nessun embedding calcolato. Ritorna documenti grezzi
+        (come similarity_search, con distance=None).
+        """
+        if self.keywords is None:
+            return []
+
+        return self._hydrate_results(
+            self.keywords.search(self.workspace_id, query, top_k),
+            include_text=include_text,
+            lazy_metadata=lazy_metadata,
+        )
 
     def fetch_by_id(self, doc_id: str) -> Optional[Dict[str, Any]]:
         row = self.rel.fetch_one(
@@ -141,12 +533,20 @@ class RAGStorageAdapter:
             "DELETE FROM knowledge_embeddings WHERE embedding_id = ?",
             (doc_id,),
         )
-        if hasattr(self.rel, "commit"):
-            self.rel.commit()
+        self._commit()
 
         if self.vec:
             self.vec.delete(doc_id)
 
+        if self.keywords is not None:
+            self.keywords.delete_text(self.workspace_id, doc_id)
+
+        if self.filters is not None:
+            self.filters.remove_document(self.workspace_id, doc_id)
+
+        if self.generations is not None:
+            self.generations.bump(self.workspace_id)
+
     # ------------------------------------------------------------------
     # INTERNAL
     # ------------------------------------------------------------------
@@ -158,47 +558,366 @@ class RAGStorageAdapter:
         embedding: List[float],
         dim: int,
         metadata: Dict[str, Any],
+        content_hash: Optional[str] = None,
     ) -> None:
+        self.rel.execute(self._INSERT, self._row(doc_id, text, embedding, dim, metadata, content_hash))
+
+        self._commit()
+
+    def _row(
+        self,
+        doc_id: str,
+        text: str,
+        embedding: List[float],
+        dim: int,
+        metadata: Dict[str, Any],
+        content_hash: Optional[str] = None,
+    ) -> Tuple[Any, ...]:
+        return (
+            doc_id,
+            self.workspace_id,
+            metadata.get("content_type", "text"),
+            text,
+            self._pack_vector(embedding),
+            dim,
+            json.dumps(metadata),
+            content_hash,
+            self._model_name(),
+        )
+
+    def _model_name(self) -> Optional[str]:
+        return getattr(self.embed, "model_name", None)
+
+    def _index_document(
+        self,
+        doc_id: str,
+        text: str,
+        metadata: Dict[str, Any],
+        *,
+        if_missing: bool = False,
+    ) -> None:
+        """
+        Aggiorna gli indici in memoria; con `if_missing` solo se il
+        documento non c'è (es. invariato, ma indici ricostruiti da zero).
+        """
+        if self.keywords is not None:
+            if not (if_missing and doc_id in self.keywords.index(self.workspace_id)):
+                self.keywords.add_text(self.workspace_id, doc_id, text)
+
+        if self.filters is not None:
+            if not (if_missing and doc_id in self.filters.index(self.workspace_id)):
+                self.filters.add_document(self.workspace_id, doc_id, metadata)
+
+    # ------------------------------------------------------------------
+    # HASH DEL CONTENUTO
+    # ------------------------------------------------------------------
+
+    def _ensure_content_columns(self) -> None:
+        """
+        Aggiunge `content_hash` (e il suo indice) ed `embedding_model`
+        a knowledge_embeddings se lo schema non li prevede ancora.
+        """
+        if self._content_columns:
+            return
+        columns = {row["name"] for row in self._fetch_all("PRAGMA table_info(knowledge_embeddings)")}
+        if "content_hash" not in columns:
+            self.rel.execute("ALTER TABLE knowledge_embeddings ADD COLUMN content_hash TEXT")
+        if "embedding_model" not in columns:
+            self.rel.execute("ALTER TABLE knowledge_embeddings ADD COLUMN embedding_model TEXT")
         self.rel.execute(
-            """
-            INSERT OR REPLACE INTO knowledge_embeddings (
-                embedding_id,
-                workspace_id,
-                content_type,
-                content_text,
-                embedding_vector,
-                embedding_dimensions,
-                content_metadata
+            "CREATE INDEX IF NOT EXISTS idx_knowledge_embeddings_content_hash "
+            "ON knowledge_embeddings (workspace_id, content_hash)"
+        )
+        self._content_columns = True
+
+    def _prepare(
+        self,
+        batch: List[_Pending],
+        recent: Dict[str, Any],
+        report: IngestReport,
+    ) -> List[_Pending]:
+        """
+        Calcola gli hash e risolve cosa scrivere: ritorna i documenti da
+        scrivere, con l'embedding già assegnato se riusabile.
+
+        Un embedding è riusabile solo se calcolato dal modello corrente.
+        """
+        model = self._model_name()
+        for doc in batch:
+            doc.content_hash = semantic_hash(doc.text)
+
+        existing = {
+            row["embedding_id"]: row
+            for row in self._fetch_in(
+                """
+                SELECT embedding_id, content_hash, embedding_model, content_metadata,
+                       embedding_vector, embedding_dimensions
+                FROM knowledge_embeddings
+                WHERE workspace_id = ? AND embedding_id IN ({placeholders})
+                """,
+                [doc.doc_id for doc in batch],
+                (self.workspace_id,),
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+        }
+
+        todo = []
+        for doc in batch:
+            row = existing.get(doc.doc_id)
+            if row is not None and row["content_hash"] == doc.content_hash and row["embedding_model"] == model:
+                if json.loads(row["content_metadata"] or "{}") == doc.metadata:
+                    report.skipped += 1
+                    self._index_document(doc.doc_id, doc.text, doc.metadata, if_missing=True)
+                    continue
+                # solo metadata cambiati: stesso vettore, riscritto ovunque
+                doc.embedding = self._stored(row)
+            todo.append(doc)
+
+        missing = {doc.content_hash for doc in todo if doc.embedding is None} - recent.keys()
+        shared = {
+            row["content_hash"]: self._stored(row)
+            for row in self._fetch_in(
+                """
+                SELECT content_hash, embedding_vector, embedding_dimensions
+                FROM knowledge_embeddings
+                WHERE workspace_id = ? AND embedding_model IS ? AND content_hash IN ({placeholders})
+                """,
+                sorted(missing),
+                (self.workspace_id, model),
+            )
+        }
+
+        for doc in todo:
+            if doc.embedding is None:
+                reused = recent.get(doc.content_hash) or shared.get(doc.content_hash)
+                if reused is not None:
+                    doc.embedding = reused
+                    report.deduplicated += 1
+        return todo
+
+    def _stored(self, row: Any) -> _StoredEmbedding:
+        return _StoredEmbedding(self._unpack_vector(row["embedding_vector"]), row["embedding_dimensions"])
+
+    def _fetch_all(self, sql: str, params: Sequence[Any] = ()) -> List[Any]:
+        fetch_all = getattr(self.rel, "fetch_all", None)
+        if fetch_all is not None:
+            return fetch_all(sql, params)
+
+        cursor = self.rel.execute(sql, params)
+        if not hasattr(cursor, "fetchall"):
+            raise TypeError("Relational backend needs fetch_all or an execute() returning a cursor")
+        return cursor.fetchall()
+
+    def _fetch_in(self, sql: str, values: Sequence[Any], params: Tuple[Any, ...] = ()) -> Iterator[Any]:
+        """
+        Esegue `sql` con `{placeholders}` = lista IN, a blocchi di MAX_SQL_PARAMS.
+        """
+        step = self.MAX_SQL_PARAMS - len(params)
+        for start in range(0, len(values), step):
+            chunk = values[start:start + step]
+            yield from self._fetch_all(
+                sql.format(placeholders=",".join("?" * len(chunk))),
+                (*params, *chunk),
+            )
+
+    def prune_file(self, parent_id: str, keep: Collection[str]) -> int:
+        """
+        Rimuove i documenti di una versione precedente di un file:
+        il documento `parent_id` e i suoi chunk "<parent_id>#<n>"
+        non presenti in `keep` (gli id appena ingeriti).
+
+        Ritorna il numero di documenti rimossi.
+        """
+        prefix = parent_id.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        rows = self._fetch_all(
+            """
+            SELECT embedding_id
+            FROM knowledge_embeddings
+            WHERE workspace_id = ?
+              AND (embedding_id = ? OR embedding_id LIKE ? ESCAPE '\\')
             """,
-            (
-                doc_id,
-                self.workspace_id,
-                metadata.get("content_type", "text"),
-                text,
-                self._pack_vector(embedding),
-                dim,
-                json.dumps(metadata),
-            ),
+            (self.workspace_id, parent_id, prefix + "#%"),
         )
+        stale = [
+            row["embedding_id"]
+            for row in rows
+            if row["embedding_id"] not in keep
+            and (row["embedding_id"] == parent_id or row["embedding_id"][len(parent_id) + 1:].isdigit())
+        ]
+        with self.batch():
+            for doc_id in stale:
+                self.delete(doc_id)
+        return len(stale)
+
+    # ------------------------------------------------------------------
+    # INGEST BULK (stage della pipeline)
+    # ------------------------------------------------------------------
+
+    def _ingest_batches(
+        self,
+        docs: Iterable[IngestDoc],
+        size: int,
+        report: IngestReport,
+    ) -> Iterator[List[_Pending]]:
+        batch: List[_Pending] = []
+        chars = 0
+        for doc in docs:
+            try:
+                doc_id, text, *rest = doc
+                metadata = dict(rest[0] or {}) if rest else {}
+            except (TypeError, ValueError) as exc:
+                report.failed[str(doc)[:80]] = f"invalid document: {exc}"
+                continue
+            metadata["workspace_id"] = self.workspace_id
+
+            batch.append(_Pending(doc_id, text, metadata))
+            chars += len(text)
+            if len(batch) >= size or chars >= self.INGEST_BATCH_CHARS:
+                yield batch
+                batch, chars = [], 0
+        if batch:
+            yield batch
 
-        if hasattr(self.rel, "commit"):
+    def _embed_batch(self, batch: List[_Pending]) -> Tuple[List[_Pending], Dict[str, str], int]:
+        """
+        Embedding di un micro-batch (testi identici calcolati una volta);
+        se `embed_many` fallisce si ripiega su `embed_one` per isolare
+        i documenti colpevoli.
+
+        Ritorna (documenti pronti, fallimenti, duplicati nel batch).
+        """
+        failed: Dict[str, str] = {}
+        unique: Dict[str, _Pending] = {}
+        for doc in batch:
+            if doc.embedding is None:
+                unique.setdefault(doc.content_hash, doc)
+        todo = list(unique.values())
+
+        try:
+            results = list(self.embed.embed_many([doc.text for doc in todo])) if todo else []
+            if len(results) != len(todo):
+                raise ValueError(f"embed_many returned {len(results)} results for {len(todo)} texts")
+        except Exception:
+            results = []
+            for doc in todo:
+                try:
+                    results.append(self.embed.embed_one(doc.text))
+                except Exception as exc:
+                    results.append(None)
+                    failed[doc.doc_id] = f"embedding: {exc}"
+
+        computed = {doc.content_hash: result for doc, result in zip(todo, results)}
+
+        embedded = []
+        shared = 0
+        for doc in batch:
+            if doc.embedding is None:
+                result = computed.get(doc.content_hash)
+                if result is None:
+                    failed.setdefault(doc.doc_id, failed.get(unique[doc.content_hash].doc_id, "embedding failed"))
+                    continue
+                doc.embedding = result
+                shared += unique[doc.content_hash] is not doc
+            embedded.append(doc)
+        return embedded, failed, shared
+
+    def _store_relational_many(self, batch: List[_Pending], report: IngestReport) -> List[_Pending]:
+        rows = []
+        ready = []
+        for doc in batch:
+            try:
+                rows.append(
+                    self._row(
+                        doc.doc_id,
+                        doc.text,
+                        doc.embedding.vector,
+                        doc.embedding.dim,
+                        doc.metadata,
+                        doc.content_hash,
+                    )
+                )
+                ready.append(doc)
+            except Exception as exc:
+                report.failed[doc.doc_id] = f"relational: {exc}"
+
+        try:
+            self.rel.executemany(self._INSERT, rows)
+            return ready
+        except Exception:
+            # riga per riga, per attribuire l'errore al documento
+            stored = []
+            for doc, row in zip(ready, rows):
+                try:
+                    self.rel.execute(self._INSERT, row)
+                    stored.append(doc)
+                except Exception as exc:
+                    report.failed[doc.doc_id] = f"relational: {exc}"
+            return stored
+
+    def _store_vectors(self, batch: List[_Pending]) -> Dict[str, str]:
+        items = [
+            {
+                "id": doc.doc_id,
+                "embedding": doc.embedding.vector,
+                "text": doc.text,
+                "metadata": doc.metadata,
+            }
+            for doc in batch
+        ]
+
+        add_many = getattr(self.vec, "add_embeddings", None)
+        if add_many is not None:
+            try:
+                add_many(items)
+                return {}
+            except Exception:
+                pass
+
+        failed: Dict[str, str] = {}
+        for item in items:
+            try:
+                self.vec.add_embedding(**item)
+            except Exception as exc:
+                failed[item["id"]] = f"vector: {exc}"
+        return failed
+
+    def _commit(self) -> None:
+        if self._batch_depth == 0 and hasattr(self.rel, "commit"):
             self.rel.commit()
 
-    def _hydrate_results(self, results) -> List[Dict[str, Any]]:
-        hydrated = []
+    def _hydrate_results(
+        self,
+        results,
+        *,
+        include_text: bool = True,
+        lazy_metadata: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Documenti dei risultati, nello stesso ordine.
 
-        for r in results:
-            row = self.rel.fetch_one(
-                """
-                SELECT content_text, content_metadata
+        Una query `IN (...)` per blocco di MAX_SQL_PARAMS id invece di
+        una per risultato; gli id senza riga vengono saltati.
+        """
+        results = list(results)
+        ids = list(dict.fromkeys(r.id for r in results))
+        decode = LazyMetadata if lazy_metadata else (lambda raw: json.loads(raw or "{}"))
+        columns = "embedding_id, content_metadata" + (", content_text" if include_text else "")
+
+        rows = {
+            row["embedding_id"]: row
+            for row in self._fetch_in(
+                f"""
+                SELECT {columns}
                 FROM knowledge_embeddings
-                WHERE embedding_id = ?
+                WHERE embedding_id IN ({{placeholders}})
                 """,
-                (r.id,),
+                ids,
             )
-            if not row:
+        }
+
+        hydrated = []
+        for r in results:
+            row = rows.get(r.id)
+            if row is None:
                 continue
 
             hydrated.append(
@@ -206,14 +925,44 @@ class RAGStorageAdapter:
                     "doc_id": r.id,
                     "score": r.score,
                     "distance": getattr(r, "distance", None),
-                    "text": row["content_text"],
-                    "metadata": json.loads(row["content_metadata"] or "{}"),
+                    "text": row["content_text"] if include_text else None,
+                    "metadata": decode(row["content_metadata"]),
                 }
             )
 
         return hydrated
 
+    def _exact_search(
+        self,
+        vector: List[float],
+        allowed_ids: Collection[str],
+        top_k: int,
+    ) -> List[_Match]:
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+
+        matches = []
+        for row in self._fetch_in(
+            """
+            SELECT embedding_id, embedding_vector
+            FROM knowledge_embeddings
+            WHERE workspace_id = ?
+              AND embedding_id IN ({placeholders})
+            """,
+            list(allowed_ids),
+            (self.workspace_id,),
+        ):
+            stored = self._unpack_vector(row["embedding_vector"])
+            dot = sum(a * b for a, b in zip(vector, stored))
+            other = math.sqrt(sum(x * x for x in stored)) or 1.0
+            score = dot / (norm * other)
+            matches.append(_Match(row["embedding_id"], score, 1.0 - score))
+
+        return select_top_k(matches, top_k, key=lambda m: m.score)
+
     @staticmethod
     def _pack_vector(vec: List[float]) -> bytes:
-        import struct
         return struct.pack(f"{len(vec)}f", *vec)
+
+    @staticmethod
+    def _unpack_vector(blob: bytes) -> List[float]:
+        return list(struct.unpack(f"{len(blob) // 4}f", blob))
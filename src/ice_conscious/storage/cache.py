@@ -0,0 +1,462 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+# ============================================================================
+# METRICHE
+# ============================================================================
+
+@dataclass
+class CacheStats:
+    """
+    Contatori di una cache di lettura.
+    """
+    hits: int = 0
+    misses: int = 0
+    negative_hits: int = 0
+    stale_hits: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        data: Dict[str, float] = dict(asdict(self))
+        data["hit_ratio"] = self.hit_ratio
+        return data
+
+
+# ============================================================================
+# LRU / TTL
+# ============================================================================
+
+_MISSING = object()
+_ABSENT = object()    # il backend ha risposto "non esiste"
+_PRESENT = object()   # il backend ha risposto "esiste", record non in cache
+
+
+class LRUCache:
+    """
+    Cache LRU limitata con scadenza opzionale (TTL).
+
+    Thread-safe. Le chiavi negative possono avere un TTL proprio,
+    di norma più breve.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10_000,
+        *,
+        ttl: Optional[float] = None,
+        negative_ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl if negative_ttl is not None else ttl
+        self.stats = CacheStats()
+
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = 0
+
+    @property
+    def epoch(self) -> int:
+        """Incrementato a ogni invalidazione."""
+        return self._epoch
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Ritorna il valore o `_MISSING`; non aggiorna i contatori.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                self.stats.expirations += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any, *, epoch: Optional[int] = None) -> bool:
+        """
+        Inserisce un valore.
+
+        Con `epoch` l'inserimento viene scartato se nel frattempo
+        è avvenuta un'invalidazione (lettura concorrente a una scrittura).
+        """
+        ttl = self.negative_ttl if value is _ABSENT else self.ttl
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                return False
+            expires_at = self._clock() + ttl if ttl is not None else None
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+            return True
+
+    def record(self, *, hit: bool, negative: bool = False) -> None:
+        """
+        Aggiorna i contatori di accesso.
+        """
+        with self._lock:
+            if hit:
+                self.stats.hits += 1
+                if negative:
+                    self.stats.negative_hits += 1
+            else:
+                self.stats.misses += 1
+
+    def invalidate(self, keys: Iterable[Hashable]) -> None:
+        with self._lock:
+            self._epoch += 1
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._data.clear()
+
+
+# ============================================================================
+# GENERAZIONI PER WORKSPACE
+# ============================================================================
+
+class WorkspaceGenerations:
+    """
+    Contatore di generazione dei dati di ogni workspace.
+
+    Va incrementato a ogni scrittura sulla conoscenza del workspace
+    (`bump`); una cache che ricorda la generazione con cui ha calcolato
+    un valore sa se è ancora valido senza doverlo cercare e rimuovere.
+    `bump_all` invalida tutti i workspace (es. delete senza workspace noto).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._global = 0
+
+    def current(self, workspace_id: str) -> int:
+        return self._global + self._counters.get(workspace_id, 0)
+
+    def bump(self, workspace_id: str) -> int:
+        with self._lock:
+            self._counters[workspace_id] = self._counters.get(workspace_id, 0) + 1
+            return self.current(workspace_id)
+
+    def bump_all(self) -> None:
+        with self._lock:
+            self._global += 1
+
+
+class GenerationalCache:
+    """
+    Cache LRU limitata con valori legati alla generazione del workspace.
+
+    Un valore è fresco se la sua generazione è quella corrente del
+    workspace e il TTL (opzionale) non è scaduto; altrimenti è stantio.
+    I valori stantii restano in cache (fino all'evizione LRU) e possono
+    essere serviti con `allow_stale=True` mentre vengono ricalcolati
+    (stale-while-revalidate).
+
+    Thread-safe.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        *,
+        generations: Optional[WorkspaceGenerations] = None,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generations = generations or WorkspaceGenerations()
+        self.stats = CacheStats()
+
+        self._clock = clock
+        # (workspace, chiave) -> (valore, generazione, scadenza)
+        self._data: "OrderedDict[Tuple[str, Hashable], Tuple[Any, int, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(
+        self,
+        workspace_id: str,
+        key: Hashable,
+        *,
+        allow_stale: bool = False,
+    ) -> Tuple[Any, bool]:
+        """
+        Ritorna `(valore, fresco)`, oppure `(_MISSING, False)`.
+
+        Senza `allow_stale` un valore stantio viene rimosso e conta come miss.
+        """
+        with self._lock:
+            entry = self._data.get((workspace_id, key))
+            if entry is None:
+                self.stats.misses += 1
+                return _MISSING, False
+
+            value, generation, expires_at = entry
+            if generation != self.generations.current(workspace_id):
+                fresh = False
+            else:
+                fresh = expires_at is None or expires_at > self._clock()
+
+            if not fresh and not allow_stale:
+                del self._data[(workspace_id, key)]
+                self.stats.invalidations += 1
+                self.stats.misses += 1
+                return _MISSING, False
+
+            self._data.move_to_end((workspace_id, key))
+            self.stats.hits += 1
+            if not fresh:
+                self.stats.stale_hits += 1
+            return value, fresh
+
+    def put(self, workspace_id: str, key: Hashable, value: Any, *, generation: int) -> bool:
+        """
+        Inserisce un valore calcolato con i dati della generazione `generation`.
+
+        Scartato se nel frattempo il workspace è cambiato.
+        """
+        with self._lock:
+            if generation != self.generations.current(workspace_id):
+                return False
+            expires_at = self._clock() + self.ttl if self.ttl is not None else None
+            self._data[(workspace_id, key)] = (value, generation, expires_at)
+            self._data.move_to_end((workspace_id, key))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# ============================================================================
+# REPOSITORY PROXY
+# ============================================================================
+
+class CachedRepository:
+    """
+    Proxy read-through per i repository di `storage/repositories`.
+
+    Avvolge qualunque KnowledgeRepository, MemoryRepository,
+    EmbeddingRepository o RAGSessionRepository:
+    - letture puntuali (get_*, get) servite da cache LRU/TTL
+    - cache negativa: record assenti ed `exists*` falsi
+    - invalidazione automatica su save_*, update, delete*
+    - tutti gli altri metodi passano invariati al backend
+
+    Non altera la semantica del repository: è solo memoria di accesso.
+    """
+
+    # metodo -> namespace della chiave
+    _READS = {
+        "get_entity": "entity",
+        "get_episode": "episode",
+        "get_semantic": "semantic",
+        "get": "record",
+    }
+    _EXISTS = {
+        "exists_entity": "entity",
+        "exists": "record",
+    }
+    # metodo -> (namespace, estrattore degli id invalidati, bulk)
+    _WRITES: Dict[str, Tuple[str, Callable[[Any], List[str]], bool]] = {}
+
+    def __init__(
+        self,
+        backend: Any,
+        *,
+        maxsize: int = 10_000,
+        ttl: Optional[float] = None,
+        negative_ttl: Optional[float] = None,
+        cache: Optional[LRUCache] = None,
+    ) -> None:
+        self.backend = backend
+        self.cache = cache or LRUCache(maxsize, ttl=ttl, negative_ttl=negative_ttl)
+        self._wrapped: Dict[str, Callable[..., Any]] = {}
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.cache.stats
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        Metriche esportabili (hit, miss, evizioni, hit ratio, dimensione).
+        """
+        data = self.cache.stats.as_dict()
+        data["size"] = len(self.cache)
+        return data
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.backend, name)
+        if not callable(attr):
+            return attr
+
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+            if name in self._READS:
+                wrapped = self._read_through(self._READS[name], attr)
+            elif name in self._EXISTS:
+                wrapped = self._exists_through(self._EXISTS[name], attr)
+            elif name in self._WRITES:
+                wrapped = self._invalidating(*self._WRITES[name], attr)
+            else:
+                return attr
+            self._wrapped[name] = wrapped
+        return wrapped
+
+    # ------------------------------------------------------------------
+    # INTERNAL
+    # ------------------------------------------------------------------
+
+    def _read_through(self, namespace: str, fn: Callable[[str], Any]) -> Callable[[str], Any]:
+        cache = self.cache
+
+        def read(record_id: str) -> Any:
+            key = (namespace, record_id)
+            value = cache.get(key)
+            if value is _ABSENT:
+                cache.record(hit=True, negative=True)
+                return None
+            if value is not _MISSING and value is not _PRESENT:
+                cache.record(hit=True)
+                return value
+
+            cache.record(hit=False)
+            epoch = cache.epoch
+            result = fn(record_id)
+            cache.put(key, _ABSENT if result is None else result, epoch=epoch)
+            return result
+
+        return read
+
+    def _exists_through(self, namespace: str, fn: Callable[[str], bool]) -> Callable[[str], bool]:
+        cache = self.cache
+
+        def exists(record_id: str) -> bool:
+            key = (namespace, record_id)
+            value = cache.get(key)
+            if value is _ABSENT:
+                cache.record(hit=True, negative=True)
+                return False
+            if value is not _MISSING:
+                cache.record(hit=True)
+                return True
+
+            cache.record(hit=False)
+            epoch = cache.epoch
+            result = bool(fn(record_id))
+            cache.put(key, _PRESENT if result else _ABSENT, epoch=epoch)
+            return result
+
+        return exists
+
+    def _invalidating(
+        self,
+        namespace: str,
+        extract: Callable[[Any], List[str]],
+        bulk: bool,
+        fn: Callable[..., Any],
+    ) -> Callable[..., Any]:
+        cache = self.cache
+
+        def write(*args: Any, **kwargs: Any) -> Any:
+            first, replace = _split_first(args, kwargs)
+            if bulk:
+                # gli iterabili vengono materializzati una volta e ripassati
+                first = list(first)
+                args, kwargs = replace(first)
+            ids = extract(first)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                cache.invalidate((namespace, i) for i in ids)
+
+        return write
+
+
+def _record_id(record: Any) -> str:
+    # embedding_id prima di entity_id: un EmbeddingRecord può riferire un'entità
+    for attr in ("episode_id", "memory_id", "session_id", "embedding_id", "entity_id"):
+        value = getattr(record, attr, None)
+        if value is not None:
+            return value
+    raise AttributeError(f"Cannot determine id of {type(record).__name__}")
+
+
+def _split_first(
+    args: Tuple[Any, ...],
+    kwargs: Dict[str, Any],
+) -> Tuple[Any, Callable[[Any], Tuple[Tuple[Any, ...], Dict[str, Any]]]]:
+    """
+    Primo argomento della chiamata (posizionale o keyword)
+    e funzione per sostituirlo.
+    """
+    if args:
+        return args[0], lambda v: ((v,) + args[1:], kwargs)
+    key = next(iter(kwargs))
+    return kwargs[key], lambda v: (args, {**kwargs, key: v})
+
+
+def _single_record(record: Any) -> List[str]:
+    return [_record_id(record)]
+
+
+def _single_id(record_id: str) -> List[str]:
+    return [record_id]
+
+
+def _bulk_records(records: List[Any]) -> List[str]:
+    return [_record_id(r) for r in records]
+
+
+def _bulk_ids(record_ids: List[str]) -> List[str]:
+    return list(record_ids)
+
+
+# metodo -> (namespace, estrattore, argomento iterabile da materializzare)
+CachedRepository._WRITES = {
+    "save_entity": ("entity", _single_record, False),
+    "delete_entity": ("entity", _single_id, False),
+    "save_episode": ("episode", _single_record, False),
+    "delete_episode": ("episode", _single_id, False),
+    "save_semantic": ("semantic", _single_record, False),
+    "delete_semantic": ("semantic", _single_id, False),
+    "save": ("record", _single_record, False),
+    "update": ("record", _single_id, False),
+    "delete": ("record", _single_id, False),
+    "save_many": ("record", _bulk_records, True),
+    "delete_many": ("record", _bulk_ids, True),
+}
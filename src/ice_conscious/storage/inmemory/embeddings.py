@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from ice_conscious.storage.repositories.embeddings import EmbeddingRecord
+
+
+# ============================================================================
+# IN-MEMORY EMBEDDING REPOSITORY
+# ============================================================================
+
+class InMemoryEmbeddingRepository:
+    """
+    EmbeddingRepository in memoria di processo.
+
+    Pensato per test, sessioni effimere e come riferimento
+    del contratto. Thread-safe; le operazioni bulk sono atomiche
+    rispetto agli altri chiamanti.
+    """
+
+    def __init__(self) -> None:
+        self._records: Dict[str, EmbeddingRecord] = {}
+        # workspace -> embedding_id (ordine di inserimento)
+        self._by_workspace: Dict[str, Dict[str, None]] = {}
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # WRITE
+    # ------------------------------------------------------------------
+
+    def save(self, record: EmbeddingRecord) -> EmbeddingRecord:
+        with self._lock:
+            self._put(record)
+        return record
+
+    def save_many(self, records: Iterable[EmbeddingRecord]) -> int:
+        # materializza e valida prima di toccare lo stato: tutto o niente;
+        # chiave embedding_id come _put (stesso id ripetuto: vince l'ultimo)
+        staged = {r.embedding_id: r for r in records}
+        with self._lock:
+            for record in staged.values():
+                self._put(record)
+        return len(staged)
+
+    def delete(self, embedding_id: str) -> None:
+        with self._lock:
+            self._drop(embedding_id)
+
+    def delete_many(self, embedding_ids: Iterable[str]) -> int:
+        staged = list(embedding_ids)
+        with self._lock:
+            return sum(1 for embedding_id in staged if self._drop(embedding_id))
+
+    # ------------------------------------------------------------------
+    # READ
+    # ------------------------------------------------------------------
+
+    def get(self, embedding_id: str) -> Optional[EmbeddingRecord]:
+        return self._records.get(embedding_id)
+
+    def list_by_workspace(self, workspace_id: str) -> List[EmbeddingRecord]:
+        with self._lock:
+            ids = list(self._by_workspace.get(workspace_id, ()))
+            return [self._records[i] for i in ids]
+
+    def iter_by_workspace(
+        self,
+        workspace_id: str,
+        *,
+        batch_size: int = 1000,
+    ) -> Iterator[List[EmbeddingRecord]]:
+        # snapshot dei soli id: i record vengono risolti lotto per lotto
+        with self._lock:
+            ids = list(self._by_workspace.get(workspace_id, ()))
+
+        for start in range(0, len(ids), batch_size):
+            batch = [
+                record
+                for record in map(self._records.get, ids[start : start + batch_size])
+                if record is not None
+            ]
+            if batch:
+                yield batch
+
+    def list_by_entity(
+        self,
+        workspace_id: str,
+        entity_id: str,
+    ) -> List[EmbeddingRecord]:
+        return [
+            r
+            for r in self.list_by_workspace(workspace_id)
+            if r.entity_id == entity_id
+        ]
+
+    # ------------------------------------------------------------------
+    # INTROSPECTION
+    # ------------------------------------------------------------------
+
+    def exists(self, embedding_id: str) -> bool:
+        return embedding_id in self._records
+
+    def count(self, workspace_id: Optional[str] = None) -> int:
+        if workspace_id is None:
+            return len(self._records)
+        return len(self._by_workspace.get(workspace_id, ()))
+
+    # ------------------------------------------------------------------
+    # INTERNAL
+    # ------------------------------------------------------------------
+
+    def _put(self, record: EmbeddingRecord) -> None:
+        if record.created_at is None:
+            record.created_at = datetime.utcnow()
+
+        previous = self._records.get(record.embedding_id)
+        if previous is not None and previous.workspace_id != record.workspace_id:
+            self._by_workspace[previous.workspace_id].pop(record.embedding_id, None)
+
+        self._records[record.embedding_id] = record
+        self._by_workspace.setdefault(record.workspace_id, {})[record.embedding_id] = None
+
+    def _drop(self, embedding_id: str) -> bool:
+        record = self._records.pop(embedding_id, None)
+        if record is None:
+            return False
+        self._by_workspace.get(record.workspace_id, {}).pop(embedding_id, None)
+        return True
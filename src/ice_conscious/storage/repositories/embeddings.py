@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Protocol, Optional, Iterable, Dict, Any, List
+from typing import Protocol, Optional, Iterable, Iterator, Dict, Any, List
 from datetime import datetime
 
 
@@ -65,12 +65,30 @@ class EmbeddingRepository(Protocol):
         """
         ...
 
+    def save_many(self, records: Iterable[EmbeddingRecord]) -> int:
+        """
+        Registra un insieme di embedding in una sola transazione.
+
+        Tutto o niente; idempotente rispetto a embedding_id
+        (id ripetuti nel lotto: vince l'ultimo record).
+        Ritorna il numero di embedding_id distinti scritti.
+        """
+        ...
+
     def delete(self, embedding_id: str) -> None:
         """
         Rimuove un embedding dalla memoria semantica.
         """
         ...
 
+    def delete_many(self, embedding_ids: Iterable[str]) -> int:
+        """
+        Rimuove un insieme di embedding in una sola transazione.
+
+        Ritorna il numero di record effettivamente rimossi.
+        """
+        ...
+
     # ------------------------------------------------------------------
     # READ
     # ------------------------------------------------------------------
@@ -87,6 +105,17 @@ class EmbeddingRepository(Protocol):
         """
         ...
 
+    def iter_by_workspace(
+        self,
+        workspace_id: str,
+        *,
+        batch_size: int = 1000,
+    ) -> Iterator[List[EmbeddingRecord]]:
+        """
+        Embedding di un workspace a lotti, caricati solo quando richiesti.
+        """
+        ...
+
     def list_by_entity(
         self,
         workspace_id: str,
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Protocol, Optional, Dict, Any, List
+from typing import Protocol, Optional, Dict, Any, List, Iterator, Generic, TypeVar
 from datetime import datetime
 
 
+T = TypeVar("T")
+
+
 # ============================================================================
 # MEMORY RECORDS (COGNITIVE)
 # ============================================================================
@@ -71,6 +74,19 @@ class SemanticMemoryRecord:
     updated_at: Optional[datetime] = None
 
 
+@dataclass
+class MemoryPage(Generic[T]):
+    """
+    Pagina di una lettura paginata per chiave (keyset).
+
+    `next_cursor` è un token opaco da ripassare come `after`
+    per ottenere la pagina successiva; None se la lettura è esaurita.
+    """
+
+    records: List[T] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+
 # ============================================================================
 # MEMORY REPOSITORY CONTRACT
 # ============================================================================
@@ -119,6 +135,35 @@ class MemoryRepository(Protocol):
         """
         ...
 
+    def page_episodes(
+        self,
+        workspace_id: str,
+        *,
+        kind: Optional[str] = None,
+        since: Optional[datetime] = None,
+        after: Optional[str] = None,
+        limit: int = 500,
+    ) -> MemoryPage[EpisodicMemoryRecord]:
+        """
+        Pagina di eventi in ordine (occurred_at, episode_id).
+
+        `after` è il cursore opaco restituito dalla pagina precedente.
+        """
+        ...
+
+    def iter_episodes(
+        self,
+        workspace_id: str,
+        *,
+        kind: Optional[str] = None,
+        since: Optional[datetime] = None,
+        page_size: int = 500,
+    ) -> Iterator[EpisodicMemoryRecord]:
+        """
+        Scorre tutti gli eventi pagina per pagina, a memoria costante.
+        """
+        ...
+
     def delete_episode(self, episode_id: str) -> None:
         """
         Rimuove un evento.
@@ -154,6 +199,20 @@ class MemoryRepository(Protocol):
         """
         ...
 
+    def page_semantic(
+        self,
+        workspace_id: str,
+        *,
+        scope: Optional[str] = None,
+        min_confidence: Optional[float] = None,
+        after: Optional[str] = None,
+        limit: int = 500,
+    ) -> MemoryPage[SemanticMemoryRecord]:
+        """
+        Pagina di memorie semantiche in ordine di memory_id.
+        """
+        ...
+
     def delete_semantic(self, memory_id: str) -> None:
         """
         Rimuove una memoria semantica.
@@ -0,0 +1,735 @@
+from __future__ import annotations
+
+import bisect
+import hashlib
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .cache import LRUCache, _MISSING
+from .repositories.embeddings import EmbeddingRecord
+from .repositories.knowledge import KnowledgeRecord, KnowledgeRelationRecord
+from .repositories.memory import EpisodicMemoryRecord, MemoryPage, SemanticMemoryRecord
+from .repositories.rag_sessions import RAGSessionRecord
+
+
+# ============================================================================
+# SHARD MAP
+# ============================================================================
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class ShardMapStore(Protocol):
+    """
+    Persistenza della tabella di override di una ShardMap.
+    """
+
+    def load(self) -> Dict[str, int]:
+        ...
+
+    def save(self, overrides: Dict[str, int]) -> None:
+        ...
+
+
+class JSONShardMapStore:
+    """
+    Override in un file JSON, riscritto atomicamente (file temporaneo
+    + rename) a ogni modifica.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+
+    def load(self) -> Dict[str, int]:
+        if not self.path.exists():
+            return {}
+        with self.path.open("r", encoding="utf-8") as fh:
+            return {str(k): int(v) for k, v in json.load(fh).items()}
+
+    def save(self, overrides: Dict[str, int]) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            json.dump(overrides, fh, sort_keys=True)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.path)
+
+
+class ShardMap:
+    """
+    Assegnazione workspace -> shard.
+
+    Hashing consistente su anello con nodi virtuali, più una tabella
+    esplicita di override (workspace giganti, spostamenti manuali).
+
+    Con uno `store` la tabella viene caricata all'avvio e salvata a ogni
+    `pin` / `unpin` prima di diventare effettiva: un workspace spostato
+    da `rebalance` resta sul nuovo shard anche dopo un riavvio.
+    """
+
+    def __init__(
+        self,
+        shard_count: int,
+        *,
+        overrides: Optional[Dict[str, int]] = None,
+        vnodes: int = 64,
+        store: Optional[ShardMapStore] = None,
+    ) -> None:
+        if shard_count <= 0:
+            raise ValueError("shard_count must be positive")
+
+        self.shard_count = shard_count
+        self.store = store
+        self.overrides: Dict[str, int] = {}
+        if store is not None:
+            self.overrides.update(store.load())
+        self.overrides.update(overrides or {})
+
+        ring = sorted(
+            (_hash64(f"shard-{shard}#{v}"), shard)
+            for shard in range(shard_count)
+            for v in range(vnodes)
+        )
+        self._points = [p for p, _ in ring]
+        self._owners = [s for _, s in ring]
+
+        for workspace_id, shard in self.overrides.items():
+            self.validate_shard(shard)
+
+    def shard_for(self, workspace_id: str) -> int:
+        shard = self.overrides.get(workspace_id)
+        if shard is not None:
+            return shard
+        idx = bisect.bisect(self._points, _hash64(workspace_id)) % len(self._points)
+        return self._owners[idx]
+
+    def pin(self, workspace_id: str, shard: int) -> None:
+        self.validate_shard(shard)
+        self._replace({**self.overrides, workspace_id: shard})
+
+    def unpin(self, workspace_id: str) -> None:
+        if workspace_id in self.overrides:
+            self._replace({k: v for k, v in self.overrides.items() if k != workspace_id})
+
+    def validate_shard(self, shard: int) -> None:
+        """
+        Solleva ValueError se `shard` non è un indice valido.
+        """
+        if not 0 <= shard < self.shard_count:
+            raise ValueError(f"Shard {shard} out of range [0, {self.shard_count})")
+
+    def _replace(self, overrides: Dict[str, int]) -> None:
+        # prima lo store: se il salvataggio fallisce la mappa non cambia
+        if self.store is not None:
+            self.store.save(overrides)
+        self.overrides = overrides
+
+
+# ============================================================================
+# ROUTER BASE
+# ============================================================================
+
+@dataclass
+class _Migration:
+    source: int
+    target: int
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # chiavi scritte durante lo spostamento: la copia non le sovrascrive
+    touched: Set[Hashable] = field(default_factory=set)
+    # proprietà già passata al target: la sorgente non va più scritta
+    done: bool = False
+
+
+# chiave di in-flight per le scritture che toccano tutti gli shard
+_ALL = object()
+
+
+class _ShardRouter(ABC):
+    """
+    Logica comune ai router per workspace.
+
+    - le operazioni con workspace_id vanno allo shard proprietario
+    - le letture per solo id consultano un indice di posizione (LRU)
+      e, in mancanza, interrogano gli shard in parallelo
+    - le cancellazioni per solo id vengono inviate a tutti gli shard
+      (sono idempotenti)
+    - gli aggregati senza workspace (count(None)) vengono distribuiti
+      in parallelo e sommati
+
+    `rebalance` sposta un workspace mentre il router resta in servizio:
+    durante la copia le scritture vanno su sorgente e destinazione,
+    le chiavi già scritte non vengono sovrascritte dalla copia,
+    e il passaggio di proprietà è atomico rispetto alle scritture.
+    """
+
+    def __init__(
+        self,
+        shards: Sequence[Any],
+        *,
+        shard_map: Optional[ShardMap] = None,
+        max_workers: Optional[int] = None,
+        location_cache_size: int = 100_000,
+    ) -> None:
+        if not shards:
+            raise ValueError("At least one shard is required")
+
+        self.shards: List[Any] = list(shards)
+        self.shard_map = shard_map or ShardMap(len(self.shards))
+        if self.shard_map.shard_count != len(self.shards):
+            raise ValueError("ShardMap size does not match the number of shards")
+
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or len(self.shards),
+            thread_name_prefix="shard-router",
+        )
+        self._locations = LRUCache(location_cache_size)
+
+        self._state = threading.Condition()
+        self._migrations: Dict[str, _Migration] = {}
+        self._inflight: Dict[Any, int] = defaultdict(int)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    # ------------------------------------------------------------------
+    # ROUTING
+    # ------------------------------------------------------------------
+
+    def shard_index(self, workspace_id: str) -> int:
+        return self.shard_map.shard_for(workspace_id)
+
+    def _shard(self, workspace_id: str) -> Any:
+        return self.shards[self.shard_map.shard_for(workspace_id)]
+
+    def _fan_out(self, fn: Callable[[Any], Any]) -> List[Any]:
+        if len(self.shards) == 1:
+            return [fn(self.shards[0])]
+        return list(self._pool.map(fn, self.shards))
+
+    def _sum(self, method: str, workspace_id: Optional[str]) -> int:
+        if workspace_id is not None:
+            return getattr(self._shard(workspace_id), method)(workspace_id)
+        return sum(self._fan_out(lambda s: getattr(s, method)(None)))
+
+    def _locate(self, namespace: str, record_id: str, method: str) -> Any:
+        """
+        Lettura puntuale per solo id.
+        """
+        key = (namespace, record_id)
+        hint = self._locations.get(key)
+        if hint is not _MISSING:
+            found = getattr(self.shards[hint], method)(record_id)
+            # l'indice può essere superato da un rebalance
+            if found is not None and self.shard_index(found.workspace_id) == hint:
+                return found
+
+        results = self._fan_out(lambda s: getattr(s, method)(record_id))
+        best: Tuple[int, Any] = (-1, None)
+        for idx, record in enumerate(results):
+            if record is None:
+                continue
+            # con più copie (spostamento in corso) vince lo shard proprietario
+            owner = self.shard_index(record.workspace_id)
+            if best[1] is None or idx == owner:
+                best = (idx, record)
+
+        if best[1] is not None:
+            self._locations.put(key, best[0])
+        return best[1]
+
+    def _exists(self, namespace: str, record_id: str, method: str) -> bool:
+        hint = self._locations.get((namespace, record_id))
+        if hint is not _MISSING and getattr(self.shards[hint], method)(record_id):
+            return True
+        return any(self._fan_out(lambda s: getattr(s, method)(record_id)))
+
+    # ------------------------------------------------------------------
+    # WRITES
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _entering(self, scope: Any) -> Iterator[Optional[_Migration]]:
+        with self._state:
+            migration = self._migrations.get(scope) if scope is not _ALL else None
+            if migration is None:
+                self._inflight[scope] += 1
+        try:
+            yield migration
+        finally:
+            if migration is None:
+                with self._state:
+                    self._inflight[scope] -= 1
+                    self._state.notify_all()
+
+    def _write(
+        self,
+        workspace_id: str,
+        keys: Iterable[Hashable],
+        fn: Callable[[Any], Any],
+    ) -> Any:
+        with self._entering(workspace_id) as migration:
+            if migration is None:
+                return fn(self._shard(workspace_id))
+            with migration.lock:
+                if migration.done:
+                    # entrata prima del passaggio di proprietà: la sorgente
+                    # sta per essere ripulita, scrive solo sul target
+                    return fn(self.shards[migration.target])
+                migration.touched.update(keys)
+                fn(self.shards[migration.target])
+                return fn(self.shards[migration.source])
+
+    def _write_everywhere(
+        self,
+        keys: Sequence[Hashable],
+        fn: Callable[[Any], Any],
+    ) -> None:
+        with self._entering(_ALL):
+            with self._state:
+                migrations = list(self._migrations.values())
+            for migration in migrations:
+                with migration.lock:
+                    migration.touched.update(keys)
+            self._fan_out(fn)
+        self._locations.invalidate(keys)
+
+    # ------------------------------------------------------------------
+    # REBALANCE
+    # ------------------------------------------------------------------
+
+    def rebalance(self, workspace_id: str, target: int) -> int:
+        """
+        Sposta un workspace sullo shard `target` senza fermare il router.
+
+        Ritorna il numero di record copiati.
+        """
+        self.shard_map.validate_shard(target)
+        source = self.shard_index(workspace_id)
+        if source == target:
+            return 0
+
+        migration = _Migration(source=source, target=target)
+        with self._state:
+            if workspace_id in self._migrations:
+                raise RuntimeError(f"Workspace {workspace_id!r} is already being moved")
+            self._migrations[workspace_id] = migration
+            # attende le scritture partite prima della registrazione
+            self._state.wait_for(
+                lambda: self._inflight[workspace_id] == 0 and self._inflight[_ALL] == 0
+            )
+
+        src = self.shards[source]
+        dst = self.shards[target]
+        copied = 0
+        try:
+            for key, copy in self._copy_items(src, workspace_id):
+                with migration.lock:
+                    if key in migration.touched:
+                        continue
+                    copy(dst)
+                    copied += 1
+
+            with self._state, migration.lock:
+                self.shard_map.pin(workspace_id, target)
+                migration.done = True
+                del self._migrations[workspace_id]
+                self._state.notify_all()
+        except BaseException:
+            with self._state:
+                self._migrations.pop(workspace_id, None)
+                self._state.notify_all()
+            raise
+
+        self._purge(src, workspace_id)
+        return copied
+
+    # hook per tipo di repository
+    @abstractmethod
+    def _copy_items(
+        self,
+        shard: Any,
+        workspace_id: str,
+    ) -> Iterator[Tuple[Hashable, Callable[[Any], Any]]]:
+        ...
+
+    @abstractmethod
+    def _purge(self, shard: Any, workspace_id: str) -> None:
+        ...
+
+
+# ============================================================================
+# KNOWLEDGE
+# ============================================================================
+
+class ShardedKnowledgeRepository(_ShardRouter):
+    """
+    KnowledgeRepository distribuito per workspace su N shard.
+    """
+
+    def save_entity(self, record: KnowledgeRecord) -> KnowledgeRecord:
+        return self._write(
+            record.workspace_id,
+            [("entity", record.entity_id)],
+            lambda s: s.save_entity(record),
+        )
+
+    def delete_entity(self, entity_id: str) -> None:
+        self._write_everywhere([("entity", entity_id)], lambda s: s.delete_entity(entity_id))
+
+    def get_entity(self, entity_id: str) -> Optional[KnowledgeRecord]:
+        return self._locate("entity", entity_id, "get_entity")
+
+    def list_entities(
+        self,
+        workspace_id: str,
+        *,
+        kind: Optional[str] = None,
+        min_confidence: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[KnowledgeRecord]:
+        return self._shard(workspace_id).list_entities(
+            workspace_id, kind=kind, min_confidence=min_confidence, limit=limit
+        )
+
+    def save_relation(self, relation: KnowledgeRelationRecord) -> KnowledgeRelationRecord:
+        return self._write(
+            relation.workspace_id,
+            [("relation", relation.relation_id)],
+            lambda s: s.save_relation(relation),
+        )
+
+    def delete_relation(self, relation_id: str) -> None:
+        self._write_everywhere(
+            [("relation", relation_id)],
+            lambda s: s.delete_relation(relation_id),
+        )
+
+    def list_relations(
+        self,
+        workspace_id: str,
+        *,
+        source_id: Optional[str] = None,
+        target_id: Optional[str] = None,
+        relation_type: Optional[str] = None,
+    ) -> List[KnowledgeRelationRecord]:
+        return self._shard(workspace_id).list_relations(
+            workspace_id,
+            source_id=source_id,
+            target_id=target_id,
+            relation_type=relation_type,
+        )
+
+    def exists_entity(self, entity_id: str) -> bool:
+        return self._exists("entity", entity_id, "exists_entity")
+
+    def count_entities(self, workspace_id: Optional[str] = None) -> int:
+        return self._sum("count_entities", workspace_id)
+
+    def count_relations(self, workspace_id: Optional[str] = None) -> int:
+        return self._sum("count_relations", workspace_id)
+
+    def _copy_items(self, shard: Any, workspace_id: str):
+        for e in shard.list_entities(workspace_id):
+            yield ("entity", e.entity_id), (lambda d, e=e: d.save_entity(e))
+        for r in shard.list_relations(workspace_id):
+            yield ("relation", r.relation_id), (lambda d, r=r: d.save_relation(r))
+
+    def _purge(self, shard: Any, workspace_id: str) -> None:
+        for r in shard.list_relations(workspace_id):
+            shard.delete_relation(r.relation_id)
+        for e in shard.list_entities(workspace_id):
+            shard.delete_entity(e.entity_id)
+
+
+# ============================================================================
+# MEMORY
+# ============================================================================
+
+class ShardedMemoryRepository(_ShardRouter):
+    """
+    MemoryRepository distribuito per workspace su N shard.
+    """
+
+    def save_episode(self, record: EpisodicMemoryRecord) -> EpisodicMemoryRecord:
+        return self._write(
+            record.workspace_id,
+            [("episode", record.episode_id)],
+            lambda s: s.save_episode(record),
+        )
+
+    def get_episode(self, episode_id: str) -> Optional[EpisodicMemoryRecord]:
+        return self._locate("episode", episode_id, "get_episode")
+
+    def list_episodes(
+        self,
+        workspace_id: str,
+        *,
+        kind: Optional[str] = None,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[EpisodicMemoryRecord]:
+        return self._shard(workspace_id).list_episodes(
+            workspace_id, kind=kind, since=since, limit=limit
+        )
+
+    def page_episodes(
+        self,
+        workspace_id: str,
+        *,
+        kind: Optional[str] = None,
+        since: Optional[datetime] = None,
+        after: Optional[str] = None,
+        limit: int = 500,
+    ) -> MemoryPage[EpisodicMemoryRecord]:
+        return self._shard(workspace_id).page_episodes(
+            workspace_id, kind=kind, since=since, after=after, limit=limit
+        )
+
+    def iter_episodes(
+        self,
+        workspace_id: str,
+        *,
+        kind: Optional[str] = None,
+        since: Optional[datetime] = None,
+        page_size: int = 500,
+    ) -> Iterator[EpisodicMemoryRecord]:
+        return self._shard(workspace_id).iter_episodes(
+            workspace_id, kind=kind, since=since, page_size=page_size
+        )
+
+    def delete_episode(self, episode_id: str) -> None:
+        self._write_everywhere(
+            [("episode", episode_id)],
+            lambda s: s.delete_episode(episode_id),
+        )
+
+    def save_semantic(self, record: SemanticMemoryRecord) -> SemanticMemoryRecord:
+        return self._write(
+            record.workspace_id,
+            [("semantic", record.memory_id)],
+            lambda s: s.save_semantic(record),
+        )
+
+    def get_semantic(self, memory_id: str) -> Optional[SemanticMemoryRecord]:
+        return self._locate("semantic", memory_id, "get_semantic")
+
+    def list_semantic(
+        self,
+        workspace_id: str,
+        *,
+        scope: Optional[str] = None,
+        min_confidence: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[SemanticMemoryRecord]:
+        return self._shard(workspace_id).list_semantic(
+            workspace_id, scope=scope, min_confidence=min_confidence, limit=limit
+        )
+
+    def page_semantic(
+        self,
+        workspace_id: str,
+        *,
+        scope: Optional[str] = None,
+        min_confidence: Optional[float] = None,
+        after: Optional[str] = None,
+        limit: int = 500,
+    ) -> MemoryPage[SemanticMemoryRecord]:
+        return self._shard(workspace_id).page_semantic(
+            workspace_id,
+            scope=scope,
+            min_confidence=min_confidence,
+            after=after,
+            limit=limit,
+        )
+
+    def delete_semantic(self, memory_id: str) -> None:
+        self._write_everywhere(
+            [("semantic", memory_id)],
+            lambda s: s.delete_semantic(memory_id),
+        )
+
+    def count_episodes(self, workspace_id: Optional[str] = None) -> int:
+        return self._sum("count_episodes", workspace_id)
+
+    def count_semantic(self, workspace_id: Optional[str] = None) -> int:
+        return self._sum("count_semantic", workspace_id)
+
+    def _copy_items(self, shard: Any, workspace_id: str):
+        episodes = (
+            shard.iter_episodes(workspace_id)
+            if hasattr(shard, "iter_episodes")
+            else shard.list_episodes(workspace_id)
+        )
+        for e in episodes:
+            yield ("episode", e.episode_id), (lambda d, e=e: d.save_episode(e))
+        for m in shard.list_semantic(workspace_id):
+            yield ("semantic", m.memory_id), (lambda d, m=m: d.save_semantic(m))
+
+    def _purge(self, shard: Any, workspace_id: str) -> None:
+        for e in list(shard.list_episodes(workspace_id)):
+            shard.delete_episode(e.episode_id)
+        for m in shard.list_semantic(workspace_id):
+            shard.delete_semantic(m.memory_id)
+
+
+# ============================================================================
+# EMBEDDINGS
+# ============================================================================
+
+class ShardedEmbeddingRepository(_ShardRouter):
+    """
+    EmbeddingRepository distribuito per workspace su N shard.
+
+    `save_many` è transazionale per shard, non tra shard diversi.
+    """
+
+    def save(self, record: EmbeddingRecord) -> EmbeddingRecord:
+        return self._write(
+            record.workspace_id,
+            [("record", record.embedding_id)],
+            lambda s: s.save(record),
+        )
+
+    def save_many(self, records: Iterable[EmbeddingRecord]) -> int:
+        by_workspace: Dict[str, List[EmbeddingRecord]] = defaultdict(list)
+        for r in records:
+            by_workspace[r.workspace_id].append(r)
+
+        written = 0
+        for workspace_id, group in by_workspace.items():
+            self._write(
+                workspace_id,
+                [("record", r.embedding_id) for r in group],
+                lambda s, group=group: s.save_many(group),
+            )
+            written += len(group)
+        return written
+
+    def delete(self, embedding_id: str) -> None:
+        self._write_everywhere([("record", embedding_id)], lambda s: s.delete(embedding_id))
+
+    def delete_many(self, embedding_ids: Iterable[str]) -> int:
+        ids = list(embedding_ids)
+        counts: List[int] = []
+
+        def drop(shard: Any) -> int:
+            n = shard.delete_many(ids)
+            counts.append(n)
+            return n
+
+        self._write_everywhere([("record", i) for i in ids], drop)
+        return sum(counts)
+
+    def get(self, embedding_id: str) -> Optional[EmbeddingRecord]:
+        return self._locate("record", embedding_id, "get")
+
+    def list_by_workspace(self, workspace_id: str) -> List[EmbeddingRecord]:
+        return self._shard(workspace_id).list_by_workspace(workspace_id)
+
+    def iter_by_workspace(
+        self,
+        workspace_id: str,
+        *,
+        batch_size: int = 1000,
+    ) -> Iterator[List[EmbeddingRecord]]:
+        return self._shard(workspace_id).iter_by_workspace(workspace_id, batch_size=batch_size)
+
+    def list_by_entity(self, workspace_id: str, entity_id: str) -> List[EmbeddingRecord]:
+        return self._shard(workspace_id).list_by_entity(workspace_id, entity_id)
+
+    def exists(self, embedding_id: str) -> bool:
+        return self._exists("record", embedding_id, "exists")
+
+    def count(self, workspace_id: Optional[str] = None) -> int:
+        return self._sum("count", workspace_id)
+
+    def _copy_items(self, shard: Any, workspace_id: str):
+        for batch in shard.iter_by_workspace(workspace_id):
+            for r in batch:
+                yield ("record", r.embedding_id), (lambda d, r=r: d.save(r))
+
+    def _purge(self, shard: Any, workspace_id: str) -> None:
+        ids = [r.embedding_id for batch in shard.iter_by_workspace(workspace_id) for r in batch]
+        shard.delete_many(ids)
+
+
+# ============================================================================
+# RAG SESSIONS
+# ============================================================================
+
+class ShardedRAGSessionRepository(_ShardRouter):
+    """
+    RAGSessionRepository distribuito per workspace su N shard.
+    """
+
+    def save(self, session: RAGSessionRecord) -> RAGSessionRecord:
+        return self._write(
+            session.workspace_id,
+            [("record", session.session_id)],
+            lambda s: s.save(session),
+        )
+
+    def update(self, session_id: str, fields: Dict[str, Any]) -> None:
+        # la sessione vive in un solo shard: altrove l'update è un no-op
+        self._write_everywhere([("record", session_id)], lambda s: s.update(session_id, fields))
+
+    def delete(self, session_id: str) -> None:
+        self._write_everywhere([("record", session_id)], lambda s: s.delete(session_id))
+
+    def get(self, session_id: str) -> Optional[RAGSessionRecord]:
+        return self._locate("record", session_id, "get")
+
+    def list_by_workspace(
+        self,
+        workspace_id: str,
+        *,
+        limit: Optional[int] = None,
+    ) -> List[RAGSessionRecord]:
+        return self._shard(workspace_id).list_by_workspace(workspace_id, limit=limit)
+
+    def list_recent(
+        self,
+        workspace_id: str,
+        *,
+        since: Optional[datetime] = None,
+        limit: int = 20,
+    ) -> List[RAGSessionRecord]:
+        return self._shard(workspace_id).list_recent(workspace_id, since=since, limit=limit)
+
+    def exists(self, session_id: str) -> bool:
+        return self._exists("record", session_id, "exists")
+
+    def count(self, workspace_id: Optional[str] = None) -> int:
+        return self._sum("count", workspace_id)
+
+    def _copy_items(self, shard: Any, workspace_id: str):
+        for s in shard.list_by_workspace(workspace_id):
+            yield ("record", s.session_id), (lambda d, s=s: d.save(s))
+
+    def _purge(self, shard: Any, workspace_id: str) -> None:
+        for s in shard.list_by_workspace(workspace_id):
+            shard.delete(s.session_id)
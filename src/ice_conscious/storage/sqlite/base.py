@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import base64
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Sequence, Union
+
+
+# ============================================================================
+# CONNESSIONE CONDIVISA
+# ============================================================================
+
+class SQLiteStore:
+    """
+    Base comune dei repository SQLite.
+
+    Gestisce:
+    - connessione (file o ":memory:")
+    - serializzazione degli accessi (lock)
+    - transazioni esplicite
+
+    NON conosce i modelli cognitivi: ogni repository
+    definisce il proprio schema in `SCHEMA`.
+    """
+
+    SCHEMA: Sequence[str] = ()
+
+    def __init__(
+        self,
+        path: Union[str, Path] = ":memory:",
+        *,
+        connection: Optional[sqlite3.Connection] = None,
+    ) -> None:
+        if connection is None:
+            connection = sqlite3.connect(
+                str(path),
+                check_same_thread=False,
+                isolation_level=None,
+            )
+            if str(path) != ":memory:":
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+
+        connection.row_factory = sqlite3.Row
+
+        self.path = str(path)
+        self._conn = connection
+        self._lock = threading.RLock()
+        self._tx_depth = 0
+
+        with self.transaction():
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+
+    # ------------------------------------------------------------------
+    # ACCESSO
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Transazione annidabile: solo il livello più esterno
+        esegue BEGIN / COMMIT / ROLLBACK.
+        """
+        with self._lock:
+            outer = self._tx_depth == 0
+            if outer and not self._conn.in_transaction:
+                self._conn.execute("BEGIN")
+            self._tx_depth += 1
+            try:
+                yield self._conn
+            except BaseException:
+                self._tx_depth -= 1
+                if outer and self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._tx_depth -= 1
+                if outer and self._conn.in_transaction:
+                    self._conn.execute("COMMIT")
+
+    def _fetch_all(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _fetch_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+        with self.transaction() as conn:
+            conn.execute(sql, params)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ============================================================================
+# SERIALIZZAZIONE
+# ============================================================================
+
+def to_json(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def from_json(raw: Optional[str], default: Any = None) -> Any:
+    if not raw:
+        return default
+    return json.loads(raw)
+
+
+def to_timestamp(value: Optional[datetime]) -> Optional[str]:
+    """
+    Timestamp ISO a larghezza fissa (UTC naive),
+    ordinabile lessicograficamente.
+    """
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="microseconds")
+
+
+def from_timestamp(raw: Optional[str]) -> Optional[datetime]:
+    if raw is None:
+        return None
+    return datetime.fromisoformat(raw)
+
+
+# ============================================================================
+# CURSORI KEYSET
+# ============================================================================
+
+def encode_cursor(*key: Any) -> str:
+    """
+    Codifica la chiave dell'ultimo record letto in un token opaco.
+    """
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, arity: int) -> List[Any]:
+    """
+    Decodifica un cursore prodotto da `encode_cursor`.
+
+    Solleva ValueError se il token non è valido.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as exc:
+        raise ValueError(f"Invalid cursor: {token!r}") from exc
+
+    if not isinstance(key, list) or len(key) != arity:
+        raise ValueError(f"Invalid cursor: {token!r}")
+    return key
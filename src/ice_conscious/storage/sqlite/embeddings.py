@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+from ice_conscious.storage.repositories.embeddings import EmbeddingRecord
+from .base import SQLiteStore, from_json, from_timestamp, to_json, to_timestamp
+
+
+# limite prudente ai parametri per statement (SQLITE_MAX_VARIABLE_NUMBER)
+MAX_SQL_PARAMS = 900
+
+
+# ============================================================================
+# SQLITE EMBEDDING REPOSITORY
+# ============================================================================
+
+class SQLiteEmbeddingRepository(SQLiteStore):
+    """
+    EmbeddingRepository su SQLite.
+
+    Le scritture bulk usano `executemany` in una sola transazione;
+    la lettura per workspace procede per chiave (workspace_id, embedding_id)
+    e materializza un solo lotto alla volta.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS embedding_records (
+            embedding_id TEXT PRIMARY KEY,
+            workspace_id TEXT NOT NULL,
+            entity_id TEXT,
+            text TEXT NOT NULL,
+            metadata TEXT,
+            embedding_model TEXT,
+            embedding_dim INTEGER,
+            created_at TEXT
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_embedding_records_ws
+        ON embedding_records (workspace_id, embedding_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_embedding_records_entity
+        ON embedding_records (workspace_id, entity_id)
+        """,
+    )
+
+    _INSERT = """
+        INSERT OR REPLACE INTO embedding_records (
+            embedding_id, workspace_id, entity_id, text, metadata,
+            embedding_model, embedding_dim, created_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    # ------------------------------------------------------------------
+    # WRITE
+    # ------------------------------------------------------------------
+
+    def save(self, record: EmbeddingRecord) -> EmbeddingRecord:
+        self._execute(self._INSERT, self._to_row(record))
+        return record
+
+    def save_many(self, records: Iterable[EmbeddingRecord], *, chunk_size: int = 1000) -> int:
+        written = set()
+        it = iter(records)
+
+        with self.transaction() as conn:
+            while True:
+                # stesso id ripetuto: vince l'ultimo (anche tra chunk, via REPLACE)
+                chunk = {r.embedding_id: self._to_row(r) for r in islice(it, chunk_size)}
+                if not chunk:
+                    break
+                conn.executemany(self._INSERT, list(chunk.values()))
+                written.update(chunk)
+
+        return len(written)
+
+    def delete(self, embedding_id: str) -> None:
+        self._execute(
+            "DELETE FROM embedding_records WHERE embedding_id = ?",
+            (embedding_id,),
+        )
+
+    def delete_many(self, embedding_ids: Iterable[str]) -> int:
+        deleted = 0
+        it = iter(embedding_ids)
+
+        with self.transaction() as conn:
+            while True:
+                chunk = list(islice(it, MAX_SQL_PARAMS))
+                if not chunk:
+                    break
+                placeholders = ",".join("?" * len(chunk))
+                cur = conn.execute(
+                    f"DELETE FROM embedding_records WHERE embedding_id IN ({placeholders})",
+                    chunk,
+                )
+                deleted += cur.rowcount
+
+        return deleted
+
+    # ------------------------------------------------------------------
+    # READ
+    # ------------------------------------------------------------------
+
+    def get(self, embedding_id: str) -> Optional[EmbeddingRecord]:
+        row = self._fetch_one(
+            "SELECT * FROM embedding_records WHERE embedding_id = ?",
+            (embedding_id,),
+        )
+        return self._from_row(row) if row else None
+
+    def list_by_workspace(self, workspace_id: str) -> List[EmbeddingRecord]:
+        records: List[EmbeddingRecord] = []
+        for batch in self.iter_by_workspace(workspace_id):
+            records.extend(batch)
+        return records
+
+    def iter_by_workspace(
+        self,
+        workspace_id: str,
+        *,
+        batch_size: int = 1000,
+    ) -> Iterator[List[EmbeddingRecord]]:
+        last_id = ""
+        while True:
+            rows = self._fetch_all(
+                """
+                SELECT * FROM embedding_records
+                WHERE workspace_id = ? AND embedding_id > ?
+                ORDER BY embedding_id
+                LIMIT ?
+                """,
+                (workspace_id, last_id, batch_size),
+            )
+            if not rows:
+                return
+
+            yield [self._from_row(r) for r in rows]
+
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1]["embedding_id"]
+
+    def list_by_entity(
+        self,
+        workspace_id: str,
+        entity_id: str,
+    ) -> List[EmbeddingRecord]:
+        rows = self._fetch_all(
+            """
+            SELECT * FROM embedding_records
+            WHERE workspace_id = ? AND entity_id = ?
+            ORDER BY embedding_id
+            """,
+            (workspace_id, entity_id),
+        )
+        return [self._from_row(r) for r in rows]
+
+    # ------------------------------------------------------------------
+    # INTROSPECTION
+    # ------------------------------------------------------------------
+
+    def exists(self, embedding_id: str) -> bool:
+        row = self._fetch_one(
+            "SELECT 1 FROM embedding_records WHERE embedding_id = ?",
+            (embedding_id,),
+        )
+        return row is not None
+
+    def count(self, workspace_id: Optional[str] = None) -> int:
+        if workspace_id is None:
+            row = self._fetch_one("SELECT COUNT(*) AS n FROM embedding_records")
+        else:
+            row = self._fetch_one(
+                "SELECT COUNT(*) AS n FROM embedding_records WHERE workspace_id = ?",
+                (workspace_id,),
+            )
+        return int(row["n"]) if row else 0
+
+    # ------------------------------------------------------------------
+    # INTERNAL
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _to_row(record: EmbeddingRecord) -> Tuple[Any, ...]:
+        if record.created_at is None:
+            record.created_at = datetime.utcnow()
+        return (
+            record.embedding_id,
+            record.workspace_id,
+            record.entity_id,
+            record.text,
+            to_json(record.metadata),
+            record.embedding_model,
+            record.embedding_dim,
+            to_timestamp(record.created_at),
+        )
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> EmbeddingRecord:
+        return EmbeddingRecord(
+            embedding_id=row["embedding_id"],
+            workspace_id=row["workspace_id"],
+            text=row["text"],
+            entity_id=row["entity_id"],
+            metadata=from_json(row["metadata"]),
+            embedding_model=row["embedding_model"],
+            embedding_dim=row["embedding_dim"],
+            created_at=from_timestamp(row["created_at"]),
+        )
@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime
+from typing import Any, Iterator, List, Optional
+
+from ice_conscious.storage.repositories.memory import (
+    EpisodicMemoryRecord,
+    MemoryPage,
+    SemanticMemoryRecord,
+)
+from .base import (
+    SQLiteStore,
+    decode_cursor,
+    encode_cursor,
+    from_json,
+    from_timestamp,
+    to_json,
+    to_timestamp,
+)
+
+
+# ============================================================================
+# SQLITE MEMORY REPOSITORY
+# ============================================================================
+
+class SQLiteMemoryRepository(SQLiteStore):
+    """
+    MemoryRepository su SQLite, indicizzato nel tempo.
+
+    Gli eventi sono indicizzati su (workspace_id, occurred_at, episode_id)
+    e letti per chiave (keyset): ogni pagina riparte dall'ultima chiave
+    vista, senza OFFSET, quindi il costo di una pagina non cresce
+    con la profondità della storia.
+
+    Le memorie semantiche sono paginate su (workspace_id, memory_id).
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS episodic_memory (
+            episode_id TEXT PRIMARY KEY,
+            workspace_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            details TEXT,
+            related_entities TEXT,
+            metadata TEXT,
+            confidence REAL NOT NULL,
+            importance REAL NOT NULL,
+            occurred_at TEXT NOT NULL,
+            recorded_at TEXT
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_episodic_ws_time
+        ON episodic_memory (workspace_id, occurred_at, episode_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_episodic_ws_kind_time
+        ON episodic_memory (workspace_id, kind, occurred_at, episode_id)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS semantic_memory (
+            memory_id TEXT PRIMARY KEY,
+            workspace_id TEXT NOT NULL,
+            label TEXT NOT NULL,
+            description TEXT,
+            scope TEXT,
+            properties TEXT,
+            metadata TEXT,
+            confidence REAL NOT NULL,
+            stability REAL NOT NULL,
+            created_at TEXT,
+            updated_at TEXT
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_semantic_ws_id
+        ON semantic_memory (workspace_id, memory_id)
+        """,
+    )
+
+    # ------------------------------------------------------------------
+    # EPISODIC MEMORY
+    # ------------------------------------------------------------------
+
+    def save_episode(self, record: EpisodicMemoryRecord) -> EpisodicMemoryRecord:
+        now = datetime.utcnow()
+        if record.recorded_at is None:
+            record.recorded_at = now
+        if record.occurred_at is None:
+            record.occurred_at = record.recorded_at
+
+        self._execute(
+            """
+            INSERT OR REPLACE INTO episodic_memory (
+                episode_id, workspace_id, kind, summary, details,
+                related_entities, metadata, confidence, importance,
+                occurred_at, recorded_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                record.episode_id,
+                record.workspace_id,
+                record.kind,
+                record.summary,
+                record.details,
+                to_json(record.related_entities),
+                to_json(record.metadata),
+                record.confidence,
+                record.importance,
+                to_timestamp(record.occurred_at),
+                to_timestamp(record.recorded_at),
+            ),
+        )
+        return record
+
+    def get_episode(self, episode_id: str) -> Optional[EpisodicMemoryRecord]:
+        row = self._fetch_one(
+            "SELECT * FROM episodic_memory WHERE episode_id = ?",
+            (episode_id,),
+        )
+        return self._episode_from_row(row) if row else None
+
+    def list_episodes(
+        self,
+        workspace_id: str,
+        *,
+        kind: Optional[str] = None,
+        since: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[EpisodicMemoryRecord]:
+        if limit is not None:
+            return self.page_episodes(
+                workspace_id, kind=kind, since=since, limit=limit
+            ).records
+        return list(self.iter_episodes(workspace_id, kind=kind, since=since))
+
+    def page_episodes(
+        self,
+        workspace_id: str,
+        *,
+        kind: Optional[str] = None,
+        since: Optional[datetime] = None,
+        after: Optional[str] = None,
+        limit: int = 500,
+    ) -> MemoryPage[EpisodicMemoryRecord]:
+        if limit <= 0:
+            return MemoryPage()
+
+        clauses = ["workspace_id = ?"]
+        params: List[Any] = [workspace_id]
+
+        if kind is not None:
+            clauses.append("kind = ?")
+            params.append(kind)
+        if since is not None:
+            clauses.append("occurred_at >= ?")
+            params.append(to_timestamp(since))
+        if after is not None:
+            occurred_at, episode_id = decode_cursor(after, 2)
+            clauses.append("(occurred_at, episode_id) > (?, ?)")
+            params.extend((occurred_at, episode_id))
+
+        # una riga in più per sapere se esiste una pagina successiva
+        params.append(limit + 1)
+        rows = self._fetch_all(
+            f"""
+            SELECT * FROM episodic_memory
+            WHERE {" AND ".join(clauses)}
+            ORDER BY occurred_at, episode_id
+            LIMIT ?
+            """,
+            params,
+        )
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = encode_cursor(last["occurred_at"], last["episode_id"])
+
+        return MemoryPage(
+            records=[self._episode_from_row(r) for r in rows],
+            next_cursor=next_cursor,
+        )
+
+    def iter_episodes(
+        self,
+        workspace_id: str,
+        *,
+        kind: Optional[str] = None,
+        since: Optional[datetime] = None,
+        page_size: int = 500,
+    ) -> Iterator[EpisodicMemoryRecord]:
+        after: Optional[str] = None
+        while True:
+            page = self.page_episodes(
+                workspace_id,
+                kind=kind,
+                since=since,
+                after=after,
+                limit=page_size,
+            )
+            yield from page.records
+            if page.next_cursor is None:
+                return
+            after = page.next_cursor
+
+    def delete_episode(self, episode_id: str) -> None:
+        self._execute(
+            "DELETE FROM episodic_memory WHERE episode_id = ?",
+            (episode_id,),
+        )
+
+    # ------------------------------------------------------------------
+    # SEMANTIC MEMORY
+    # ------------------------------------------------------------------
+
+    def save_semantic(self, record: SemanticMemoryRecord) -> SemanticMemoryRecord:
+        now = datetime.utcnow()
+        if record.created_at is None:
+            record.created_at = now
+        record.updated_at = now
+
+        self._execute(
+            """
+            INSERT OR REPLACE INTO semantic_memory (
+                memory_id, workspace_id, label, description, scope,
+                properties, metadata, confidence, stability,
+                created_at, updated_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                record.memory_id,
+                record.workspace_id,
+                record.label,
+                record.description,
+                record.scope,
+                to_json(record.properties),
+                to_json(record.metadata),
+                record.confidence,
+                record.stability,
+                to_timestamp(record.created_at),
+                to_timestamp(record.updated_at),
+            ),
+        )
+        return record
+
+    def get_semantic(self, memory_id: str) -> Optional[SemanticMemoryRecord]:
+        row = self._fetch_one(
+            "SELECT * FROM semantic_memory WHERE memory_id = ?",
+            (memory_id,),
+        )
+        return self._semantic_from_row(row) if row else None
+
+    def list_semantic(
+        self,
+        workspace_id: str,
+        *,
+        scope: Optional[str] = None,
+        min_confidence: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[SemanticMemoryRecord]:
+        if limit is not None:
+            return self.page_semantic(
+                workspace_id,
+                scope=scope,
+                min_confidence=min_confidence,
+                limit=limit,
+            ).records
+
+        records: List[SemanticMemoryRecord] = []
+        after: Optional[str] = None
+        while True:
+            page = self.page_semantic(
+                workspace_id,
+                scope=scope,
+                min_confidence=min_confidence,
+                after=after,
+            )
+            records.extend(page.records)
+            if page.next_cursor is None:
+                return records
+            after = page.next_cursor
+
+    def page_semantic(
+        self,
+        workspace_id: str,
+        *,
+        scope: Optional[str] = None,
+        min_confidence: Optional[float] = None,
+        after: Optional[str] = None,
+        limit: int = 500,
+    ) -> MemoryPage[SemanticMemoryRecord]:
+        if limit <= 0:
+            return MemoryPage()
+
+        clauses = ["workspace_id = ?"]
+        params: List[Any] = [workspace_id]
+
+        if scope is not None:
+            clauses.append("scope = ?")
+            params.append(scope)
+        if min_confidence is not None:
+            clauses.append("confidence >= ?")
+            params.append(min_confidence)
+        if after is not None:
+            (memory_id,) = decode_cursor(after, 1)
+            clauses.append("memory_id > ?")
+            params.append(memory_id)
+
+        params.append(limit + 1)
+        rows = self._fetch_all(
+            f"""
+            SELECT * FROM semantic_memory
+            WHERE {" AND ".join(clauses)}
+            ORDER BY memory_id
+            LIMIT ?
+            """,
+            params,
+        )
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["memory_id"]) if has_more else None
+
+        return MemoryPage(
+            records=[self._semantic_from_row(r) for r in rows],
+            next_cursor=next_cursor,
+        )
+
+    def delete_semantic(self, memory_id: str) -> None:
+        self._execute(
+            "DELETE FROM semantic_memory WHERE memory_id = ?",
+            (memory_id,),
+        )
+
+    # ------------------------------------------------------------------
+    # INTROSPECTION
+    # ------------------------------------------------------------------
+
+    def count_episodes(self, workspace_id: Optional[str] = None) -> int:
+        return self._count("episodic_memory", workspace_id)
+
+    def count_semantic(self, workspace_id: Optional[str] = None) -> int:
+        return self._count("semantic_memory", workspace_id)
+
+    # ------------------------------------------------------------------
+    # INTERNAL
+    # ------------------------------------------------------------------
+
+    def _count(self, table: str, workspace_id: Optional[str]) -> int:
+        if workspace_id is None:
+            row = self._fetch_one(f"SELECT COUNT(*) AS n FROM {table}")
+        else:
+            row = self._fetch_one(
+                f"SELECT COUNT(*) AS n FROM {table} WHERE workspace_id = ?",
+                (workspace_id,),
+            )
+        return int(row["n"]) if row else 0
+
+    @staticmethod
+    def _episode_from_row(row: sqlite3.Row) -> EpisodicMemoryRecord:
+        return EpisodicMemoryRecord(
+            episode_id=row["episode_id"],
+            workspace_id=row["workspace_id"],
+            kind=row["kind"],
+            summary=row["summary"],
+            details=row["details"],
+            related_entities=from_json(row["related_entities"], []),
+            metadata=from_json(row["metadata"], {}),
+            confidence=row["confidence"],
+            importance=row["importance"],
+            occurred_at=from_timestamp(row["occurred_at"]),
+            recorded_at=from_timestamp(row["recorded_at"]),
+        )
+
+    @staticmethod
+    def _semantic_from_row(row: sqlite3.Row) -> SemanticMemoryRecord:
+        return SemanticMemoryRecord(
+            memory_id=row["memory_id"],
+            workspace_id=row["workspace_id"],
+            label=row["label"],
+            description=row["description"],
+            scope=row["scope"],
+            properties=from_json(row["properties"], {}),
+            metadata=from_json(row["metadata"], {}),
+            confidence=row["confidence"],
+            stability=row["stability"],
+            created_at=from_timestamp(row["created_at"]),
+            updated_at=from_timestamp(row["updated_at"]),
+        )
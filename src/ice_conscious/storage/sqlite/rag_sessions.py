@@ -0,0 +1,561 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import lzma
+import sqlite3
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ice_conscious.storage.repositories.rag_sessions import RAGSessionRecord
+from .base import SQLiteStore, from_json, from_timestamp, to_json, to_timestamp
+
+
+# ============================================================================
+# CODEC
+# ============================================================================
+
+CODEC_NONE = "none"
+CODEC_ZLIB = "zlib"
+CODEC_LZMA = "lzma"
+
+# zlib accetta al massimo 32 KiB di dizionario preimpostato
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+
+def _compress(data: bytes, codec: str, level: int, zdict: Optional[bytes]) -> bytes:
+    if codec == CODEC_ZLIB:
+        if zdict:
+            c = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS, zdict=zdict)
+        else:
+            c = zlib.compressobj(level)
+        return c.compress(data) + c.flush()
+    if codec == CODEC_LZMA:
+        return lzma.compress(data, preset=min(max(level, 0), 9))
+    return data
+
+
+def _decompress(data: bytes, codec: str, zdict: Optional[bytes]) -> bytes:
+    if codec == CODEC_ZLIB:
+        if zdict:
+            d = zlib.decompressobj(zlib.MAX_WBITS, zdict=zdict)
+        else:
+            d = zlib.decompressobj()
+        return d.decompress(data) + d.flush()
+    if codec == CODEC_LZMA:
+        return lzma.decompress(data)
+    return data
+
+
+def train_dictionary(samples: Iterable[str], size: int = MAX_DICTIONARY_SIZE) -> bytes:
+    """
+    Costruisce un dizionario preimpostato per zlib da testi campione.
+
+    Raccoglie le righe ricorrenti (boilerplate di contesto, intestazioni,
+    formati degli hit) e le dispone con le più frequenti in coda,
+    dove la finestra di deflate le raggiunge con distanze più corte.
+    """
+    size = min(size, MAX_DICTIONARY_SIZE)
+    counts: Counter[str] = Counter()
+
+    for text in samples:
+        for line in set(text.splitlines()):
+            if len(line) >= 8:
+                counts[line] += 1
+
+    chosen: List[bytes] = []
+    total = 0
+    for line, n in counts.most_common():
+        if n < 2:
+            break
+        encoded = line.encode("utf-8") + b"\n"
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+
+    return b"".join(reversed(chosen))
+
+
+# ============================================================================
+# RECORD LAZY
+# ============================================================================
+
+class LazyRAGSessionRecord(RAGSessionRecord):
+    """
+    RAGSessionRecord con contesto ed evidenze caricati on demand.
+
+    `context_text` e `retrieved_items` vengono letti e decompressi
+    solo al primo accesso; assegnarli sostituisce il valore lazy.
+    """
+
+    def __init__(
+        self,
+        *,
+        loader: Callable[[str], Optional[bytes]],
+        context_ref: Optional[str],
+        items_ref: Optional[str],
+        **fields: Any,
+    ) -> None:
+        super().__init__(**fields)
+        self._loader = loader
+        self._refs: Dict[str, str] = {}
+        if context_ref:
+            self._refs["context_text"] = context_ref
+        if items_ref:
+            self._refs["retrieved_items"] = items_ref
+
+    def is_loaded(self, name: str) -> bool:
+        return name not in self.__dict__.get("_refs", {})
+
+    @property  # type: ignore[override]
+    def context_text(self) -> Optional[str]:
+        ref = self.__dict__.get("_refs", {}).pop("context_text", None)
+        if ref is not None:
+            raw = self._loader(ref)
+            self.__dict__["_context_text"] = raw.decode("utf-8") if raw is not None else None
+        return self.__dict__.get("_context_text")
+
+    @context_text.setter
+    def context_text(self, value: Optional[str]) -> None:
+        self.__dict__.get("_refs", {}).pop("context_text", None)
+        self.__dict__["_context_text"] = value
+
+    @property  # type: ignore[override]
+    def retrieved_items(self) -> Optional[List[Dict[str, Any]]]:
+        ref = self.__dict__.get("_refs", {}).pop("retrieved_items", None)
+        if ref is not None:
+            raw = self._loader(ref)
+            self.__dict__["_retrieved_items"] = json.loads(raw) if raw is not None else None
+        return self.__dict__.get("_retrieved_items")
+
+    @retrieved_items.setter
+    def retrieved_items(self, value: Optional[List[Dict[str, Any]]]) -> None:
+        self.__dict__.get("_refs", {}).pop("retrieved_items", None)
+        self.__dict__["_retrieved_items"] = value
+
+
+# ============================================================================
+# COMPRESSED RAG SESSION REPOSITORY
+# ============================================================================
+
+class CompressedRAGSessionRepository(SQLiteStore):
+    """
+    RAGSessionRepository su SQLite con contesto ed evidenze compressi.
+
+    - `context_text` e `retrieved_items` vivono in una tabella di blob
+      indirizzata per hash del contenuto: contesti identici tra sessioni
+      sono memorizzati una sola volta (con conteggio dei riferimenti)
+    - compressione zlib o lzma (stdlib); con zlib si può usare
+      un dizionario addestrato per workspace
+    - le letture restituiscono LazyRAGSessionRecord: i blob vengono
+      decompressi solo se il chiamante accede ai campi pesanti
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS rag_sessions (
+            session_id TEXT PRIMARY KEY,
+            workspace_id TEXT NOT NULL,
+            query_text TEXT NOT NULL,
+            context_ref TEXT,
+            context_metadata TEXT,
+            items_ref TEXT,
+            answer TEXT,
+            confidence REAL,
+            relevance_score REAL,
+            created_at TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_rag_sessions_ws_time
+        ON rag_sessions (workspace_id, created_at)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS rag_blobs (
+            content_hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            dictionary_id INTEGER,
+            raw_size INTEGER NOT NULL,
+            stored_size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS rag_dictionaries (
+            dictionary_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            workspace_id TEXT NOT NULL,
+            data BLOB NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """,
+    )
+
+    # campi aggiornabili direttamente via `update`
+    _SCALAR_FIELDS = ("query_text", "answer", "confidence", "relevance_score")
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        *,
+        codec: str = CODEC_ZLIB,
+        level: int = 6,
+        min_compress_size: int = 128,
+        connection: Optional[sqlite3.Connection] = None,
+    ) -> None:
+        if codec not in (CODEC_NONE, CODEC_ZLIB, CODEC_LZMA):
+            raise ValueError(f"Unknown codec: {codec}")
+
+        self.codec = codec
+        self.level = level
+        self.min_compress_size = min_compress_size
+
+        self._dictionaries: Dict[int, bytes] = {}
+        self._active_dictionary: Dict[str, int] = {}
+
+        super().__init__(path, connection=connection)
+        self._load_dictionaries()
+
+    # ------------------------------------------------------------------
+    # WRITE
+    # ------------------------------------------------------------------
+
+    def save(self, session: RAGSessionRecord) -> RAGSessionRecord:
+        if session.created_at is None:
+            session.created_at = datetime.utcnow()
+
+        with self.transaction():
+            previous = self._refs_of(session.session_id)
+
+            context_ref = self._put_text(session.workspace_id, session.context_text)
+            items_ref = self._put_items(session.workspace_id, session.retrieved_items)
+
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO rag_sessions (
+                    session_id, workspace_id, query_text,
+                    context_ref, context_metadata, items_ref,
+                    answer, confidence, relevance_score, created_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    session.session_id,
+                    session.workspace_id,
+                    session.query_text,
+                    context_ref,
+                    to_json(session.context_metadata),
+                    items_ref,
+                    session.answer,
+                    session.confidence,
+                    session.relevance_score,
+                    to_timestamp(session.created_at),
+                ),
+            )
+
+            for ref in previous:
+                self._release(ref)
+
+        return session
+
+    def update(self, session_id: str, fields: Dict[str, Any]) -> None:
+        unknown = set(fields) - set(self._SCALAR_FIELDS) - {
+            "context_text",
+            "context_metadata",
+            "retrieved_items",
+        }
+        if unknown:
+            raise ValueError(f"Unsupported RAG session fields: {sorted(unknown)}")
+
+        with self.transaction():
+            row = self._fetch_one(
+                "SELECT workspace_id, context_ref, items_ref FROM rag_sessions WHERE session_id = ?",
+                (session_id,),
+            )
+            if row is None:
+                return
+
+            assignments: List[str] = []
+            params: List[Any] = []
+            released: List[str] = []
+
+            for name in self._SCALAR_FIELDS:
+                if name in fields:
+                    assignments.append(f"{name} = ?")
+                    params.append(fields[name])
+
+            if "context_metadata" in fields:
+                assignments.append("context_metadata = ?")
+                params.append(to_json(fields["context_metadata"]))
+
+            if "context_text" in fields:
+                assignments.append("context_ref = ?")
+                params.append(self._put_text(row["workspace_id"], fields["context_text"]))
+                if row["context_ref"]:
+                    released.append(row["context_ref"])
+
+            if "retrieved_items" in fields:
+                assignments.append("items_ref = ?")
+                params.append(self._put_items(row["workspace_id"], fields["retrieved_items"]))
+                if row["items_ref"]:
+                    released.append(row["items_ref"])
+
+            if not assignments:
+                return
+
+            params.append(session_id)
+            self._conn.execute(
+                f"UPDATE rag_sessions SET {', '.join(assignments)} WHERE session_id = ?",
+                params,
+            )
+            for ref in released:
+                self._release(ref)
+
+    def delete(self, session_id: str) -> None:
+        with self.transaction():
+            refs = self._refs_of(session_id)
+            self._conn.execute(
+                "DELETE FROM rag_sessions WHERE session_id = ?",
+                (session_id,),
+            )
+            for ref in refs:
+                self._release(ref)
+
+    # ------------------------------------------------------------------
+    # READ
+    # ------------------------------------------------------------------
+
+    def get(self, session_id: str) -> Optional[RAGSessionRecord]:
+        row = self._fetch_one(
+            "SELECT * FROM rag_sessions WHERE session_id = ?",
+            (session_id,),
+        )
+        return self._from_row(row) if row else None
+
+    def list_by_workspace(
+        self,
+        workspace_id: str,
+        *,
+        limit: Optional[int] = None,
+    ) -> List[RAGSessionRecord]:
+        rows = self._fetch_all(
+            """
+            SELECT * FROM rag_sessions
+            WHERE workspace_id = ?
+            ORDER BY created_at
+            LIMIT ?
+            """,
+            (workspace_id, -1 if limit is None else limit),
+        )
+        return [self._from_row(r) for r in rows]
+
+    def list_recent(
+        self,
+        workspace_id: str,
+        *,
+        since: Optional[datetime] = None,
+        limit: int = 20,
+    ) -> List[RAGSessionRecord]:
+        rows = self._fetch_all(
+            """
+            SELECT * FROM rag_sessions
+            WHERE workspace_id = ? AND created_at >= ?
+            ORDER BY created_at DESC
+            LIMIT ?
+            """,
+            (workspace_id, to_timestamp(since) or "", limit),
+        )
+        return [self._from_row(r) for r in rows]
+
+    # ------------------------------------------------------------------
+    # INTROSPECTION
+    # ------------------------------------------------------------------
+
+    def exists(self, session_id: str) -> bool:
+        row = self._fetch_one(
+            "SELECT 1 FROM rag_sessions WHERE session_id = ?",
+            (session_id,),
+        )
+        return row is not None
+
+    def count(self, workspace_id: Optional[str] = None) -> int:
+        if workspace_id is None:
+            row = self._fetch_one("SELECT COUNT(*) AS n FROM rag_sessions")
+        else:
+            row = self._fetch_one(
+                "SELECT COUNT(*) AS n FROM rag_sessions WHERE workspace_id = ?",
+                (workspace_id,),
+            )
+        return int(row["n"]) if row else 0
+
+    def storage_stats(self) -> Dict[str, int]:
+        """
+        Dimensioni dei blob: byte originali, byte memorizzati,
+        numero di blob distinti e riferimenti totali (dedup).
+        """
+        row = self._fetch_one(
+            """
+            SELECT
+                COUNT(*) AS blobs,
+                COALESCE(SUM(refcount), 0) AS refs,
+                COALESCE(SUM(raw_size), 0) AS raw_bytes,
+                COALESCE(SUM(stored_size), 0) AS stored_bytes
+            FROM rag_blobs
+            """
+        )
+        return {k: int(row[k]) for k in ("blobs", "refs", "raw_bytes", "stored_bytes")}
+
+    # ------------------------------------------------------------------
+    # DICTIONARIES
+    # ------------------------------------------------------------------
+
+    def train_dictionary(
+        self,
+        workspace_id: str,
+        *,
+        samples: Optional[Iterable[str]] = None,
+        sample_limit: int = 500,
+        size: int = MAX_DICTIONARY_SIZE,
+    ) -> Optional[int]:
+        """
+        Addestra e attiva un dizionario zlib per il workspace.
+
+        Senza `samples` usa i contesti delle sessioni più recenti.
+        I blob già scritti restano leggibili con il dizionario originale.
+        Ritorna l'id del dizionario, o None se i campioni non bastano.
+        """
+        if samples is None:
+            samples = [
+                r.context_text or ""
+                for r in self.list_recent(workspace_id, limit=sample_limit)
+            ]
+
+        data = train_dictionary(samples, size=size)
+        if not data:
+            return None
+
+        with self.transaction() as conn:
+            cur = conn.execute(
+                """
+                INSERT INTO rag_dictionaries (workspace_id, data, created_at)
+                VALUES (?, ?, ?)
+                """,
+                (workspace_id, data, to_timestamp(datetime.utcnow())),
+            )
+            dictionary_id = int(cur.lastrowid)
+
+        self._dictionaries[dictionary_id] = data
+        self._active_dictionary[workspace_id] = dictionary_id
+        return dictionary_id
+
+    # ------------------------------------------------------------------
+    # INTERNAL
+    # ------------------------------------------------------------------
+
+    def _load_dictionaries(self) -> None:
+        rows = self._fetch_all(
+            "SELECT dictionary_id, workspace_id, data FROM rag_dictionaries ORDER BY dictionary_id"
+        )
+        for r in rows:
+            self._dictionaries[r["dictionary_id"]] = bytes(r["data"])
+            self._active_dictionary[r["workspace_id"]] = r["dictionary_id"]
+
+    def _refs_of(self, session_id: str) -> List[str]:
+        row = self._fetch_one(
+            "SELECT context_ref, items_ref FROM rag_sessions WHERE session_id = ?",
+            (session_id,),
+        )
+        if row is None:
+            return []
+        return [ref for ref in (row["context_ref"], row["items_ref"]) if ref]
+
+    def _put_text(self, workspace_id: str, text: Optional[str]) -> Optional[str]:
+        if text is None:
+            return None
+        return self._put_blob(workspace_id, text.encode("utf-8"))
+
+    def _put_items(
+        self,
+        workspace_id: str,
+        items: Optional[List[Dict[str, Any]]],
+    ) -> Optional[str]:
+        if items is None:
+            return None
+        raw = json.dumps(items, separators=(",", ":"), sort_keys=True, default=str)
+        return self._put_blob(workspace_id, raw.encode("utf-8"))
+
+    def _put_blob(self, workspace_id: str, raw: bytes) -> str:
+        content_hash = hashlib.sha256(raw).hexdigest()
+
+        cur = self._conn.execute(
+            "UPDATE rag_blobs SET refcount = refcount + 1 WHERE content_hash = ?",
+            (content_hash,),
+        )
+        if cur.rowcount:
+            return content_hash
+
+        codec, dictionary_id, data = self._encode(workspace_id, raw)
+        self._conn.execute(
+            """
+            INSERT INTO rag_blobs (
+                content_hash, codec, dictionary_id,
+                raw_size, stored_size, refcount, data
+            )
+            VALUES (?, ?, ?, ?, ?, 1, ?)
+            """,
+            (content_hash, codec, dictionary_id, len(raw), len(data), data),
+        )
+        return content_hash
+
+    def _encode(self, workspace_id: str, raw: bytes) -> Tuple[str, Optional[int], bytes]:
+        if self.codec == CODEC_NONE or len(raw) < self.min_compress_size:
+            return CODEC_NONE, None, raw
+
+        dictionary_id = None
+        zdict = None
+        if self.codec == CODEC_ZLIB:
+            dictionary_id = self._active_dictionary.get(workspace_id)
+            zdict = self._dictionaries.get(dictionary_id) if dictionary_id else None
+
+        data = _compress(raw, self.codec, self.level, zdict)
+        if len(data) >= len(raw):
+            return CODEC_NONE, None, raw
+        return self.codec, dictionary_id, data
+
+    def _release(self, content_hash: str) -> None:
+        self._conn.execute(
+            "UPDATE rag_blobs SET refcount = refcount - 1 WHERE content_hash = ?",
+            (content_hash,),
+        )
+        self._conn.execute(
+            "DELETE FROM rag_blobs WHERE content_hash = ? AND refcount <= 0",
+            (content_hash,),
+        )
+
+    def _load_blob(self, content_hash: str) -> Optional[bytes]:
+        row = self._fetch_one(
+            "SELECT codec, dictionary_id, data FROM rag_blobs WHERE content_hash = ?",
+            (content_hash,),
+        )
+        if row is None:
+            return None
+        zdict = self._dictionaries.get(row["dictionary_id"]) if row["dictionary_id"] else None
+        return _decompress(bytes(row["data"]), row["codec"], zdict)
+
+    def _from_row(self, row: sqlite3.Row) -> LazyRAGSessionRecord:
+        return LazyRAGSessionRecord(
+            loader=self._load_blob,
+            context_ref=row["context_ref"],
+            items_ref=row["items_ref"],
+            session_id=row["session_id"],
+            workspace_id=row["workspace_id"],
+            query_text=row["query_text"],
+            context_metadata=from_json(row["context_metadata"]),
+            answer=row["answer"],
+            confidence=row["confidence"],
+            relevance_score=row["relevance_score"],
+            created_at=from_timestamp(row["created_at"]),
+        )
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .cache import _record_id
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+@dataclass
+class WriteError:
+    """
+    Scrittura bufferizzata fallita durante un flush.
+    """
+    method: str
+    record_id: str
+    error: BaseException
+
+
+@dataclass
+class FlushReport:
+    """
+    Esito di un flush: scritture applicate ed errori per record.
+    """
+    written: int = 0
+    grouped: bool = True          # False se si è ricaduti su scritture singole
+    errors: List[WriteError] = field(default_factory=list)
+    duration_seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+# ============================================================================
+# WRITE-BEHIND REPOSITORY
+# ============================================================================
+
+_DELETED = object()
+
+
+class WriteBehindRepository:
+    """
+    Buffer write-behind con group commit davanti a un repository.
+
+    Le scritture (save_*, save, delete*) vengono accumulate e applicate
+    in una sola transazione quando:
+    - il buffer raggiunge `max_pending` record
+    - la scrittura più vecchia supera `max_delay` secondi
+    - si chiama `flush()` o si esce dal blocco `with`
+
+    Scritture successive sullo stesso id si fondono (vince l'ultima).
+    Le letture puntuali vedono le scritture ancora in buffer;
+    le letture aggregate (list_*, count_*) eseguono prima un flush.
+
+    Se il flush di gruppo fallisce, il buffer viene riapplicato
+    record per record per isolare e riportare i singoli errori:
+    ogni errore finisce in `errors` e viene passato a `on_error`,
+    qualunque sia il flush che lo ha prodotto. All'uscita dal blocco
+    `with` gli errori del flush finale vengono sollevati (se non sta
+    già propagando un'eccezione).
+    """
+
+    # metodo -> (namespace, è una cancellazione)
+    _WRITES: Dict[str, Tuple[str, bool]] = {
+        "save_entity": ("entity", False),
+        "delete_entity": ("entity", True),
+        "save_relation": ("relation", False),
+        "delete_relation": ("relation", True),
+        "save_episode": ("episode", False),
+        "delete_episode": ("episode", True),
+        "save_semantic": ("semantic", False),
+        "delete_semantic": ("semantic", True),
+        "save": ("record", False),
+        "delete": ("record", True),
+    }
+    _READS = {
+        "get_entity": "entity",
+        "get_episode": "episode",
+        "get_semantic": "semantic",
+        "get": "record",
+    }
+    _EXISTS = {
+        "exists_entity": "entity",
+        "exists": "record",
+    }
+
+    def __init__(
+        self,
+        backend: Any,
+        *,
+        max_pending: int = 1000,
+        max_delay: Optional[float] = 0.05,
+        on_error: Optional[Callable[[WriteError], None]] = None,
+    ) -> None:
+        self.backend = backend
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.on_error = on_error
+
+        # errori di tutti i flush (espliciti, automatici, di chiusura)
+        self.errors: List[WriteError] = []
+
+        # (namespace, id) -> (metodo, payload | _DELETED)
+        self._pending: "OrderedDict[Tuple[str, str], Tuple[str, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], Tuple[str, Any]] = {}
+        self._oldest: Optional[float] = None
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._wrapped: Dict[str, Callable[..., Any]] = {}
+
+        self._flusher: Optional[threading.Thread] = None
+        if max_delay is not None:
+            self._flusher = threading.Thread(
+                target=self._run_flusher,
+                name="write-behind-flusher",
+                daemon=True,
+            )
+            self._flusher.start()
+
+    # ------------------------------------------------------------------
+    # CICLO DI VITA
+    # ------------------------------------------------------------------
+
+    def __enter__(self) -> "WriteBehindRepository":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        report = self.close()
+        if exc_type is None and report.errors:
+            first = report.errors[0]
+            raise RuntimeError(
+                f"{len(report.errors)} buffered write(s) failed on close: "
+                f"{first.method} {first.record_id}: {first.error}"
+            ) from first.error
+
+    def close(self) -> FlushReport:
+        """
+        Ferma il flusher in background e svuota il buffer.
+        """
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        return self.flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # ------------------------------------------------------------------
+    # FLUSH
+    # ------------------------------------------------------------------
+
+    def flush(self) -> FlushReport:
+        """
+        Applica tutte le scritture in buffer come un'unica transazione.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = OrderedDict()
+                self._inflight = dict(batch)
+                self._oldest = None
+
+            report = FlushReport()
+            started = time.perf_counter()
+            try:
+                if batch:
+                    self._apply(batch, report)
+            finally:
+                with self._lock:
+                    self._inflight = {}
+                report.duration_seconds = time.perf_counter() - started
+
+        self._report(report)
+        return report
+
+    def _apply(
+        self,
+        batch: "OrderedDict[Tuple[str, str], Tuple[str, Any]]",
+        report: FlushReport,
+    ) -> None:
+        transaction = getattr(self.backend, "transaction", None)
+
+        try:
+            if transaction is not None:
+                with transaction():
+                    for key, (method, payload) in batch.items():
+                        self._apply_one(key, method, payload)
+            else:
+                for key, (method, payload) in batch.items():
+                    self._apply_one(key, method, payload)
+            report.written = len(batch)
+            return
+        except Exception:
+            report.grouped = False
+
+        # le scritture sono idempotenti per id: si riapplica una per una
+        for key, (method, payload) in batch.items():
+            try:
+                self._apply_one(key, method, payload)
+                report.written += 1
+            except Exception as exc:
+                report.errors.append(WriteError(method=method, record_id=key[1], error=exc))
+
+    def _apply_one(self, key: Tuple[str, str], method: str, payload: Any) -> None:
+        fn = getattr(self.backend, method)
+        if payload is _DELETED:
+            fn(key[1])
+        else:
+            fn(payload)
+
+    def _run_flusher(self) -> None:
+        assert self.max_delay is not None
+        while True:
+            with self._lock:
+                while not self._closed:
+                    if self._oldest is not None:
+                        remaining = self._oldest + self.max_delay - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._wakeup.wait(remaining)
+                    else:
+                        self._wakeup.wait()
+                if self._closed:
+                    return
+            self.flush()
+
+    def _report(self, report: FlushReport) -> None:
+        for error in report.errors:
+            self.errors.append(error)
+            if self.on_error is not None:
+                self.on_error(error)
+
+    # ------------------------------------------------------------------
+    # PROXY
+    # ------------------------------------------------------------------
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.backend, name)
+        if not callable(attr):
+            return attr
+
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+            if name in self._WRITES:
+                wrapped = self._buffered(name, *self._WRITES[name])
+            elif name in self._READS:
+                wrapped = self._read_your_writes(self._READS[name], attr, exists=False)
+            elif name in self._EXISTS:
+                wrapped = self._read_your_writes(self._EXISTS[name], attr, exists=True)
+            else:
+                wrapped = self._flushing(attr)
+            self._wrapped[name] = wrapped
+        return wrapped
+
+    def _buffered(self, method: str, namespace: str, is_delete: bool) -> Callable[[Any], Any]:
+        def write(arg: Any) -> Any:
+            if is_delete:
+                key = (namespace, arg)
+                entry = (method, _DELETED)
+            else:
+                record_id = getattr(arg, "relation_id", None) if namespace == "relation" else None
+                key = (namespace, record_id or _record_id(arg))
+                entry = (method, arg)
+
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Write-behind buffer is closed")
+                self._pending[key] = entry
+                self._pending.move_to_end(key)
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+                    self._wakeup.notify()
+                full = len(self._pending) >= self.max_pending
+
+            if full:
+                self.flush()
+            return None if is_delete else arg
+
+        return write
+
+    def _read_your_writes(
+        self,
+        namespace: str,
+        fn: Callable[[str], Any],
+        *,
+        exists: bool,
+    ) -> Callable[[str], Any]:
+        def read(record_id: str) -> Any:
+            key = (namespace, record_id)
+            with self._lock:
+                entry = self._pending.get(key) or self._inflight.get(key)
+            if entry is None:
+                return fn(record_id)
+
+            deleted = entry[1] is _DELETED
+            if exists:
+                return not deleted
+            return None if deleted else entry[1]
+
+        return read
+
+    def _flushing(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        def call(*args: Any, **kwargs: Any) -> Any:
+            if self._pending:
+                self.flush()
+            return fn(*args, **kwargs)
+
+        return call
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import heapq
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple, TypeVar, Union
+
+try:
+    import numpy as np
+except ImportError:  # extra "ml" non installato
+    np = None
+
+
+T = TypeVar("T")
+
+# chiave semplice, oppure lista di chiavi / (chiave, "asc" | "desc")
+KeySpec = Union[
+    Callable[[Any], Any],
+    Sequence[Union[Callable[[Any], Any], Tuple[Callable[[Any], Any], str]]],
+]
+
+
+# ============================================================
+# SELEZIONE TOP-K
+# ============================================================
+
+def top_k(
+    items: Iterable[T],
+    k: int,
+    *,
+    key: Optional[KeySpec] = None,
+) -> List[T]:
+    """
+    I k elementi migliori (chiave più alta prima), senza ordinare tutto.
+
+    Equivale a `sorted(items, key=key, reverse=True)[:k]`:
+    - a parità di chiave vince l'ordine di arrivo (stabile)
+    - funziona in streaming su generatori, memoria O(k)
+
+    `key` può essere una lista di chiavi (ordinamento multi-chiave);
+    ogni chiave è decrescente salvo `(chiave, "asc")`.
+    """
+    if k <= 0:
+        return []
+    return heapq.nlargest(k, items, key=_compose(key))
+
+
+def top_k_indices(scores: Any, k: int) -> List[int]:
+    """
+    Indici dei k score più alti, in ordine decrescente.
+
+    Per vettori NumPy usa `argpartition` (O(n)) e ordina solo i k scelti;
+    a parità di score vince l'indice minore, NaN in fondo.
+    Senza NumPy ricade su `heapq.nlargest` con la stessa semantica.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    if np is None or not isinstance(scores, np.ndarray):
+        return heapq.nlargest(k, range(n), key=_nan_last(scores))
+
+    a = scores.astype(np.float64, copy=False)
+    if np.isnan(a).any():
+        a = np.where(np.isnan(a), -np.inf, a)
+
+    if k < n:
+        kth = a[np.argpartition(-a, k - 1)[k - 1]]
+        above = np.flatnonzero(a > kth)
+        ties = np.flatnonzero(a == kth)[: k - len(above)]
+        idx = np.concatenate([above, ties])
+    else:
+        idx = np.arange(n)
+
+    idx = idx[np.lexsort((idx, -a[idx]))]
+    return idx.tolist()
+
+
+# ============================================================
+# INTERNAL
+# ============================================================
+
+def _compose(key: Optional[KeySpec]) -> Optional[Callable[[Any], Any]]:
+    if key is None or callable(key):
+        return key
+
+    parts: List[Tuple[Callable[[Any], Any], bool]] = []
+    for spec in key:
+        if callable(spec):
+            parts.append((spec, False))
+        else:
+            fn, order = spec
+            if order not in ("asc", "desc"):
+                raise ValueError(f"Unknown sort order: {order!r}")
+            parts.append((fn, order == "asc"))
+
+    if not any(asc for _, asc in parts):
+        fns = [fn for fn, _ in parts]
+        return lambda item: tuple(fn(item) for fn in fns)
+
+    return lambda item: tuple(_Ascending(fn(item)) if asc else fn(item) for fn, asc in parts)
+
+
+def _nan_last(scores: Sequence[float]) -> Callable[[int], float]:
+    def key(i: int) -> float:
+        v = scores[i]
+        return float("-inf") if v != v else v
+
+    return key
+
+
+class _Ascending:
+    """
+    Inverte il confronto: in una selezione "più alti prima"
+    fa vincere il valore minore.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __lt__(self, other: "_Ascending") -> bool:
+        return other.value < self.value
+
+    def __gt__(self, other: "_Ascending") -> bool:
+        return self.value < other.value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Ascending) and self.value == other.value